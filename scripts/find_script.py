@@ -8,11 +8,59 @@ suitable for searching large codebases or entire file systems.
 
 Key Features:
 - Multi-criteria search: file extensions, minimum line count, and content keywords
-- Caching system with configurable cache expiration (24 hours default)
+- Predicates are checked cheapest first (extension and path, then size and mtime from a
+  stat, then line count, then keywords), with --min-size, --max-size, --newer-than and
+  --older-than answered from stat data and min_lines ruled out by size alone
+- Caching system with incremental revalidation based on directory mtimes
+- Persistent per-file index (size, mtime, inode, line count, fingerprint) so unchanged
+  files are never reopened just to check their line count
+- Scan results (line count, keyword hits, snippets) cached by content fingerprint (the
+  git blob id), so duplicate files, clones and worktrees are analysed once; blob ids are
+  taken from .git/index when a file's stat signature matches, without reading the file
+- Optional trigram index (--trigram-index) that narrows keyword searches to candidate files
+- Parallel content scanning (--jobs) with thread or process pools and ordered results
 - Automatic directory skipping for common non-source directories (node_modules, .git, etc.)
-- Content-based keyword matching with case-insensitive search
+- Opt-in search inside archives (--archives): members of zip, wheel, egg and tar(.gz)
+  archives are streamed through the same scanner without extracting anything, and
+  member listings are cached by archive size and mtime so warm searches skip archives
+  with no candidate members unopened
+- Opt-in .gitignore-aware pruning (--gitignore): .gitignore files at every level,
+  .git/info/exclude and the global git ignore file are compiled into one regex per
+  ignore file, and ignored subtrees are never walked
+- os.scandir based tree walk, walking sibling subtrees concurrently with --jobs
+- Multiple search roots, walked concurrently with nested roots collapsed and files
+  shared between roots (symlinks, hard links) scanned only once
+- Content-based keyword matching with case-insensitive search, done in the same
+  streaming pass as line counting (files are read in fixed-size chunks)
+- Regex keywords (--regex) compiled into the same single-pass matcher, with a
+  literal-prefix prefilter, and path globs (--glob '**/train_*.py') that prune
+  non-matching subtrees during the walk
+- Results are printed as soon as they are found; --limit stops the walk and scan early
+- Instant file name search (--name PATTERN) over the cached file lists: a memory-mapped
+  n-gram index of basenames, built next to each cached list on first use, answers
+  substring and fuzzy (subsequence) queries ranked by match quality, without walking
+  the tree or opening any file
+- Duplicate detection (--duplicates): files are grouped by size, then by a hash of their
+  first and last blocks, and only remaining collisions are hashed in full (in parallel),
+  with groups of identical files streamed as they are settled
+- Near-duplicate detection (--similar-to FILE, --near-dups): MinHash signatures of token
+  shingles, cached by content fingerprint, matched through LSH bands so candidate pairs
+  are found without comparing every pair of files, with a tunable Jaccard --threshold
+- Machine-readable streaming output (--format ndjson|tsv|null), one record per match,
+  block-buffered on stdout with all other output on stderr, for shell pipelines
+- Top-k relevance ranking (--top) by BM25 keyword scores in bounded memory, skipping
+  files too small to beat the current top without reading them
+- Optional index daemon (--serve) that keeps file lists hot in memory, tracks changes with
+  inotify (or mtime polling) and answers searches over a Unix domain socket
 - Detailed progress reporting and verbose output options
-- Content preview of matching files
+- Search statistics (--stats, --stats-json): per-phase wall time, directories visited,
+  listed and pruned, files stat'd and opened, bytes read and cache hit/miss/age, with an
+  optional cProfile dump of the scan loop (--profile)
+- Match previews showing the lines around the first hit of each keyword, captured
+  during the scan so matching files are not read a second time
+- Files with a NUL byte in their first block are skipped as binary, and per-file read
+  budgets (--max-bytes, --max-lines-read, --time-budget) cap the work spent on huge
+  files; skipped and truncated files are reported with their reason in --stats
 - Cross-platform support with proper path handling
 
 Usage:
@@ -31,206 +79,67 @@ Example Use Cases:
 Performance:
 - First search: scans all files (can be slow on large directories)
 - Subsequent searches: uses cached file lists for near-instant results
-- Cache automatically expires after 24 hours to ensure fresh results
+- Reading a matching file stops as soon as every keyword has been seen and the
+  minimum line count is reached (such line counts are shown as e.g. "300+"); with the
+  cache, files that were read to the end have their scan result cached by fingerprint,
+  so later searches with the same keywords do not open them
+- Caches older than 24 hours (or any cache with --refresh) are revalidated with one
+  stat per directory; only directories whose mtime changed are listed again
+
+Modules:
+find_script.py is the command line interface; the search itself lives in sibling modules
+that can be imported on their own:
+
+- find_script_search:     ScriptFinder, search statistics and --top ranking
+- find_script_scan:       keyword matching and the streaming file scanner
+- find_script_walk:       the tree walker, path globs and .gitignore matching
+- find_script_cache:      file list cache, name index, file index and trigram index
+- find_script_archives:   searching inside zip and tar archives
+- find_script_duplicates: duplicate detection, MinHash signatures and LSH
+- find_script_daemon:     the index daemon, its client and inotify watches
 """
 
 import os
 import argparse
 import sys
 import json
-import hashlib
+import cProfile
+import re
+import time
 from pathlib import Path
 from datetime import datetime
 
-class ScriptFinder:
-    def __init__(self, cache_dir=None):
-        if cache_dir is None:
-            cache_dir = '.script_finder_cache'
-        self.cache_dir = Path(cache_dir)
-        self.cache_dir.mkdir(exist_ok=True)
-    
-    def _get_cache_key(self, directory, extensions):
-        """Generate a unique cache key for directory + extensions."""
-        key_string = f"{Path(directory).resolve()}_{'_'.join(sorted(extensions))}"
-        return hashlib.md5(key_string.encode()).hexdigest()
-    
-    def _get_cache_file(self, cache_key):
-        """Get the cache file path for a given key."""
-        return self.cache_dir / f"{cache_key}.json"
-    
-    def _read_cache(self, cache_key, max_age_hours=24):
-        """Read from cache if it exists and is not too old."""
-        cache_file = self._get_cache_file(cache_key)
-        
-        if not cache_file.exists():
-            return None
-        
-        # Check cache age
-        cache_mtime = datetime.fromtimestamp(cache_file.stat().st_mtime)
-        cache_age = (datetime.now() - cache_mtime).total_seconds() / 3600
-        
-        if cache_age > max_age_hours:
-            return None
-        
-        try:
-            with open(cache_file, 'r', encoding='utf-8') as f:
-                return json.load(f)
-        except (json.JSONDecodeError, Exception):
-            return None
-    
-    def _write_cache(self, cache_key, file_list):
-        """Write file list to cache."""
-        cache_file = self._get_cache_file(cache_key)
-        try:
-            with open(cache_file, 'w', encoding='utf-8') as f:
-                json.dump({
-                    'timestamp': datetime.now().isoformat(),
-                    'files': file_list
-                }, f, indent=2)
-            return True
-        except Exception:
-            return False
-    
-    def gather_files(self, directory, extensions, use_cache=True, verbose=False):
-        """
-        Gather all files with specified extensions, with optional caching.
-        
-        Args:
-            directory (str): Directory to search
-            extensions (list): File extensions to include
-            use_cache (bool): Whether to use cached results
-            verbose (bool): Whether to print progress
-            
-        Returns:
-            list: List of file paths
-        """
-        cache_key = self._get_cache_key(directory, extensions)
-        
-        # Try to read from cache
-        if use_cache:
-            cached = self._read_cache(cache_key)
-            if cached is not None:
-                if verbose:
-                    print(f"📁 Using cached file list ({len(cached['files'])} files)")
-                return [Path(f) for f in cached['files']]
-        
-        if verbose:
-            print(f"🔍 Gathering files from: {directory}")
-            print(f"   Extensions: {', '.join(extensions)}")
-        
-        file_list = []
-        extension_set = {ext.lower() for ext in extensions}
-        
-        for root, dirs, files in os.walk(directory):
-            # Skip common directories that are unlikely to contain the script
-            dirs[:] = [d for d in dirs if not self._should_skip_directory(d)]
-            
-            for file in files:
-                file_path = Path(root) / file
-                if file_path.suffix.lower() in extension_set:
-                    file_list.append(file_path)
-            
-            if verbose and len(file_list) % 100 == 0 and len(file_list) > 0:
-                print(f"   Found {len(file_list)} files so far...")
-        
-        # Convert to strings for JSON serialization and cache
-        file_list_str = [str(f) for f in file_list]
-        
-        if use_cache:
-            self._write_cache(cache_key, file_list_str)
-            if verbose:
-                print(f"💾 Cached {len(file_list_str)} files for future searches")
-        
-        return file_list
-    
-    def _should_skip_directory(self, dir_name):
-        """Check if a directory should be skipped during search."""
-        skip_dirs = {
-            'node_modules', '.git', '__pycache__', '.pytest_cache', '.vscode',
-            '.idea', 'venv', 'env', '.env', 'build', 'dist', 'target',
-            'AppData', 'Local Settings', 'Windows', 'System32', 'Temp', 'tmp'
-            "installer_files", "miniconda3", "anaconda3", "miniconda", "anaconda"
-        }
-        return dir_name in skip_dirs or dir_name.startswith('.')
-    
-    def find_script(self, directory, extensions=None, min_lines=300, 
-                   content_keywords=None, use_cache=True, verbose=False):
-        """
-        Find scripts based on file size, line count, and content keywords.
-        
-        Args:
-            directory (str): Root directory to search
-            extensions (list): File extensions to search for (default: ['.py'])
-            min_lines (int): Minimum number of lines required
-            content_keywords (list): Keywords to search for in file content
-            use_cache (bool): Whether to use cached file lists
-            verbose (bool): Whether to print detailed progress
-        """
-        if extensions is None:
-            extensions = ['.py']
-        if content_keywords is None:
-            content_keywords = ['lora', 'LoRA', 'model', 'tag']
-        
-        if verbose:
-            print(f"Search criteria:")
-            print(f"  Directory: {directory}")
-            print(f"  Extensions: {extensions}")
-            print(f"  Minimum lines: {min_lines}")
-            print(f"  Content keywords: {content_keywords}")
-            print(f"  Use cache: {use_cache}")
-            print("-" * 50)
-        
-        # Gather files (with caching)
-        all_files = self.gather_files(directory, extensions, use_cache, verbose)
-        
-        if verbose:
-            print(f"📁 Total files to check: {len(all_files)}")
-        
-        potential_matches = []
-        
-        for file_path in all_files:
-            try:
-                # Count lines and check minimum
-                with open(file_path, 'r', encoding='utf-8', errors='ignore') as f:
-                    lines = f.readlines()
-                
-                line_count = len(lines)
-                
-                if line_count < min_lines:
-                    if verbose:
-                        print(f"⏩ Skipping {file_path.name} - {line_count} lines (< {min_lines})")
-                    continue
-                
-                # Check for content keywords
-                file_content = ''.join(lines).lower()
-                keyword_matches = []
-                
-                for keyword in content_keywords:
-                    if keyword.lower() in file_content:
-                        keyword_matches.append(keyword)
-                
-                if keyword_matches:
-                    match_info = {
-                        'path': file_path,
-                        'line_count': line_count,
-                        'matched_keywords': keyword_matches,
-                        'size_kb': round(file_path.stat().st_size / 1024, 2)
-                    }
-                    potential_matches.append(match_info)
-                    
-                    if verbose:
-                        print(f"✅ Match: {file_path}")
-                        print(f"     Lines: {line_count}, Size: {match_info['size_kb']}KB")
-                        print(f"     Keywords: {', '.join(keyword_matches)}")
-                else:
-                    if verbose:
-                        print(f"⏩ Skipping {file_path.name} - no keyword matches")
-                        
-            except Exception as e:
-                if verbose:
-                    print(f"❌ Error reading {file_path}: {e}")
-        
-        return potential_matches
+from find_script_scan import REGEX_PREFIX, ReadBudget, StatFilter, get_keyword_matcher
+from find_script_duplicates import DEFAULT_SIMILARITY, lsh_bands
+from find_script_cache import DEFAULT_CACHE_SIZE_LIMIT, NAME_RESULT_LIMIT, CacheManager
+from find_script_search import ScriptFinder, SearchStats, format_line_count
+from find_script_daemon import DaemonClient, ScriptFinderDaemon
+
+# Machine-readable output formats (--format) and how their output is buffered:
+# records are written in blocks of OUTPUT_BUFFER_SIZE bytes, or when a record
+# arrives more than OUTPUT_FLUSH_SECONDS after the last flush
+OUTPUT_FORMATS = ('text', 'ndjson', 'tsv', 'null')
+OUTPUT_BUFFER_SIZE = 256 * 1024
+OUTPUT_FLUSH_SECONDS = 1.0
+
+
+def display_match(index, match, show_content_preview=False):
+    """Display a single search result."""
+    print(f"\n{index}. {match['path']}")
+    print(f"   📊 Lines: {format_line_count(match)}, Size: {match['size_kb']}KB")
+    print(f"   🔍 Matched keywords: {', '.join(match['matched_keywords'])}")
+    if 'score' in match:
+        counts = ', '.join(f"{keyword}×{count}" for keyword, count in match['keyword_counts'].items())
+        print(f"   ⭐ Score: {match['score']:.2f} ({counts})")
+    
+    if show_content_preview and match.get('snippets'):
+        # Snippets were captured during the scan, so the file is not read again
+        for snippet in match['snippets']:
+            print(f"   📄 {snippet['keyword']} (line {snippet['line']}):")
+            for number, line in snippet['context']:
+                marker = '>' if number == snippet['line'] else ' '
+                print(f"     {marker}{number:>6}: {line.rstrip()}")
+
 
 def display_results(matches, show_content_preview=False):
     """Display the search results in a formatted way."""
@@ -242,34 +151,340 @@ def display_results(matches, show_content_preview=False):
     print("=" * 80)
     
     for i, match in enumerate(matches, 1):
-        print(f"\n{i}. {match['path']}")
-        print(f"   📊 Lines: {match['line_count']}, Size: {match['size_kb']}KB")
-        print(f"   🔍 Matched keywords: {', '.join(match['matched_keywords'])}")
-        
-        if show_content_preview:
-            try:
-                with open(match['path'], 'r', encoding='utf-8', errors='ignore') as f:
-                    lines = f.readlines()[:5]  # First 5 lines
-                print("   📄 Preview:")
-                for j, line in enumerate(lines, 1):
-                    print(f"      {j}: {line.strip()}")
-            except Exception as e:
-                print(f"   ❌ Could not read preview: {e}")
-
-def clear_cache(cache_dir=None):
-    """Clear all cached file lists."""
-    if cache_dir is None:
-        cache_dir = Path.home() / '.script_finder_cache'
-    cache_dir = Path(cache_dir)
-    
-    if cache_dir.exists():
-        cache_files = list(cache_dir.glob("*.json"))
-        for cache_file in cache_files:
-            cache_file.unlink()
-        print(f"🗑️  Cleared {len(cache_files)} cache files")
+        display_match(i, match, show_content_preview)
+
+
+def display_streaming_results(matches, show_content_preview=False):
+    """Display results as they are found, followed by a summary."""
+    count = 0
+    for count, match in enumerate(matches, 1):
+        display_match(count, match, show_content_preview)
+        sys.stdout.flush()
+    
+    if count == 0:
+        print("❌ No matching files found.")
+        return
+    
+    print("\n" + "=" * 80)
+    print(f"🎉 Found {count} potential matches")
+
+
+def tsv_field(value):
+    """Escape a value for a TSV field (backslash, tab, newline and carriage return)."""
+    return (str(value).replace('\\', '\\\\').replace('\t', '\\t')
+            .replace('\n', '\\n').replace('\r', '\\r'))
+
+
+def format_record(match, output_format):
+    """
+    Encode a match record for machine-readable output.
+    
+    ndjson gives one JSON object per line with the path, line count (and
+    whether it is exact), size in bytes, matched keywords, score (null unless
+    ranking) and any keyword counts and snippets. tsv gives the path, line
+    count, size, comma-separated keywords and score (empty unless ranking),
+    backslash-escaped. null gives the NUL-terminated path only, for xargs -0.
+    """
+    path = str(match['path'])
+    if output_format == 'null':
+        return os.fsencode(path) + b'\0'
+    if output_format == 'tsv':
+        score = match.get('score')
+        fields = (path, match['line_count'], match['size'], ','.join(match['matched_keywords']),
+                  '' if score is None else score)
+        return ('\t'.join(tsv_field(field) for field in fields) + '\n').encode(
+            'utf-8', 'surrogateescape')
+    record = {
+        'path': path,
+        'lines': match['line_count'],
+        'lines_exact': match.get('lines_exact', True),
+        'size': match['size'],
+        'keywords': match['matched_keywords'],
+        'score': match.get('score')
+    }
+    for key in ('keyword_counts', 'snippets'):
+        if key in match:
+            record[key] = match[key]
+    return (json.dumps(record, ensure_ascii=False) + '\n').encode('utf-8', 'surrogateescape')
+
+
+def format_group(group, output_format):
+    """
+    Encode a group of duplicate files for machine-readable output.
+    
+    ndjson gives one JSON object per group with its number, size,
+    fingerprint and paths. tsv gives one row per file with the group number,
+    size, fingerprint and path. null gives each path NUL-terminated, with an
+    extra NUL after each group.
+    """
+    paths = [str(path) for path in group['paths']]
+    if output_format == 'null':
+        return b''.join(os.fsencode(path) + b'\0' for path in paths) + b'\0'
+    if output_format == 'tsv':
+        return ''.join(f"{group['group']}\t{group['size']}\t{group['fingerprint']}\t"
+                       f"{tsv_field(path)}\n" for path in paths).encode('utf-8', 'surrogateescape')
+    record = {key: group[key] for key in ('group', 'size', 'fingerprint')}
+    record['paths'] = paths
+    return (json.dumps(record, ensure_ascii=False) + '\n').encode('utf-8', 'surrogateescape')
+
+
+def format_similar(record, output_format):
+    """
+    Encode a similar file or near-duplicate pair for machine-readable output.
+    
+    ndjson gives one JSON object per record. tsv gives the similarity, size
+    and path of a similar file, or the pair number, similarity and both
+    paths of a pair. null gives each path NUL-terminated, with an extra NUL
+    after each pair.
+    """
+    similarity = round(record['similarity'], 4)
+    if 'paths' in record:
+        paths = [str(path) for path in record['paths']]
+        if output_format == 'null':
+            return b''.join(os.fsencode(path) + b'\0' for path in paths) + b'\0'
+        if output_format == 'tsv':
+            return (f"{record['pair']}\t{similarity}\t"
+                    + '\t'.join(tsv_field(path) for path in paths)
+                    + "\n").encode('utf-8', 'surrogateescape')
+        json_record = {'pair': record['pair'], 'similarity': similarity, 'paths': paths,
+                       'sizes': record['sizes']}
+    else:
+        path = str(record['path'])
+        if output_format == 'null':
+            return os.fsencode(path) + b'\0'
+        if output_format == 'tsv':
+            return (f"{similarity}\t{record['size']}\t{tsv_field(path)}\n"
+                    ).encode('utf-8', 'surrogateescape')
+        json_record = {'path': path, 'size': record['size'], 'similarity': similarity}
+    return (json.dumps(json_record, ensure_ascii=False) + '\n').encode('utf-8', 'surrogateescape')
+
+
+def format_name_match(match, output_format):
+    """
+    Encode a --name match for machine-readable output: its path
+    NUL-terminated (null), a row of score, kind and path (tsv), or a JSON
+    object (ndjson).
+    """
+    path = str(match['path'])
+    if output_format == 'null':
+        return os.fsencode(path) + b'\0'
+    if output_format == 'tsv':
+        return (f"{match['score']}\t{match['kind']}\t{tsv_field(path)}\n"
+                ).encode('utf-8', 'surrogateescape')
+    record = {'path': path, 'kind': match['kind'], 'score': match['score']}
+    return (json.dumps(record, ensure_ascii=False) + '\n').encode('utf-8', 'surrogateescape')
+
+
+def write_records(matches, output_format, stream, formatter=format_record):
+    """
+    Stream match records (or other records, with a formatter such as
+    format_group or format_similar) to a binary stream as they are found.
+    
+    The stream is expected to be block buffered; it is also flushed when a
+    record arrives more than OUTPUT_FLUSH_SECONDS after the last flush, so a
+    slow search still delivers its results. If the reader goes away (e.g.
+    piping into head), the search is stopped quietly.
+    
+    Returns:
+        int: Number of records written
+    """
+    count = 0
+    last_flush = time.monotonic()
+    try:
+        for match in matches:
+            stream.write(formatter(match, output_format))
+            count += 1
+            now = time.monotonic()
+            if now - last_flush > OUTPUT_FLUSH_SECONDS:
+                stream.flush()
+                last_flush = now
+        stream.flush()
+    except BrokenPipeError:
+        # Point the descriptor at /dev/null so the unflushed buffer can be discarded
+        os.dup2(os.open(os.devnull, os.O_WRONLY), stream.fileno())
+    finally:
+        close = getattr(matches, 'close', None)
+        if close is not None:
+            close()
+    return count
+
+
+def display_duplicate_group(group):
+    """Display a group of identical files."""
+    print(f"\n{group['group']}. {len(group['paths'])} copies of {group['size'] / 1024:.2f}KB "
+          f"({group['fingerprint'][:12]})")
+    for path in group['paths']:
+        print(f"   {path}")
+
+
+def display_streaming_duplicates(groups):
+    """Display groups of identical files as they are found, followed by a summary."""
+    count = 0
+    redundant = 0
+    wasted = 0
+    for count, group in enumerate(groups, 1):
+        display_duplicate_group(group)
+        sys.stdout.flush()
+        redundant += len(group['paths']) - 1
+        wasted += group['size'] * (len(group['paths']) - 1)
+    
+    if count == 0:
+        print("❌ No duplicate files found.")
+        return
+    
+    print("\n" + "=" * 80)
+    print(f"🎉 Found {count} groups of duplicates: {redundant} redundant copies "
+          f"using {wasted / 1024 / 1024:.2f}MB")
+
+
+def display_streaming_similar(records):
+    """Display similar files or near-duplicate pairs as they are found, followed by a summary."""
+    count = 0
+    pairs = False
+    for count, record in enumerate(records, 1):
+        if 'paths' in record:
+            pairs = True
+            print(f"\n{record['pair']}. {record['similarity']:.0%} similar")
+            for path, size in zip(record['paths'], record['sizes']):
+                print(f"   {path} ({size / 1024:.2f}KB)")
+        else:
+            print(f"{count}. {record['similarity']:.0%} similar: {record['path']} "
+                  f"({record['size'] / 1024:.2f}KB)")
+        sys.stdout.flush()
+    
+    if count == 0:
+        print("❌ No similar files found.")
+        return
+    
+    print("\n" + "=" * 80)
+    if pairs:
+        print(f"🎉 Found {count} pairs of near-duplicate files")
+    else:
+        print(f"🎉 Found {count} similar files")
+
+
+def display_name_matches(matches, pattern):
+    """Display --name matches, best first."""
+    if not matches:
+        print(f"❌ No file names match '{pattern}'.")
+        return
+    for index, match in enumerate(matches, 1):
+        print(f"{index}. {match['path']} ({match['kind']})")
+    print("\n" + "=" * 80)
+    print(f"🎉 Found {len(matches)} files named like '{pattern}'")
+
+
+def display_stats(stats):
+    """Display a search statistics dict (see SearchStats.as_dict) as a summary."""
+    counters = stats['counters']
+    cache = stats['cache']
+    phases = sorted(stats['phases'].items(), key=lambda item: item[1], reverse=True)
+    
+    print(f"\n📈 Search statistics ({stats['wall_seconds']:.3f}s wall)")
+    print(f"   Phases: {', '.join(f'{name} {seconds:.3f}s' for name, seconds in phases)}")
+    print(f"   Keyword matching: {stats['keyword_match_seconds']:.3f}s (summed over workers)")
+    print(f"   Directories: {counters['dirs_visited']} visited, {counters['dirs_listed']} listed, "
+          f"{counters['dirs_pruned']} pruned ({counters['dirs_ignored']} ignored), "
+          f"{counters['dirs_stat']} stat'd")
+    print(f"   Files: {counters['files_listed']} listed, {counters['files_ignored']} ignored, "
+          f"{counters['files_stat']} stat'd, "
+          f"{counters['files_opened']} opened, {counters['files_indexed']} answered from index, "
+          f"{counters['files_cached']} from the scan cache, "
+          f"{counters['files_below_min_size']} below the size bound, "
+          f"{counters['files_duplicate']} duplicates across roots")
+    if counters['archives_opened'] or counters['archive_listings_cached']:
+        print(f"   Archives: {counters['archives_opened']} opened, "
+              f"{counters['archive_listings_cached']} member listings from the index")
+    print(f"   Bytes read: {counters['bytes_read'] / 1024 / 1024:.2f}MB")
+    print("   Eliminated by stage: " + ' -> '.join(
+        f"{stage} {count}" for stage, count in stats['eliminated'].items()))
+    for label, reasons in (('Skipped', stats['skipped']), ('Truncated', stats['truncated'])):
+        if reasons:
+            print(f"   {label}: " + ', '.join(f"{count} {reason.replace('_', ' ')}"
+                                             for reason, count in sorted(reasons.items())))
+    for limited in stats['limited_files']:
+        print(f"      {limited['reason']}: {limited['path']}")
+    cache_line = f"   Cache: {cache['status']}"
+    if cache['age_hours'] is not None:
+        cache_line += f" ({cache['age_hours']:.2f}h old, from {cache['source']})"
+    print(cache_line)
+
+
+def clear_cache(cache_dir=None, size_limit=DEFAULT_CACHE_SIZE_LIMIT):
+    """Clear all cached file lists and the file metadata and trigram indexes."""
+    cache_manager = CacheManager(cache_dir, size_limit, create=False)
+    if cache_manager.cache_dir.exists():
+        removed = cache_manager.clear()
+        print(f"🗑️  Cleared {removed} cache files")
     else:
         print("💡 No cache directory found")
 
+
+def show_cache_info(cache_dir=None, size_limit=DEFAULT_CACHE_SIZE_LIMIT):
+    """List cached file lists, most recently used first."""
+    cache_manager = CacheManager(cache_dir, size_limit, create=False)
+    entries = cache_manager.entries()
+    if not entries:
+        print("💡 No cached file lists")
+        return
+    
+    print(f"📦 {len(entries)} cached file lists in {cache_manager.cache_dir} "
+          f"({cache_manager.total_size() / 1024 / 1024:.1f}MB, "
+          f"limit {cache_manager.size_limit / 1024 / 1024:.0f}MB)")
+    for entry in sorted(entries.values(), key=lambda e: e['last_used'], reverse=True):
+        last_used = datetime.fromtimestamp(entry['last_used']).strftime('%Y-%m-%d %H:%M')
+        print(f"   {entry['root']} [{' '.join(entry['extensions'])}] "
+              f"{entry['size'] / 1024:.0f}KB, last used {last_used}")
+
+
+def report_stats(stats, args):
+    """Print and/or save search statistics as requested on the command line."""
+    if args.stats:
+        display_stats(stats)
+    if args.stats_json == '-':
+        print(json.dumps(stats, indent=2))
+    elif args.stats_json:
+        with open(args.stats_json, 'w', encoding='utf-8') as f:
+            json.dump(stats, f, indent=2)
+
+
+def parse_size(text):
+    """Parse a byte count with an optional K, M or G suffix (powers of 1024)."""
+    multipliers = {'K': 1024, 'M': 1024 ** 2, 'G': 1024 ** 3}
+    text = text.strip().upper().rstrip('B')
+    multiplier = multipliers.get(text[-1:], 1)
+    if multiplier != 1:
+        text = text[:-1]
+    try:
+        size = int(float(text) * multiplier)
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"invalid size: {text!r}")
+    if size < 1:
+        raise argparse.ArgumentTypeError("size must be positive")
+    return size
+
+
+def parse_time(text):
+    """
+    Parse a point in time given as an age (e.g. 30m, 12h, 7d, 2w) or a date.
+    
+    Returns:
+        float: Unix timestamp
+    """
+    units = {'s': 1, 'm': 60, 'h': 3600, 'd': 86400, 'w': 7 * 86400}
+    text = text.strip()
+    if text[-1:].lower() in units:
+        try:
+            return time.time() - float(text[:-1]) * units[text[-1].lower()]
+        except ValueError:
+            pass
+    try:
+        return datetime.fromisoformat(text).timestamp()
+    except ValueError:
+        raise argparse.ArgumentTypeError(
+            f"invalid time: {text!r} (use an age such as 7d or a date such as 2024-01-31)")
+
+
 def main():
     parser = argparse.ArgumentParser(
         description='Find Python scripts based on size and content criteria',
@@ -282,71 +497,452 @@ Examples:
   # Search without using cache (force fresh file gathering)
   python find_script.py C:\\\\ --no-cache
   
+  # Search several drives or projects at once (each file is scanned once)
+  python find_script.py C:\\\\Projects D:\\\\Work D:\\\\Work\\\\repo --jobs 4
+  
+  # Pick up new files now, re-listing only directories that changed
+  python find_script.py C:\\\\ --refresh
+  
   # Search with custom extensions and line count
   python find_script.py C:\\\\ --ext .py .txt .md --min-lines 200
   
   # Search with specific keywords
   python find_script.py D:\\\\Projects --keywords lora model tag extraction --verbose
   
-  # Show content preview of matches
-  python find_script.py . --preview
+  # Match regexes, only in training scripts (other subtrees are pruned during the walk)
+  python find_script.py D:\\\\Projects --regex "lora_(rank|alpha)" --glob "**/train_*.py"
+  
+  # Also search scripts inside zip, wheel and tar.gz archives, reading members in place
+  python find_script.py D:\\\\Downloads --archives --keywords lora --min-lines 100
+  
+  # Leave out build outputs, caches and data dirs each repository ignores
+  python find_script.py D:\\\\Projects --gitignore --stats
+  
+  # Use the trigram index so repeat keyword searches only read candidate files
+  python find_script.py D:\\\\Projects --keywords lora --trigram-index
+  
+  # Scan file contents with 8 worker threads (useful on NVMe and network mounts)
+  python find_script.py D:\\\\ --jobs 8
+  
+  # Stop as soon as the first match is found anywhere on the drive
+  python find_script.py C:\\\\ --keywords tag_extract --limit 1
+  
+  # Show the 20 most relevant files, ranked by keyword frequency and rarity
+  python find_script.py D:\\\\Projects --keywords lora attention rank --top 20
+  
+  # Stream one JSON object (or TSV row, or NUL-terminated path) per match into a pipeline
+  python find_script.py ~/projects --format ndjson | jq -r .path
+  python find_script.py ~/projects --format tsv --top 100 | ds:fit
+  python find_script.py ~/projects --format tsv | cut -f2 | ds:hist
+  python find_script.py ~/projects --format null | xargs -0 wc -l
+  
+  # Find a file by name from the cached lists in milliseconds (substring or fuzzy)
+  python find_script.py D:\\\\ --name tag_extract
+  python find_script.py ~/projects --name tgxtr --ext .py .ipynb --format null | xargs -0 ls -l
+  
+  # Find identical files (size, then first and last blocks, then full hashes on 8 threads)
+  python find_script.py D:\\\\ --ext .py .ipynb --duplicates --jobs 8
+  python find_script.py ~/projects --duplicates --format tsv | ds:fit
+  
+  # Find forks and lightly edited copies of a script, or every pair of near-duplicates
+  # (MinHash signatures of token shingles, cached by content, matched through LSH bands)
+  python find_script.py D:\\\\Projects --similar-to train_lora.py --threshold 0.7
+  python find_script.py D:\\\\Projects --near-dups --jobs 8 --pool process
+  
+  # Show where each keyword first occurs in the matches, with 3 lines of context
+  python find_script.py . --preview --context 3
+  
+  # Only search files between 10KB and 1MB changed in the last week (settled from stat data)
+  python find_script.py D:\\\\Projects --min-size 10K --max-size 1M --newer-than 7d
+  
+  # Skip binaries and read at most 4MB or 20000 lines of any file, 2 seconds at most
+  python find_script.py D:\\\\ --max-bytes 4M --max-lines-read 20000 --time-budget 2 --stats
+  
+  # Show where the time went, save the numbers as JSON and profile the scan loop
+  python find_script.py D:\\\\Projects --stats --stats-json stats.json --profile scan.prof
+  
+  # Keep file lists hot in a daemon; later searches use it automatically
+  python find_script.py ~/projects --serve &
+  python find_script.py ~/projects --keywords lora
+  python find_script.py --stop-daemon
   
   # Clear all cached file lists
   python find_script.py --clear-cache
+  
+  # Show cached file lists (a search is answered from any cached list of an
+  # ancestor directory with a superset of the extensions)
+  python find_script.py --cache-info
         """
     )
     
-    parser.add_argument('directory', nargs='?', default=Path.home(), 
-                       help='Directory to search (default: home directory)')
+    parser.add_argument('directories', nargs='*', metavar='directory',
+                       help='Directories to search (default: home directory); nested roots are '
+                            'collapsed and several roots are walked concurrently')
     parser.add_argument('--ext', '--extensions', nargs='+', default=['.py'],
                        help='File extensions to search for (default: .py)')
     parser.add_argument('--min-lines', type=int, default=300,
                        help='Minimum number of lines (default: 300)')
-    parser.add_argument('--keywords', nargs='+', 
-                       default=['lora', 'model', 'tag', 'extract'],
-                       help='Keywords to search for in content (default: lora, model, tag, extract)')
+    parser.add_argument('--keywords', nargs='+',
+                       help='Keywords to search for in content (default: lora, model, tag, extract, '
+                            'unless --regex is given)')
+    parser.add_argument('--regex', nargs='+', default=[], metavar='PATTERN',
+                       help='Case-insensitive regular expressions to search for in content, '
+                            'matched in the same pass as the keywords')
+    parser.add_argument('--glob', nargs='+', metavar='PATTERN',
+                       help="Only search files whose path relative to the directory matches a glob, "
+                            "e.g. '**/train_*.py' (combined with --ext; non-matching subtrees "
+                            "are not walked)")
+    parser.add_argument('--gitignore', action='store_true',
+                       help='Skip files and subtrees ignored by .gitignore, .git/info/exclude '
+                            'and the global git ignore file, at every level of the tree')
+    parser.add_argument('--archives', action='store_true',
+                       help='Also search inside zip, wheel, egg and tar(.gz/.bz2/.xz) archives '
+                            'found during the walk, without extracting them (--glob and '
+                            '--gitignore apply to the archives themselves)')
+    parser.add_argument('--format', choices=OUTPUT_FORMATS, default='text',
+                       help='Output format: text for people, or one record per match as it is '
+                            'found: ndjson, tsv (path, lines, size, keywords, score) or null '
+                            '(NUL-terminated paths); with a record format all other output '
+                            'goes to stderr (default: text)')
     parser.add_argument('--preview', action='store_true',
-                       help='Show content preview of matching files')
+                       help='Show the lines around the first hit of each keyword in matching files')
+    parser.add_argument('-C', '--context', type=int, default=2, metavar='N',
+                       help='Lines of context shown around each hit with --preview (default: 2)')
     parser.add_argument('--verbose', action='store_true',
                        help='Show detailed search progress')
     parser.add_argument('--no-cache', action='store_true',
                        help='Ignore cache and gather fresh file list')
+    parser.add_argument('--refresh', action='store_true',
+                       help='Revalidate the cached file list, re-listing only changed directories')
+    parser.add_argument('--trigram-index', action='store_true',
+                       help='Use an on-disk trigram index to only read files that may contain the keywords')
+    parser.add_argument('-j', '--jobs', type=int, default=1,
+                       help='Number of parallel workers for scanning file contents (default: 1)')
+    parser.add_argument('--pool', choices=['thread', 'process'], default='thread',
+                       help='Worker pool for --jobs: thread for I/O-bound trees, '
+                            'process for CPU-bound matching (default: thread)')
+    parser.add_argument('--limit', type=int,
+                       help='Stop searching once this many matches have been found')
+    parser.add_argument('--duplicates', action='store_true',
+                       help='Find groups of files with identical content instead of searching '
+                            '(keywords and line counts are ignored; --limit counts groups)')
+    parser.add_argument('--name', metavar='PATTERN',
+                       help='Find files whose name contains PATTERN (or its characters in '
+                            'order) from the cached file lists, best matches first, without '
+                            'walking the tree (--limit defaults to %d)' % NAME_RESULT_LIMIT)
+    parser.add_argument('--similar-to', metavar='FILE',
+                       help='Find files whose content is similar to FILE instead of searching '
+                            '(keywords and line counts are ignored; --limit counts files)')
+    parser.add_argument('--near-dups', action='store_true',
+                       help='Find pairs of files with similar content instead of searching '
+                            '(keywords and line counts are ignored; --limit counts pairs)')
+    parser.add_argument('--threshold', type=float, default=DEFAULT_SIMILARITY, metavar='J',
+                       help='Smallest Jaccard similarity of token shingles reported by '
+                            '--similar-to and --near-dups (default: %(default)s)')
+    parser.add_argument('--top', type=int, metavar='K',
+                       help='Rank matches by keyword relevance (BM25) and show only the best K')
+    parser.add_argument('--min-size', type=parse_size, metavar='SIZE',
+                       help='Only search files of at least this size, e.g. 10K')
+    parser.add_argument('--max-size', type=parse_size, metavar='SIZE',
+                       help='Only search files of at most this size, e.g. 2M')
+    parser.add_argument('--newer-than', type=parse_time, metavar='TIME',
+                       help='Only search files modified since TIME, an age (30m, 12h, 7d, 2w) '
+                            'or a date (2024-01-31)')
+    parser.add_argument('--older-than', type=parse_time, metavar='TIME',
+                       help='Only search files last modified before TIME')
+    parser.add_argument('--max-bytes', type=parse_size, metavar='SIZE',
+                       help='Read at most this many bytes of each file, e.g. 512K or 4M; '
+                            'longer files are searched only that far')
+    parser.add_argument('--max-lines-read', type=int, metavar='N',
+                       help='Read at most this many lines of each file')
+    parser.add_argument('--time-budget', type=float, metavar='SECONDS',
+                       help='Stop reading a file after this many seconds')
+    parser.add_argument('--scan-binary', action='store_true',
+                       help='Also scan files that look binary (a NUL byte in the first 8KB)')
     parser.add_argument('--clear-cache', action='store_true',
                        help='Clear all cached file lists')
+    parser.add_argument('--cache-info', action='store_true',
+                       help='List cached file lists with their size and last use')
+    parser.add_argument('--serve', action='store_true',
+                       help='Run an index daemon that keeps file lists in memory for fast '
+                            'repeat searches (preloads the given directories)')
+    parser.add_argument('--stop-daemon', action='store_true',
+                       help='Stop a running index daemon')
+    parser.add_argument('--no-daemon', action='store_true',
+                       help='Search locally even if an index daemon is running')
+    parser.add_argument('--stats', action='store_true',
+                       help='Print phase timings and I/O counters after the search')
+    parser.add_argument('--stats-json', metavar='FILE',
+                       help="Write phase timings and I/O counters as JSON ('-' for stdout)")
+    parser.add_argument('--profile', metavar='FILE',
+                       help='Profile the scan loop with cProfile and write the stats to FILE')
+    parser.add_argument('--cache-size-mb', type=float,
+                       default=DEFAULT_CACHE_SIZE_LIMIT / 1024 / 1024,
+                       help='Total size cap for cached file lists; least recently used '
+                            'lists are evicted beyond it (default: %(default).0f)')
     
     args = parser.parse_args()
+    cache_size_limit = int(args.cache_size_mb * 1024 * 1024)
     
-    # Handle clear cache command
+    # Handle cache management commands
     if args.clear_cache:
-        clear_cache()
+        clear_cache(size_limit=cache_size_limit)
+        return
+    if args.cache_info:
+        show_cache_info(size_limit=cache_size_limit)
         return
     
-    # Validate directory
-    if not os.path.exists(args.directory):
-        print(f"Error: Directory '{args.directory}' does not exist")
-        sys.exit(1)
+    # Handle daemon commands
+    if args.stop_daemon:
+        client = DaemonClient()
+        if client.ping():
+            client.shutdown()
+            print("🛑 Daemon stopped")
+        else:
+            print("💡 No daemon running")
+        return
+    if args.serve:
+        preload = [(directory, args.ext) for directory in args.directories]
+        daemon = ScriptFinderDaemon(verbose=True, cache_size_limit=cache_size_limit)
+        try:
+            daemon.serve_forever(preload)
+        except KeyboardInterrupt:
+            pass
+        except RuntimeError as e:
+            print(f"Error: {e}")
+            sys.exit(1)
+        return
+    
+    modes = [name for name, given in (('--name', args.name is not None),
+                                      ('--duplicates', args.duplicates),
+                                      ('--similar-to', args.similar_to is not None),
+                                      ('--near-dups', args.near_dups),
+                                      ('--top', args.top is not None)) if given]
+    if len(modes) > 1:
+        parser.error(f"{' and '.join(modes)} cannot be combined")
+    if not 0 < args.threshold <= 1:
+        parser.error("--threshold must be between 0 and 1")
+    if args.archives and (args.duplicates or args.similar_to is not None or args.near_dups
+                          or args.name is not None):
+        parser.error("--archives only applies to keyword searches")
+    if args.name is not None and (args.no_cache or args.gitignore):
+        parser.error("--name answers from the cached file lists and cannot be combined with "
+                     "--no-cache or --gitignore")
+    if args.similar_to is not None and not os.path.isfile(args.similar_to):
+        parser.error(f"--similar-to file '{args.similar_to}' does not exist")
+    if args.top is not None and args.limit is not None:
+        parser.error("--top and --limit cannot be combined")
+    if args.top is not None and args.top < 1:
+        parser.error("--top must be at least 1")
+    
+    if args.context < 0:
+        parser.error("--context cannot be negative")
+    if args.keywords is None:
+        args.keywords = [] if args.regex else ['lora', 'model', 'tag', 'extract']
+    args.keywords += [REGEX_PREFIX + pattern for pattern in args.regex]
+    try:
+        get_keyword_matcher(tuple(args.keywords))
+    except re.error as e:
+        parser.error(f"invalid --regex pattern: {e}")
+    context_lines = args.context if args.preview else None
+    if args.max_lines_read is not None and args.max_lines_read < 1:
+        parser.error("--max-lines-read must be at least 1")
+    if args.time_budget is not None and args.time_budget <= 0:
+        parser.error("--time-budget must be positive")
+    budget = ReadBudget(args.max_bytes, args.max_lines_read, args.time_budget,
+                        not args.scan_binary)
+    stat_filter = StatFilter(args.min_size or 0, args.max_size, args.newer_than, args.older_than)
+    
+    if not args.directories:
+        args.directories = [Path.home()]
+    
+    # Validate directories
+    for directory in args.directories:
+        if not os.path.exists(directory):
+            print(f"Error: Directory '{directory}' does not exist")
+            sys.exit(1)
     
+    # Keep stdout for records in a block-buffered stream; the banner, progress
+    # and statistics go to stderr
+    output = None
+    if args.format != 'text':
+        sys.stdout.flush()
+        output = os.fdopen(os.dup(sys.stdout.fileno()), 'wb', buffering=OUTPUT_BUFFER_SIZE)
+        sys.stdout = sys.stderr
+    
+    if args.name is not None:
+        finder = ScriptFinder(cache_size_limit=cache_size_limit)
+        stats = SearchStats()
+        limit = args.limit if args.limit is not None else NAME_RESULT_LIMIT
+        started = time.perf_counter()
+        matches = finder.find_names(args.directories, args.name, args.ext, verbose=args.verbose,
+                                    refresh=args.refresh, jobs=args.jobs, limit=limit,
+                                    stats=stats, path_globs=args.glob)
+        if output is None:
+            display_name_matches(matches, args.name)
+            print(f"⏱️  {(time.perf_counter() - started) * 1000:.1f}ms")
+        else:
+            write_records(matches, args.format, output, format_name_match)
+        report_stats(stats.as_dict(), args)
+        return
+    
+    similarity_search = args.similar_to is not None or args.near_dups
     print("🔍 Script Search Tool with Caching")
-    print(f"Searching for files with:")
+    if args.similar_to is not None:
+        print(f"Searching for files similar to {args.similar_to} with:")
+    elif args.near_dups:
+        print("Searching for near-duplicate files with:")
+    else:
+        print(f"Searching for {'duplicate ' if args.duplicates else ''}files with:")
     print(f"  - Extensions: {', '.join(args.ext)}")
-    print(f"  - Minimum lines: {args.min_lines}")
-    print(f"  - Keywords: {', '.join(args.keywords)}")
+    if similarity_search:
+        bands, rows = lsh_bands(args.threshold)
+        print(f"  - Similarity threshold: {args.threshold} "
+              f"(Jaccard, {bands} LSH bands of {rows} rows)")
+    elif not args.duplicates:
+        print(f"  - Minimum lines: {args.min_lines}")
+        print(f"  - Keywords: {', '.join(args.keywords)}")
+    if args.glob:
+        print(f"  - Path globs: {', '.join(args.glob)}")
+    if args.gitignore:
+        print(f"  - Respecting .gitignore files")
+    if args.archives:
+        print(f"  - Searching inside archives")
     print(f"  - Use cache: {not args.no_cache}")
+    if stat_filter.describe():
+        print(f"  - File filter: {stat_filter.describe()}")
+    if args.limit is not None:
+        print(f"  - Limit: {args.limit} matches")
+    if args.top is not None:
+        print(f"  - Top: {args.top} matches by relevance")
+    if budget[:3] != (None, None, None):
+        limits = [f"{args.max_bytes} bytes" if args.max_bytes else None,
+                  f"{args.max_lines_read} lines" if args.max_lines_read else None,
+                  f"{args.time_budget}s" if args.time_budget else None]
+        print(f"  - Read budget per file: {', '.join(limit for limit in limits if limit)}")
     print()
     
-    # Initialize finder and perform search
-    finder = ScriptFinder()
-    matches = finder.find_script(
-        directory=args.directory,
+    if args.duplicates:
+        finder = ScriptFinder(cache_size_limit=cache_size_limit)
+        stats = SearchStats(stages=SearchStats.DUPLICATE_STAGES)
+        groups = finder.iter_duplicates(
+            directory=args.directories,
+            extensions=args.ext,
+            use_cache=not args.no_cache,
+            verbose=args.verbose,
+            refresh=args.refresh,
+            jobs=args.jobs,
+            stats=stats,
+            path_globs=args.glob,
+            gitignore=args.gitignore,
+            stat_filter=stat_filter,
+            limit=args.limit
+        )
+        if output is None:
+            display_streaming_duplicates(groups)
+        else:
+            write_records(groups, args.format, output, format_group)
+        report_stats(stats.as_dict(), args)
+        return
+    
+    if similarity_search:
+        finder = ScriptFinder(cache_size_limit=cache_size_limit)
+        stats = SearchStats(stages=SearchStats.SIMILARITY_STAGES)
+        options = dict(
+            directory=args.directories,
+            extensions=args.ext,
+            threshold=args.threshold,
+            use_cache=not args.no_cache,
+            verbose=args.verbose,
+            refresh=args.refresh,
+            jobs=args.jobs,
+            pool=args.pool,
+            stats=stats,
+            path_globs=args.glob,
+            gitignore=args.gitignore,
+            stat_filter=stat_filter,
+            limit=args.limit
+        )
+        if args.similar_to is not None:
+            records = finder.iter_similar(args.similar_to, **options)
+        else:
+            records = finder.iter_near_duplicates(**options)
+        try:
+            if output is None:
+                display_streaming_similar(records)
+            else:
+                write_records(records, args.format, output, format_similar)
+        except ValueError as e:
+            print(f"Error: {e}")
+            sys.exit(1)
+        report_stats(stats.as_dict(), args)
+        return
+    
+    # Use a running daemon when the search can be answered from its hot index
+    # (the daemon serves one tree per query and keeps whole file lists, so
+    # multi-root, --gitignore and --archives searches run locally, as do
+    # searches asking for a process pool, a profile or progress output, which
+    # only a local search can give)
+    client = DaemonClient()
+    if len(args.directories) == 1 and not args.no_cache and not args.no_daemon \
+            and not args.gitignore and not args.archives and args.pool == 'thread' \
+            and not args.profile and not args.verbose and client.ping():
+        matches = client.iter_matches(
+            directory=args.directories[0],
+            extensions=args.ext,
+            min_lines=args.min_lines,
+            content_keywords=args.keywords,
+            refresh=args.refresh,
+            use_trigram_index=args.trigram_index,
+            jobs=args.jobs,
+            limit=args.limit,
+            top=args.top,
+            context_lines=context_lines,
+            path_globs=args.glob,
+            budget=budget,
+            stat_filter=stat_filter
+        )
+        if output is None:
+            display_streaming_results(matches, show_content_preview=args.preview)
+        else:
+            write_records(matches, args.format, output)
+        if client.stats is not None:
+            report_stats(client.stats, args)
+        return
+    
+    # Initialize finder and print matches as they are found
+    finder = ScriptFinder(cache_size_limit=cache_size_limit)
+    stats = SearchStats(profiler=cProfile.Profile() if args.profile else None)
+    matches = finder.iter_matches(
+        directory=args.directories,
         extensions=args.ext,
         min_lines=args.min_lines,
         content_keywords=args.keywords,
         use_cache=not args.no_cache,
-        verbose=args.verbose
+        verbose=args.verbose,
+        refresh=args.refresh,
+        use_trigram_index=args.trigram_index,
+        jobs=args.jobs,
+        pool=args.pool,
+        limit=args.limit,
+        stats=stats,
+        top=args.top,
+        context_lines=context_lines,
+        path_globs=args.glob,
+        budget=budget,
+        gitignore=args.gitignore,
+        stat_filter=stat_filter,
+        archives=args.archives
     )
-    
-    # Display results
-    display_results(matches, show_content_preview=args.preview)
+    if output is None:
+        display_streaming_results(matches, show_content_preview=args.preview)
+    else:
+        write_records(matches, args.format, output)
+    report_stats(stats.as_dict(), args)
+    if args.profile:
+        stats.dump_profile(args.profile)
+        print(f"🧪 Scan loop profile written to {args.profile}")
+
 
 if __name__ == "__main__":
     main()
@@ -0,0 +1,172 @@
+"""
+Script Finder Archives
+
+Searching inside zip, wheel, egg and tar(.gz) archives for find_script.py. Members are
+filtered by name and the size and mtime recorded in the archive, then streamed
+through the same scanner as plain files (see find_script_scan) without extracting
+anything.
+"""
+
+import os
+import tarfile
+import time
+import zipfile
+from collections import namedtuple
+from pathlib import Path
+
+from find_script_scan import get_keyword_matcher, new_scan_result, scan_stream
+
+# Archives whose members are searched with --archives, read in place without extracting
+ZIP_SUFFIXES = ('.zip', '.whl', '.egg')
+TAR_SUFFIXES = ('.tar', '.tar.gz', '.tgz', '.tar.bz2', '.tbz2', '.tar.xz', '.txz')
+# Extensions the walk lists for them (compound suffixes end in one of these)
+ARCHIVE_EXTENSIONS = ('.zip', '.whl', '.egg', '.tar', '.gz', '.tgz', '.bz2', '.tbz2',
+                      '.xz', '.txz')
+
+
+class MemberStat(namedtuple('MemberStat', 'st_size st_mtime')):
+    """The stat data of an archive member that predicates and match records use."""
+    __slots__ = ()
+
+
+def archive_kind(name):
+    """Return 'zip' or 'tar' for an archive file name, or None for other files."""
+    name = name.lower()
+    if name.endswith(ZIP_SUFFIXES):
+        return 'zip'
+    if name.endswith(TAR_SUFFIXES):
+        return 'tar'
+    return None
+
+
+def member_rejection(member, extension_set, min_lines, stat_filter):
+    """
+    Check an archive listing entry against the predicates answered without reading it.
+    
+    Returns:
+        str: The stage that rules the member out ('extension' or 'stat'), or None
+    """
+    name, size, mtime = member
+    if os.path.splitext(name)[1].lower() not in extension_set:
+        return 'extension'
+    member_stat = MemberStat(size, mtime)
+    if size < min_lines or (stat_filter is not None and stat_filter.rejects(member_stat)):
+        return 'stat'
+    return None
+
+
+def scan_archive(archive_path, listing, extension_set, min_lines, content_keywords,
+                 count_keywords=False, context_lines=None, budget=None, stat_filter=None):
+    """
+    Scan the members of a zip or tar archive without extracting it.
+    
+    This is a module-level function so it can run in worker threads or
+    processes. Members are ruled out from the listing first (extension, size
+    and mtime, see member_rejection) and the rest are streamed through
+    scan_stream straight from the archive, one chunk at a time. Zip members
+    are opened through the central directory; tar archives (compressed or
+    not) are read front to back in a single pass, stopping after the last
+    member needed. Without a listing, one is built during the same pass.
+    
+    Member results carry no fingerprint, as members have no path of their
+    own to record in the file index.
+    
+    Args:
+        archive_path (Path): Archive to scan
+        listing (list): Cached member listing (see FileIndex.archive_listing),
+            or None to read it from the archive
+        extension_set (set): Lowercased extensions of the members to scan
+        See scan_file for the remaining arguments.
+        
+    Returns:
+        dict: The archive's path, stat result and listing (with whether it
+              was read from the archive), the scan results of the members
+              scanned (see scan_file; their paths are the archive path joined
+              with the member name), the number of members ruled out at each
+              stage, and any error opening the archive
+    """
+    outcome = {
+        'path': archive_path,
+        'stat': None,
+        'listing': listing,
+        'fresh': listing is None,
+        'results': [],
+        'eliminated': {'extension': 0, 'stat': 0},
+        'error': None
+    }
+    matcher = get_keyword_matcher(tuple(content_keywords))
+    
+    def scan_member(f, member):
+        name, size, mtime = member
+        result = new_scan_result(Path(archive_path, name.lstrip('/')))
+        result['stat'] = MemberStat(size, mtime)
+        counts = {} if count_keywords else None
+        snippets = {} if context_lines is not None else None
+        try:
+            result['bytes_read'] = 0
+            (result['line_count'], result['lines_exact'], matched_keywords, _,
+             result['match_seconds'], result['limited']) = scan_stream(
+                f, min_lines, matcher, counts, snippets, context_lines, budget, size)
+            result['bytes_read'] = f.tell()
+            if counts is not None:
+                result['keyword_counts'] = matcher.counts_for(counts)
+            if result['line_count'] >= min_lines:
+                result['matched_keywords'] = matched_keywords
+                if snippets is not None:
+                    result['snippets'] = matcher.snippets_for(snippets)
+        except Exception as e:
+            result['error'] = e
+        outcome['results'].append(result)
+    
+    def wanted(member):
+        stage = member_rejection(member, extension_set, min_lines, stat_filter)
+        if stage is not None:
+            outcome['eliminated'][stage] += 1
+        return stage is None
+    
+    try:
+        outcome['stat'] = os.stat(archive_path)
+        if archive_kind(archive_path.name) == 'zip':
+            with zipfile.ZipFile(archive_path) as archive:
+                if listing is None:
+                    outcome['listing'] = listing = [
+                        [info.filename, info.file_size,
+                         time.mktime(info.date_time + (0, 0, -1))]
+                        for info in archive.infolist() if not info.is_dir()]
+                for member in listing:
+                    if wanted(member):
+                        try:
+                            with archive.open(member[0]) as f:
+                                scan_member(f, member)
+                        except Exception as e:
+                            result = new_scan_result(Path(archive_path, member[0].lstrip('/')))
+                            result['error'] = e
+                            outcome['results'].append(result)
+        else:
+            remaining = None
+            if listing is not None:
+                remaining = {member[0] for member in listing if wanted(member)}
+            else:
+                outcome['listing'] = []
+            # Stream mode reads the archive sequentially without seeking back
+            with tarfile.open(archive_path, 'r|*') as archive:
+                for info in archive:
+                    if remaining is not None and not remaining:
+                        break
+                    if not info.isfile():
+                        continue
+                    member = [info.name, info.size, info.mtime]
+                    if remaining is None:
+                        outcome['listing'].append(member)
+                        if not wanted(member):
+                            continue
+                    elif info.name not in remaining:
+                        continue
+                    else:
+                        remaining.discard(info.name)
+                    scan_member(archive.extractfile(info), member)
+    except Exception as e:
+        outcome['error'] = e
+        if outcome['fresh']:
+            outcome['listing'] = None
+    return outcome
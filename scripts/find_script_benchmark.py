@@ -0,0 +1,360 @@
+"""
+Script Finder Benchmark Suite
+
+This script measures find_script.py on reproducible synthetic trees. It generates a tree
+with a configurable shape (depth, fan-out, file count), file size distribution and keyword
+density, including skip-listed directories such as node_modules, and then times each phase
+of a search separately:
+
+- cold_walk:     walking the tree without any cache
+- cache_write:   encoding and writing the file list cache
+- cache_load:    reading the file list back from a fresh cache
+- scan_cold:     scanning file contents with an empty file index
+- scan_warm:     scanning again once the file index is populated
+
+Results are printed as a table and can be written as JSON for regression tracking and
+for comparing walker and scanner variants.
+
+Usage:
+    python find_script_benchmark.py [options]
+
+The generated tree is written to a temporary directory, which is removed afterwards unless
+--keep is given. A --tree-dir is never removed: it is generated into on the first run and
+reused by later runs with the same tree parameters, while a --tree-dir holding anything
+else (unrelated files, or a tree generated with other parameters) is refused.
+
+Examples:
+    # Phase timings on a 100k file tree, as JSON
+    python find_script_benchmark.py --files 100000 --json results.json
+
+    # Compare the original os.walk walker with the scandir walker on 1M empty files
+    python find_script_benchmark.py --files 1000000 --size-dist empty --compare-walkers --jobs 1 4 16
+"""
+
+import os
+import argparse
+import json
+import math
+import platform
+import random
+import shutil
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+from find_script import ScriptFinder
+
+TREE_MARKER = '.benchmark_tree'
+
+EXTENSIONS = ['.py', '.md', '.txt', '.json', '.js']
+
+SKIP_DIR_NAMES = ['node_modules', '__pycache__', '.git']
+
+FILLER_LINE = "value_{0} = compute(value_{1}, scale={2})  # filler line\n"
+
+
+def file_lines(rng, size_dist, mean_lines):
+    """Draw a file length in lines from the size distribution."""
+    if size_dist == 'empty':
+        return 0
+    if size_dist == 'fixed':
+        return mean_lines
+    # Log-normal with the requested mean, which gives the long tail real trees have
+    sigma = 1.0
+    mu = math.log(max(mean_lines, 1)) - sigma ** 2 / 2
+    return int(rng.lognormvariate(mu, sigma))
+
+
+def generate_tree(root, files=100000, fanout=10, depth=3, seed=0, size_dist='lognormal',
+                  mean_lines=200, keyword_density=0.05, keywords=('lora',), skip_fraction=0.2):
+    """
+    Generate a reproducible synthetic tree.
+
+    Directories form a complete tree with the given fanout and depth. Every
+    directory also gets skip-listed children (node_modules and friends) so the
+    walkers have subtrees to prune; skip_fraction of the files go into those.
+    The remaining files are spread evenly over the regular directories. A
+    keyword_density fraction of files get one of the keywords on a random line.
+
+    Returns:
+        dict: Counts of directories, files and keyword files created
+    """
+    rng = random.Random(seed)
+    root = Path(root)
+    directories = [root]
+    level = [root]
+    for d in range(depth):
+        level = [parent / f"dir_{d}_{i}" for parent in level for i in range(fanout)]
+        directories.extend(level)
+    skipped = [d / name for d in directories for name in SKIP_DIR_NAMES]
+
+    for directory in directories + skipped:
+        directory.mkdir(parents=True, exist_ok=True)
+
+    keyword_files = 0
+    for i in range(files):
+        if rng.random() < skip_fraction:
+            directory = skipped[i % len(skipped)]
+        else:
+            directory = directories[i % len(directories)]
+        ext = rng.choice(EXTENSIONS)
+        lines = file_lines(rng, size_dist, mean_lines)
+        content = [FILLER_LINE.format(n, n - 1, n % 7) for n in range(lines)]
+        if content and rng.random() < keyword_density:
+            content[rng.randrange(len(content))] = f"# uses {rng.choice(keywords)} weights\n"
+            keyword_files += 1
+        with open(directory / f"file_{i}{ext}", 'w', encoding='utf-8') as f:
+            f.writelines(content)
+
+    return {
+        'directories': len(directories),
+        'skipped_directories': len(skipped),
+        'files': files,
+        'keyword_files': keyword_files
+    }
+
+
+def legacy_walk(directory, extensions):
+    """The original gather_files walk: os.walk, a Path per file, skip set rebuilt per call."""
+    def should_skip(dir_name):
+        skip_dirs = {
+            'node_modules', '.git', '__pycache__', '.pytest_cache', '.vscode',
+            '.idea', 'venv', 'env', '.env', 'build', 'dist', 'target',
+            'AppData', 'Local Settings', 'Windows', 'System32', 'Temp', 'tmp'
+            "installer_files", "miniconda3", "anaconda3", "miniconda", "anaconda"
+        }
+        return dir_name in skip_dirs or dir_name.startswith('.')
+
+    file_list = []
+    extension_set = {ext.lower() for ext in extensions}
+    for root, dirs, files in os.walk(directory):
+        dirs[:] = [d for d in dirs if not should_skip(d)]
+        for file in files:
+            file_path = Path(root) / file
+            if file_path.suffix.lower() in extension_set:
+                file_list.append(file_path)
+    return file_list
+
+
+def time_call(func, repeat=1):
+    """Return the best wall time of repeat calls and the last result."""
+    best = None
+    result = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = func()
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best, result
+
+
+def run_phases(tree_dir, extensions, keywords, min_lines, jobs, repeat):
+    """
+    Time each search phase on a tree with a fresh cache directory.
+
+    Returns:
+        tuple: (phase name -> seconds, counts)
+    """
+    cache_dir = tempfile.mkdtemp(prefix='sf_bench_cache_')
+    try:
+        finder = ScriptFinder(cache_dir=cache_dir)
+        extension_set = {ext.lower() for ext in extensions}
+        phases = {}
+
+        phases['cold_walk'], dir_records = time_call(
+            lambda: dict(finder._iter_walk(tree_dir, extension_set, jobs=jobs)), repeat)
+        file_count = sum(len(record['files']) for record in dir_records.values())
+
+        phases['cache_write'], _ = time_call(
+            lambda: finder.cache.store(tree_dir, extensions, dir_records), repeat)
+        cache_bytes = finder.cache.total_size()
+
+        phases['cache_load'], files = time_call(
+            lambda: finder.gather_files(tree_dir, extensions), repeat)
+
+        def scan():
+            return finder.find_script(tree_dir, extensions, min_lines=min_lines,
+                                      content_keywords=keywords, jobs=jobs)
+
+        # The first scan populates the file index, so it is only run once
+        phases['scan_cold'], matches = time_call(scan, 1)
+        phases['scan_warm'], _ = time_call(scan, repeat)
+
+        counts = {
+            'directories_walked': len(dir_records),
+            'files_gathered': file_count,
+            'files_loaded': len(files),
+            'cache_bytes': cache_bytes,
+            'matches': len(matches)
+        }
+        return phases, counts
+    finally:
+        shutil.rmtree(cache_dir, ignore_errors=True)
+
+
+def compare_walkers(tree_dir, extensions, jobs_list, repeat):
+    """Time the original os.walk walker against the scandir walker at each job count."""
+    finder = ScriptFinder(cache_dir=tempfile.mkdtemp(prefix='sf_bench_cache_'))
+    try:
+        results = {}
+        results['os.walk (original)'], files = time_call(
+            lambda: legacy_walk(tree_dir, extensions), repeat)
+        for jobs in jobs_list:
+            results[f'scandir (jobs={jobs})'], _ = time_call(
+                lambda: finder.gather_files(tree_dir, extensions, use_cache=False, jobs=jobs),
+                repeat)
+        return results, len(files)
+    finally:
+        shutil.rmtree(finder.cache_dir, ignore_errors=True)
+
+
+def compare_gitignore(tree_dir, extensions, jobs_list, repeat):
+    """Time an uncached walk of an existing tree with and without .gitignore pruning."""
+    finder = ScriptFinder(cache_dir=tempfile.mkdtemp(prefix='sf_bench_cache_'))
+    try:
+        results = {}
+        for jobs in jobs_list:
+            for gitignore in (False, True):
+                seconds, files = time_call(
+                    lambda: finder.gather_files(tree_dir, extensions, use_cache=False, jobs=jobs,
+                                                gitignore=gitignore), repeat)
+                label = f"{'gitignore' if gitignore else 'plain'} (jobs={jobs})"
+                results[label] = {
+                    'seconds': seconds,
+                    'files': len(files),
+                    'directories': finder.stats.counters['dirs_listed']
+                }
+        return results
+    finally:
+        shutil.rmtree(finder.cache_dir, ignore_errors=True)
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description='Benchmark find_script.py on a generated tree',
+        formatter_class=argparse.RawDescriptionHelpFormatter
+    )
+    parser.add_argument('--files', type=int, default=100000,
+                       help='Number of files in the generated tree (default: 100000)')
+    parser.add_argument('--fanout', type=int, default=10,
+                       help='Subdirectories per directory (default: 10)')
+    parser.add_argument('--depth', type=int, default=3,
+                       help='Directory depth (default: 3)')
+    parser.add_argument('--size-dist', choices=['empty', 'fixed', 'lognormal'], default='lognormal',
+                       help='File size distribution (default: lognormal)')
+    parser.add_argument('--mean-lines', type=int, default=200,
+                       help='Mean lines per file (default: 200)')
+    parser.add_argument('--keyword-density', type=float, default=0.05,
+                       help='Fraction of files containing a keyword (default: 0.05)')
+    parser.add_argument('--skip-fraction', type=float, default=0.2,
+                       help='Fraction of files placed in skip-listed directories (default: 0.2)')
+    parser.add_argument('--seed', type=int, default=0,
+                       help='Random seed for the generated tree (default: 0)')
+    parser.add_argument('--ext', '--extensions', nargs='+', default=['.py'],
+                       help='Extensions to search (default: .py)')
+    parser.add_argument('--keywords', nargs='+', default=['lora'],
+                       help='Keywords planted in the tree and searched for (default: lora)')
+    parser.add_argument('--min-lines', type=int, default=100,
+                       help='Minimum lines for the content scan (default: 100)')
+    parser.add_argument('--jobs', type=int, nargs='+', default=[1],
+                       help='Worker counts to measure (default: 1)')
+    parser.add_argument('--repeat', type=int, default=3,
+                       help='Runs per phase, the best time is reported (default: 3)')
+    parser.add_argument('--compare-walkers', action='store_true',
+                       help='Also time the original os.walk walker against the scandir walker')
+    parser.add_argument('--gitignore-tree', metavar='DIR',
+                       help='Also time walking an existing tree (e.g. a directory of real '
+                            'repositories) with and without --gitignore pruning')
+    parser.add_argument('--json', metavar='FILE',
+                       help="Write results as JSON to FILE ('-' for stdout)")
+    parser.add_argument('--tree-dir',
+                       help='Directory to generate the tree in (default: a temporary directory)')
+    parser.add_argument('--keep', action='store_true',
+                       help='Keep the temporary tree (a --tree-dir is always kept)')
+
+    args = parser.parse_args()
+    log = sys.stderr if args.json == '-' else sys.stdout
+
+    tree_params = {
+        'files': args.files, 'fanout': args.fanout, 'depth': args.depth,
+        'size_dist': args.size_dist, 'mean_lines': args.mean_lines,
+        'keyword_density': args.keyword_density, 'keywords': args.keywords,
+        'skip_fraction': args.skip_fraction, 'seed': args.seed
+    }
+    if args.tree_dir:
+        tree_dir = Path(args.tree_dir)
+        marker = tree_dir / TREE_MARKER
+        if marker.exists():
+            if json.loads(marker.read_text()) != tree_params:
+                parser.error(f"--tree-dir {tree_dir} holds a tree generated with other "
+                             f"parameters; remove it or choose another directory")
+        elif tree_dir.is_dir() and any(tree_dir.iterdir()):
+            parser.error(f"--tree-dir {tree_dir} is not empty and holds no generated tree")
+    else:
+        tree_dir = Path(tempfile.mkdtemp(prefix='sf_bench_'))
+        marker = tree_dir / TREE_MARKER
+
+    results = {
+        'tree': tree_params,
+        'search': {'extensions': args.ext, 'keywords': args.keywords, 'min_lines': args.min_lines},
+        'python': sys.version.split()[0],
+        'platform': platform.platform(),
+        'cpus': os.cpu_count(),
+        'runs': []
+    }
+
+    try:
+        if marker.exists():
+            print(f"♻️  Reusing tree in {tree_dir}", file=log)
+        else:
+            print(f"🌳 Generating {args.files} files in {tree_dir}...", file=log)
+            elapsed, generated = time_call(lambda: generate_tree(
+                tree_dir, args.files, args.fanout, args.depth, args.seed, args.size_dist,
+                args.mean_lines, args.keyword_density, args.keywords, args.skip_fraction))
+            marker.write_text(json.dumps(tree_params))
+            print(f"   Generated {generated['keyword_files']} keyword files in {elapsed:.1f}s",
+                  file=log)
+
+        print(f"\n{'jobs':>5}{'phase':>14}{'seconds':>10}", file=log)
+        for jobs in args.jobs:
+            phases, counts = run_phases(tree_dir, args.ext, args.keywords, args.min_lines,
+                                        jobs, args.repeat)
+            results['runs'].append({'jobs': jobs, 'phases': phases, 'counts': counts})
+            for phase, seconds in phases.items():
+                print(f"{jobs:>5}{phase:>14}{seconds:>10.3f}", file=log)
+            print(f"      {counts['files_gathered']} files, {counts['directories_walked']} directories, "
+                  f"{counts['matches']} matches, {counts['cache_bytes']} cache bytes", file=log)
+
+        if args.compare_walkers:
+            walkers, file_count = compare_walkers(tree_dir, args.ext, args.jobs, args.repeat)
+            results['walkers'] = walkers
+            baseline = walkers['os.walk (original)']
+            print(f"\n{'walker':<24}{'files':>10}{'seconds':>10}{'speedup':>10}", file=log)
+            for walker, seconds in walkers.items():
+                print(f"{walker:<24}{file_count:>10}{seconds:>10.3f}{baseline / seconds:>10.2f}",
+                      file=log)
+
+        if args.gitignore_tree:
+            walks = compare_gitignore(args.gitignore_tree, args.ext, args.jobs, args.repeat)
+            results['gitignore'] = {'tree': args.gitignore_tree, 'walks': walks}
+            print(f"\n{'walk of ' + args.gitignore_tree:<32}{'dirs':>8}{'files':>10}"
+                  f"{'seconds':>10}", file=log)
+            for label, walk in walks.items():
+                print(f"{label:<32}{walk['directories']:>8}{walk['files']:>10}"
+                      f"{walk['seconds']:>10.3f}", file=log)
+    finally:
+        # Only the temporary directory is ours to remove
+        if not args.tree_dir and not args.keep:
+            shutil.rmtree(tree_dir, ignore_errors=True)
+
+    if args.json == '-':
+        json.dump(results, sys.stdout, indent=2)
+        print()
+    elif args.json:
+        with open(args.json, 'w', encoding='utf-8') as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,1534 @@
+"""
+Script Finder Cache and Indexes
+
+The persistent state behind find_script.py, kept under the cache directory:
+
+- CacheManager:  binary file list caches (.sfc) per directory and extension set,
+                 with per-directory mtimes for incremental revalidation, the manifest
+                 and the size limit
+- NameIndex:     memory-mapped n-gram index of basenames (.sfn) for --name queries
+- FileIndex:     SQLite index of per-file stat signatures, line counts, fingerprints,
+                 cached scan results, MinHash signatures and archive listings
+- GitBlobIndex:  blob ids read from .git/index for files whose stat still matches
+- TrigramIndex:  SQLite trigram index narrowing keyword searches to candidate files
+"""
+
+import os
+import bisect
+import codecs
+import json
+import hashlib
+import heapq
+import math
+import mmap
+import re
+import struct
+import sqlite3
+import subprocess
+import threading
+import time
+from array import array
+from collections.abc import Mapping
+from pathlib import Path
+from datetime import datetime
+
+from find_script_scan import (
+    BINARY_SNIFF_SIZE, SCAN_CHUNK_SIZE, ReadBudget, fold_case, required_literal,
+    stat_signature, trigrams)
+from find_script_duplicates import MINHASH_SCHEME
+
+DEFAULT_CACHE_DIR = Path.home() / '.script_finder_cache'
+DEFAULT_CACHE_SIZE_LIMIT = 512 * 1024 * 1024
+CACHE_MANIFEST_NAME = 'manifest.json'
+
+CACHE_VERSION = 4
+CACHE_MAGIC = b'SFC\0'
+CACHE_SUFFIX = '.sfc'
+CACHE_HEADER = struct.Struct('<4sHHdIIQ')
+CACHE_DIR_ENTRY = struct.Struct('<dIIQQIII')
+CACHE_CHILD = struct.Struct('<I')
+NO_PARENT = 0xFFFFFFFF
+
+# Basename index kept next to each cached file list for --name queries
+NAME_INDEX_SUFFIX = '.sfn'
+NAME_INDEX_MAGIC = b'SFN\0'
+NAME_INDEX_VERSION = 1
+NAME_INDEX_HEADER = struct.Struct('<4sHHdIII')
+NAME_INDEX_PAIR = struct.Struct('=2I')
+# Grams of one to NAME_GRAM_SIZE bytes are indexed, keyed by length and bytes
+NAME_GRAM_SIZE = 3
+# Results shown for --name when no --limit is given
+NAME_RESULT_LIMIT = 50
+
+# Directories modified this recently are relisted on the next revalidation
+RACY_MTIME_SECONDS = 2
+
+FILE_INDEX_NAME = 'file_index.sqlite3'
+
+# ctime, mtime (seconds and nanoseconds each), dev, inode, mode, uid, gid and
+# size at the start of each git index entry
+GIT_INDEX_ENTRY = struct.Struct('>10I')
+TRIGRAM_INDEX_NAME = 'trigram_index.sqlite3'
+# Posted for files the trigram index did not read to the end (binary files and
+# files past the byte budget), which are candidates for every query
+UNREAD_GRAM = 1 << 24
+
+
+def path_prefix_range(directory):
+    """
+    Return the (lower, upper) bounds of absolute paths under a directory.
+    
+    Paths under the directory sort between its path with a trailing separator and
+    the same string with the separator incremented, which lets indexes select a
+    subtree with a range query.
+    """
+    prefix = os.path.join(os.path.abspath(directory), '')
+    return prefix, prefix[:-1] + chr(ord(prefix[-1]) + 1)
+
+
+def encode_cache(dir_records):
+    """
+    Encode directory records in the compact binary cache format.
+    
+    Layout (little endian):
+        header      magic, version, timestamp, directory count, file count and
+                    the offset of the string table
+        directories one fixed-size entry per directory in top-down walk order:
+                    mtime (NaN when untrusted), parent index, the offset and
+                    length of its name and of its NUL-separated file names, and
+                    the start and length of its run in the child table
+        children    directory indexes, one run per directory holding its
+                    subdirectories sorted by name
+        strings     directory names followed by file basenames
+    
+    Directory paths are stored as a name plus a parent index, so every path
+    shares its prefix with its parent instead of repeating it, and file names
+    are stored once as basenames. The sorted child runs let a reader find a
+    path by bisecting one directory at a time instead of decoding every name.
+    Names are encoded with os.fsencode so names that are not valid UTF-8
+    round-trip.
+    """
+    index_of = {}
+    fields = []
+    children = []
+    strings = bytearray()
+    file_count = 0
+    
+    for position, (rel_dir, record) in enumerate(dir_records.items()):
+        index_of[rel_dir] = position
+        parent_dir, name = os.path.split(rel_dir)
+        parent = index_of.get(parent_dir, NO_PARENT) if rel_dir else NO_PARENT
+        
+        name = os.fsencode(name)
+        name_offset = len(strings)
+        strings += name
+        if parent != NO_PARENT:
+            children[parent].append((name, position))
+        children.append([])
+        
+        files = b'\0'.join(os.fsencode(f) for f in record['files'])
+        files_offset = len(strings)
+        strings += files
+        file_count += len(record['files'])
+        
+        mtime = record['mtime'] if record['mtime'] is not None else math.nan
+        fields.append((mtime, parent, len(name), name_offset, files_offset, len(files)))
+    
+    entries = []
+    child_table = []
+    for entry_fields, runs in zip(fields, children):
+        entries.append(CACHE_DIR_ENTRY.pack(*entry_fields, len(child_table), len(runs)))
+        child_table.extend(position for _, position in sorted(runs))
+    
+    strings_offset = (CACHE_HEADER.size + CACHE_DIR_ENTRY.size * len(entries)
+                      + CACHE_CHILD.size * len(child_table))
+    header = CACHE_HEADER.pack(CACHE_MAGIC, CACHE_VERSION, 0, time.time(),
+                               len(entries), file_count, strings_offset)
+    return b''.join([header, *entries, *map(CACHE_CHILD.pack, child_table), bytes(strings)])
+
+
+class CachedDirRecords(Mapping):
+    """
+    Read-only, lazily decoded view of a binary cache file.
+    
+    The file is memory-mapped and only its header is parsed up front. A lookup
+    bisects the sorted child runs from the root down, decoding only the names
+    it compares, and a directory's file names are decoded from the map when its
+    record is accessed, so a query that only needs part of the tree never
+    decodes the rest. Positions found along the way are remembered, which
+    makes the lookups of a top-down walk one bisection each.
+    """
+    
+    def __init__(self, cache_file):
+        with open(cache_file, 'rb') as f:
+            self._map = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        try:
+            (magic, version, _, self.timestamp, self._dir_count, self.file_count,
+             self._strings_offset) = CACHE_HEADER.unpack_from(self._map, 0)
+            if magic != CACHE_MAGIC or version != CACHE_VERSION:
+                raise ValueError(f"Unsupported cache format in {cache_file}")
+            
+            self._children_offset = CACHE_HEADER.size + CACHE_DIR_ENTRY.size * self._dir_count
+            if not self._children_offset <= self._strings_offset <= len(self._map):
+                raise ValueError(f"Truncated cache file {cache_file}")
+            self._positions = {'': 0} if self._dir_count else {}
+        except Exception:
+            self._map.close()
+            raise
+    
+    def _entry(self, position):
+        return CACHE_DIR_ENTRY.unpack_from(self._map,
+                                           CACHE_HEADER.size + CACHE_DIR_ENTRY.size * position)
+    
+    def _child(self, index):
+        offset = self._children_offset + CACHE_CHILD.size * index
+        return CACHE_CHILD.unpack_from(self._map, offset)[0]
+    
+    def _name(self, position):
+        _, _, name_length, name_offset, _, _, _, _ = self._entry(position)
+        start = self._strings_offset + name_offset
+        return self._map[start:start + name_length]
+    
+    def _find_child(self, position, name):
+        """Bisect a directory's child run for a subdirectory name (bytes)."""
+        _, _, _, _, _, _, first, count = self._entry(position)
+        low, high = first, first + count
+        while low < high:
+            middle = (low + high) // 2
+            if self._name(self._child(middle)) < name:
+                low = middle + 1
+            else:
+                high = middle
+        if low < first + count:
+            child = self._child(low)
+            if self._name(child) == name:
+                return child
+        return None
+    
+    def _position(self, rel_dir):
+        """Return the entry index of a directory, or None if it is not cached."""
+        names = []
+        while rel_dir not in self._positions:
+            if not rel_dir:
+                return None
+            rel_dir, name = os.path.split(rel_dir)
+            names.append(name)
+        position = self._positions[rel_dir]
+        for name in reversed(names):
+            position = self._find_child(position, os.fsencode(name))
+            if position is None:
+                return None
+            rel_dir = os.path.join(rel_dir, name) if rel_dir else name
+            self._positions[rel_dir] = position
+        return position
+    
+    def __getitem__(self, rel_dir):
+        position = self._position(rel_dir)
+        if position is None:
+            raise KeyError(rel_dir)
+        mtime, _, _, _, files_offset, files_length, first, count = self._entry(position)
+        start = self._strings_offset + files_offset
+        files = self._map[start:start + files_length]
+        # Entries are in walk order, so index order is the listing order
+        subdirs = sorted(self._child(index) for index in range(first, first + count))
+        return {
+            'mtime': None if math.isnan(mtime) else mtime,
+            'files': [os.fsdecode(f) for f in files.split(b'\0')] if files else [],
+            'subdirs': [os.fsdecode(self._name(child)) for child in subdirs]
+        }
+    
+    def __iter__(self):
+        rel_dirs = []
+        for position in range(self._dir_count):
+            parent = self._entry(position)[1]
+            if parent == NO_PARENT:
+                rel_dir = ''
+            else:
+                parent_dir = rel_dirs[parent]
+                name = os.fsdecode(self._name(position))
+                rel_dir = os.path.join(parent_dir, name) if parent_dir else name
+            rel_dirs.append(rel_dir)
+            yield rel_dir
+    
+    def __contains__(self, rel_dir):
+        return isinstance(rel_dir, str) and self._position(rel_dir) is not None
+    
+    def __len__(self):
+        return self._dir_count
+    
+    def close(self):
+        """Release the memory map."""
+        if not self._map.closed:
+            self._map.close()
+
+
+class SubtreeRecords(Mapping):
+    """
+    View of cached directory records restricted to a subtree and extension set.
+    
+    Keys are made relative to the subtree root and file lists are filtered to
+    the requested extensions, so a cache of an ancestor directory with more
+    extensions can stand in for the cache of the query itself.
+    """
+    
+    def __init__(self, records, rel_root, extension_set, source):
+        self._records = records
+        self._rel_root = rel_root
+        self._prefix = os.path.join(rel_root, '') if rel_root else ''
+        self._extension_set = extension_set
+        self.source = source
+    
+    def _outer_key(self, rel_dir):
+        if not self._rel_root:
+            return rel_dir
+        return os.path.join(self._rel_root, rel_dir) if rel_dir else self._rel_root
+    
+    def __getitem__(self, rel_dir):
+        record = dict(self._records[self._outer_key(rel_dir)])
+        if self._extension_set is not None:
+            record['files'] = [f for f in record['files']
+                               if os.path.splitext(f)[1].lower() in self._extension_set]
+        return record
+    
+    def __iter__(self):
+        for rel_dir in self._records:
+            if rel_dir == self._rel_root:
+                yield ''
+            elif rel_dir.startswith(self._prefix):
+                yield rel_dir[len(self._prefix):]
+    
+    def __len__(self):
+        return sum(1 for _ in self)
+    
+    def __contains__(self, rel_dir):
+        return self._outer_key(rel_dir) in self._records
+    
+    def close(self):
+        self._records.close()
+
+
+def build_name_index(dir_records, source_timestamp):
+    """
+    Build the basename index of a cached file list (see NameIndex).
+    
+    Layout (header little endian, tables native-endian uint32):
+        header      magic, version, the timestamp of the file list it was
+                    built from, and the directory, name and gram counts
+        directories offsets into a blob of directory paths, sorted so that
+                    every subtree is a contiguous range of directory ids
+        names       offsets into a blob of distinct basenames
+        occurrences offsets into the ids of the directories holding each name
+        grams       sorted keys (see name_gram_key) of the lowercased one to
+                    three byte grams, with offsets into the postings
+        postings    for each gram, the ids of the names containing it
+    
+    Blobs are padded to a multiple of four bytes so the tables stay aligned.
+    """
+    rel_dirs = sorted((os.fsencode(rel_dir) for rel_dir in dir_records), key=NameIndex._sort_key)
+    name_ids = {}
+    occurrences = []
+    for dir_id, rel_dir in enumerate(rel_dirs):
+        for name in dir_records[os.fsdecode(rel_dir)]['files']:
+            name = os.fsencode(name)
+            name_id = name_ids.setdefault(name, len(name_ids))
+            if name_id == len(occurrences):
+                occurrences.append([])
+            occurrences[name_id].append(dir_id)
+    
+    postings = {}
+    for name, name_id in name_ids.items():
+        lower = name.lower()
+        keys = {name_gram_key(lower[i:i + size])
+                for size in range(1, NAME_GRAM_SIZE + 1) for i in range(len(lower) - size + 1)}
+        for key in keys:
+            postings.setdefault(key, []).append(name_id)
+    
+    def strings(values):
+        offsets = array('I', [0])
+        blob = bytearray()
+        for value in values:
+            blob += value
+            offsets.append(len(blob))
+        blob += b'\0' * (-len(blob) % 4)
+        return offsets.tobytes() + bytes(blob)
+    
+    def lists(values):
+        offsets = array('I', [0])
+        items = array('I')
+        for value in values:
+            items.extend(value)
+            offsets.append(len(items))
+        return offsets.tobytes() + items.tobytes()
+    
+    gram_keys = sorted(postings)
+    header = NAME_INDEX_HEADER.pack(NAME_INDEX_MAGIC, NAME_INDEX_VERSION, 0, source_timestamp,
+                                    len(rel_dirs), len(name_ids), len(gram_keys))
+    return b''.join([header, strings(rel_dirs), strings(name_ids), lists(occurrences),
+                     array('I', gram_keys).tobytes(),
+                     lists(postings[key] for key in gram_keys)])
+
+
+class NameIndex:
+    """
+    Read-only view of a basename index file (see build_name_index).
+    
+    The file is memory-mapped and only the gram keys are read up front;
+    names, postings and directory paths are read from the map as a query
+    touches them, so a query costs about as much as the postings it reads,
+    however many files the list holds.
+    
+    A pattern is matched against basenames case-insensitively, as a
+    substring or, failing that, as a subsequence (its characters in order,
+    with gaps). Substring candidates are the names holding all of the
+    pattern's grams (its trigrams, or the pattern itself when shorter) and
+    subsequence candidates the names holding all of its bytes; each
+    candidate is then checked and scored.
+    """
+    
+    def __init__(self, index_file):
+        with open(index_file, 'rb') as f:
+            self._map = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        try:
+            (magic, version, _, self.source_timestamp, self.dir_count, self.name_count,
+             gram_count) = NAME_INDEX_HEADER.unpack_from(self._map, 0)
+            if magic != NAME_INDEX_MAGIC or version != NAME_INDEX_VERSION:
+                raise ValueError(f"Unsupported name index format in {index_file}")
+            position = NAME_INDEX_HEADER.size
+            self._dirs, position = self._strings_at(position, self.dir_count)
+            self._names, position = self._strings_at(position, self.name_count)
+            self._occurrences, position = self._lists_at(position, self.name_count)
+            self._gram_keys = array('I')
+            self._gram_keys.frombytes(self._map[position:position + 4 * gram_count])
+            self._postings, _ = self._lists_at(position + 4 * gram_count, gram_count)
+        except Exception:
+            self._map.close()
+            raise
+    
+    def _uint(self, offset):
+        return NAME_INDEX_PAIR.unpack_from(self._map, offset)[0]
+    
+    def _strings_at(self, position, count):
+        """Return (offsets table position, blob position) and the position after the section."""
+        blob = position + 4 * (count + 1)
+        length = self._uint(blob - 4)
+        return (position, blob), blob + length + (-length % 4)
+    
+    def _lists_at(self, position, count):
+        items = position + 4 * (count + 1)
+        return (position, items), items + 4 * self._uint(items - 4)
+    
+    def _string(self, table, index):
+        offsets, blob = table
+        start, end = NAME_INDEX_PAIR.unpack_from(self._map, offsets + 4 * index)
+        return self._map[blob + start:blob + end]
+    
+    def _list(self, table, index):
+        offsets, items = table
+        start, end = NAME_INDEX_PAIR.unpack_from(self._map, offsets + 4 * index)
+        values = array('I')
+        values.frombytes(self._map[items + 4 * start:items + 4 * end])
+        return values
+    
+    def _list_length(self, table, index):
+        start, end = NAME_INDEX_PAIR.unpack_from(self._map, table[0] + 4 * index)
+        return end - start
+    
+    def _posting_index(self, gram):
+        """Return the index of a gram's posting, or None if no name contains it."""
+        key = name_gram_key(gram)
+        index = bisect.bisect_left(self._gram_keys, key)
+        if index == len(self._gram_keys) or self._gram_keys[index] != key:
+            return None
+        return index
+    
+    def _candidates(self, grams):
+        """
+        Return the ids of the names that may contain every one of the grams.
+        
+        Postings are intersected shortest first, and the intersection stops
+        once the candidates are far fewer than the next posting is long:
+        checking those names directly is then cheaper than reading it.
+        """
+        indexes = [self._posting_index(gram) for gram in set(grams)]
+        if None in indexes:
+            return set()
+        indexes.sort(key=lambda index: self._list_length(self._postings, index))
+        ids = set(self._list(self._postings, indexes[0]))
+        for index in indexes[1:]:
+            if len(ids) * 16 < self._list_length(self._postings, index):
+                break
+            ids.intersection_update(self._list(self._postings, index))
+        return ids
+    
+    def dir_path(self, dir_id):
+        """Return the path of a directory relative to the root of the file list."""
+        return os.fsdecode(self._string(self._dirs, dir_id))
+    
+    def dir_range(self, rel_dir):
+        """
+        Return the range of directory ids in a subtree, or None if the file
+        list does not cover the directory.
+        """
+        if not rel_dir:
+            return range(self.dir_count)
+        key = self._sort_key(os.fsencode(rel_dir))
+        first = self._bisect_dirs(key)
+        if first == self.dir_count or self._sort_key(self._string(self._dirs, first)) != key:
+            return None
+        # Descendants sort right after the directory, as the separator sorts first
+        return range(first, self._bisect_dirs(key + b'\1'))
+    
+    @staticmethod
+    def _sort_key(rel_dir):
+        return rel_dir.replace(os.fsencode(os.sep), b'\0')
+    
+    def _bisect_dirs(self, key):
+        """Return the first directory id whose sort key is not below key."""
+        low, high = 0, self.dir_count
+        while low < high:
+            middle = (low + high) // 2
+            if self._sort_key(self._string(self._dirs, middle)) < key:
+                low = middle + 1
+            else:
+                high = middle
+        return low
+    
+    def search(self, pattern, extension_set=None, dir_range=None, limit=None):
+        """
+        Find files whose basename matches a pattern, best matches first.
+        
+        Matching names are ranked before their directories are read, which
+        is only done for the best names until the limit is reached. Substring
+        matches always rank above subsequence matches, so the subsequence
+        pass is skipped once substring matches fill the limit.
+        
+        Args:
+            pattern (str): Text to look for in basenames
+            extension_set (set): Only return names with one of these
+                lowercased extensions (None for any)
+            dir_range (range): Only return files in these directories (see
+                dir_range; None for all)
+            limit (int): Return at most this many files
+            
+        Returns:
+            list: (score, kind, relative directory, basename) tuples, where kind
+                  is 'exact', 'prefix', 'substring' or 'fuzzy'
+        """
+        needle = os.fsencode(pattern).lower()
+        if not needle:
+            return []
+        fuzzy = re.compile(b'.*?'.join(re.escape(needle[i:i + 1]) for i in range(len(needle))),
+                           re.DOTALL)
+        matches = []
+        seen = set()
+        
+        def collect(candidates, substring_only):
+            ranked = []
+            for name_id in candidates:
+                if name_id in seen:
+                    continue
+                lower = self._string(self._names, name_id).lower()
+                if substring_only and needle not in lower:
+                    continue
+                if extension_set is not None and \
+                        os.fsdecode(os.path.splitext(lower)[1]) not in extension_set:
+                    continue
+                scored = name_score(needle, lower, fuzzy)
+                if scored is not None:
+                    seen.add(name_id)
+                    ranked.append((-scored[0], lower, name_id, scored[1]))
+            heapq.heapify(ranked)
+            while ranked and (limit is None or len(matches) < limit):
+                score, _, name_id, kind = heapq.heappop(ranked)
+                name = os.fsdecode(self._string(self._names, name_id))
+                for dir_id in self._list(self._occurrences, name_id):
+                    if dir_range is None or dir_id in dir_range:
+                        matches.append((-score, kind, dir_id, name))
+        
+        size = min(len(needle), NAME_GRAM_SIZE)
+        collect(self._candidates(needle[i:i + size] for i in range(len(needle) - size + 1)), True)
+        if len(needle) > 1 and (limit is None or len(matches) < limit):
+            collect(self._candidates(needle[i:i + 1] for i in range(len(needle))), False)
+        
+        if limit is not None:
+            matches = matches[:limit]
+        return [(score, kind, self.dir_path(dir_id), name)
+                for score, kind, dir_id, name in matches]
+    
+    def close(self):
+        """Release the memory map."""
+        if not self._map.closed:
+            self._map.close()
+
+
+def name_gram_key(gram):
+    """Return the index key of a gram of one to NAME_GRAM_SIZE bytes."""
+    return len(gram) << 24 | int.from_bytes(gram, 'big')
+
+
+def name_score(needle, name, fuzzy):
+    """
+    Score how well a lowercased basename matches a lowercased pattern.
+    
+    An exact match of the name or of its stem ranks first, then a prefix,
+    then a substring (higher when it starts a word), then a subsequence,
+    scored by how tightly packed its characters are. Within a kind, shorter
+    names rank higher.
+    
+    Returns:
+        tuple: (score, kind), or None if the name does not match
+    """
+    length_penalty = min(len(name), 255) / 1024
+    if name == needle or os.path.splitext(name)[0] == needle:
+        return 4.0 - length_penalty, 'exact'
+    if name.startswith(needle):
+        return 3.0 - length_penalty, 'prefix'
+    at = name.find(needle)
+    if at > 0:
+        word_start = not name[at - 1:at].isalnum()
+        return (2.5 if word_start else 2.0) - length_penalty, 'substring'
+    match = fuzzy.search(name)
+    if match is None:
+        return None
+    return 1.0 + 0.5 * len(needle) / (match.end() - match.start()) - length_penalty, 'fuzzy'
+
+
+class CacheManager:
+    """
+    Manages the cached file lists in the cache directory.
+    
+    A manifest records the resolved root, extensions, size and last use of each
+    cached file list. A query is answered from its own cache entry or, failing
+    that, from any entry for an ancestor directory (or the same directory) whose
+    extensions are a superset of the query's, by filtering it. Once the total
+    size of the cached lists exceeds the size limit, the least recently used
+    entries are evicted.
+    
+    Each list may also have a basename index next to it (see NameIndex),
+    built the first time a --name query needs it and rebuilt once the list
+    has been rewritten; its size counts towards the limit.
+    """
+    
+    def __init__(self, cache_dir=None, size_limit=DEFAULT_CACHE_SIZE_LIMIT, create=True):
+        self.cache_dir = Path(cache_dir) if cache_dir is not None else DEFAULT_CACHE_DIR
+        self.size_limit = size_limit
+        # Serializes manifest updates when several roots are walked concurrently
+        self._lock = threading.RLock()
+        if create:
+            self.cache_dir.mkdir(parents=True, exist_ok=True)
+    
+    @staticmethod
+    def cache_key(directory, extensions):
+        """Generate a unique cache key for directory + extensions."""
+        key_string = f"{Path(directory).resolve()}_{'_'.join(sorted(extensions))}"
+        return hashlib.md5(key_string.encode()).hexdigest()
+    
+    def cache_file(self, cache_key):
+        """Get the cache file path for a given key."""
+        return self.cache_dir / f"{cache_key}{CACHE_SUFFIX}"
+    
+    def name_index_file(self, cache_key):
+        """Get the basename index path for a given key."""
+        return self.cache_dir / f"{cache_key}{NAME_INDEX_SUFFIX}"
+    
+    def _manifest_file(self):
+        return self.cache_dir / CACHE_MANIFEST_NAME
+    
+    def entries(self):
+        """Return the manifest entries (cache key -> entry) for existing cache files."""
+        try:
+            with open(self._manifest_file(), 'r', encoding='utf-8') as f:
+                entries = json.load(f).get('entries', {})
+        except (OSError, ValueError):
+            return {}
+        return {key: entry for key, entry in entries.items() if self.cache_file(key).exists()}
+    
+    def _save_entries(self, entries):
+        manifest_file = self._manifest_file()
+        temp_file = manifest_file.with_name(manifest_file.name + '.tmp')
+        try:
+            with open(temp_file, 'w', encoding='utf-8') as f:
+                json.dump({'version': 1, 'entries': entries}, f, indent=2)
+            os.replace(temp_file, manifest_file)
+        except OSError:
+            pass
+    
+    @staticmethod
+    def _entry_size(entry):
+        return entry['size'] + entry.get('name_index_size', 0)
+    
+    def total_size(self):
+        """Total size in bytes of the cached file lists and their name indexes."""
+        return sum(self._entry_size(entry) for entry in self.entries().values())
+    
+    def _open(self, cache_key):
+        """Open a cache file, returning its records along with its age in hours."""
+        cache_file = self.cache_file(cache_key)
+        try:
+            cache_mtime = datetime.fromtimestamp(cache_file.stat().st_mtime)
+            cache_age = (datetime.now() - cache_mtime).total_seconds() / 3600
+            return CachedDirRecords(cache_file), cache_age
+        except (ValueError, OSError, struct.error):
+            return None, None
+    
+    def lookup(self, directory, extensions):
+        """
+        Find cached records that can answer a query.
+        
+        The query's own entry is preferred, then the entry with the closest
+        ancestor root and the fewest extensions. An entry only covers a
+        subdirectory it actually walked into, so subtrees it pruned are never
+        answered from it.
+        
+        Returns:
+            tuple: (records, age in hours) or (None, None). The records have a
+                   source attribute describing where they came from and must be
+                   closed by the caller.
+        """
+        with self._lock:
+            return self._lookup(directory, extensions)
+    
+    def _candidates(self, directory, extensions, entries):
+        """
+        Return the entries that may cover a query, best first.
+        
+        Returns:
+            list: (whether the entry is another query's, cache key, path of the
+                   query relative to the entry's root) tuples
+        """
+        root = str(Path(directory).resolve())
+        extension_set = {ext.lower() for ext in extensions}
+        own_key = self.cache_key(directory, extensions)
+        
+        candidates = []
+        for key, entry in entries.items():
+            entry_root = entry['root']
+            if root != entry_root and not root.startswith(os.path.join(entry_root, '')):
+                continue
+            if not extension_set <= set(entry['extensions']):
+                continue
+            candidates.append((key != own_key, -len(entry_root), len(entry['extensions']), key))
+        
+        ranked = []
+        for is_other, _, _, key in sorted(candidates):
+            rel_root = os.path.relpath(root, entries[key]['root']) if is_other else ''
+            ranked.append((is_other, key, '' if rel_root == os.curdir else rel_root))
+        return ranked
+    
+    def _lookup(self, directory, extensions):
+        extension_set = {ext.lower() for ext in extensions}
+        entries = self.entries()
+        
+        for is_other, key, rel_root in self._candidates(directory, extensions, entries):
+            records, age = self._open(key)
+            if records is None:
+                continue
+            entry = entries[key]
+            if rel_root not in records:
+                records.close()
+                continue
+            
+            source = f"{entry['root']} ({' '.join(entry['extensions'])})"
+            view = SubtreeRecords(records, rel_root, extension_set if is_other else None, source)
+            entry['last_used'] = time.time()
+            self._save_entries(entries)
+            return view, age
+        
+        return None, None
+    
+    def name_index(self, directory, extensions):
+        """
+        Open the basename index of a cached file list that covers a query.
+        
+        Entries are tried in the same order as by lookup. An entry's index is
+        built from its file list if it has none yet or if the list has been
+        rewritten since (it records the timestamp of the list it was built
+        from); otherwise only the index is opened, and the file list itself
+        is not read.
+        
+        Returns:
+            tuple: (NameIndex, range of the query's directory ids in it, root of
+                   the indexed list, source description, age of the list in
+                   hours) or (None, None, None, None, None). The index must be
+                   closed by the caller.
+        """
+        with self._lock:
+            entries = self.entries()
+            for _, key, rel_root in self._candidates(directory, extensions, entries):
+                cache_file = self.cache_file(key)
+                index_file = self.name_index_file(key)
+                try:
+                    with open(cache_file, 'rb') as f:
+                        timestamp = CACHE_HEADER.unpack(f.read(CACHE_HEADER.size))[3]
+                    cache_age = (time.time() - cache_file.stat().st_mtime) / 3600
+                    try:
+                        index = NameIndex(index_file)
+                        if index.source_timestamp != timestamp:
+                            index.close()
+                            index = None
+                    except (OSError, ValueError, struct.error):
+                        index = None
+                    if index is None:
+                        records = CachedDirRecords(cache_file)
+                        try:
+                            data = build_name_index(records, timestamp)
+                        finally:
+                            records.close()
+                        temp_file = index_file.with_name(index_file.name + '.tmp')
+                        with open(temp_file, 'wb') as f:
+                            f.write(data)
+                        os.replace(temp_file, index_file)
+                        entries[key]['name_index_size'] = len(data)
+                        index = NameIndex(index_file)
+                except (OSError, ValueError, struct.error):
+                    continue
+                
+                dir_range = index.dir_range(rel_root)
+                if dir_range is None:
+                    index.close()
+                    continue
+                entry = entries[key]
+                entry['last_used'] = time.time()
+                self._evict(entries, keep=key)
+                self._save_entries(entries)
+                source = f"{entry['root']} ({' '.join(entry['extensions'])})"
+                return index, dir_range, entry['root'], source, cache_age
+        return None, None, None, None, None
+    
+    def store(self, directory, extensions, dir_records, previous=None):
+        """
+        Write per-directory file listings for a query and evict old entries.
+        
+        The cache file is replaced atomically. Any previous mapping it was
+        revalidated from is closed first, after its records have been encoded
+        into the new file.
+        """
+        cache_key = self.cache_key(directory, extensions)
+        cache_file = self.cache_file(cache_key)
+        try:
+            data = encode_cache(dir_records)
+            if previous is not None:
+                previous.close()
+        except Exception:
+            return False
+        
+        with self._lock:
+            try:
+                temp_file = cache_file.with_name(cache_file.name + '.tmp')
+                with open(temp_file, 'wb') as f:
+                    f.write(data)
+                os.replace(temp_file, cache_file)
+                # The name index of the previous list is stale now
+                self.name_index_file(cache_key).unlink(missing_ok=True)
+            except OSError:
+                return False
+            
+            entries = self.entries()
+            entries[cache_key] = {
+                'root': str(Path(directory).resolve()),
+                'extensions': sorted({ext.lower() for ext in extensions}),
+                'size': len(data),
+                'last_used': time.time()
+            }
+            self._evict(entries, keep=cache_key)
+            self._save_entries(entries)
+        return True
+    
+    def _evict(self, entries, keep=None):
+        """Remove untracked cache files and least recently used entries over the size limit."""
+        for suffix in (CACHE_SUFFIX, NAME_INDEX_SUFFIX):
+            for cache_file in self.cache_dir.glob(f"*{suffix}"):
+                if cache_file.name[:-len(suffix)] not in entries:
+                    cache_file.unlink(missing_ok=True)
+        
+        total = sum(self._entry_size(entry) for entry in entries.values())
+        for key in sorted(entries, key=lambda k: entries[k]['last_used']):
+            if total <= self.size_limit:
+                break
+            if key == keep:
+                continue
+            total -= self._entry_size(entries[key])
+            self.cache_file(key).unlink(missing_ok=True)
+            self.name_index_file(key).unlink(missing_ok=True)
+            del entries[key]
+    
+    def clear(self):
+        """
+        Remove all cached file lists, the manifest and the indexes (with their
+        SQLite journal files), returning the number of cache files removed.
+        """
+        cache_files = [f for pattern in (f"*{CACHE_SUFFIX}", f"*{NAME_INDEX_SUFFIX}")
+                       for f in self.cache_dir.glob(pattern)]
+        # JSON file lists written by earlier versions
+        cache_files.extend(f for f in self.cache_dir.glob('*.json')
+                           if f.name != CACHE_MANIFEST_NAME)
+        for index_name in (FILE_INDEX_NAME, TRIGRAM_INDEX_NAME):
+            cache_files.extend(f for suffix in ('', '-wal', '-shm', '-journal')
+                               for f in [self.cache_dir / (index_name + suffix)] if f.exists())
+        for cache_file in cache_files:
+            cache_file.unlink(missing_ok=True)
+        manifest_file = self._manifest_file()
+        for stale_file in (manifest_file, manifest_file.with_name(manifest_file.name + '.tmp')):
+            stale_file.unlink(missing_ok=True)
+        return len(cache_files)
+
+
+class FileIndex:
+    """
+    Persistent per-file metadata index stored next to the file list cache.
+    
+    Each file is recorded with its stat signature (size, mtime, inode) along with
+    its line count and a content fingerprint (its git blob id), so unchanged
+    files never need to be reopened to answer line count questions.
+    
+    Scan results are also cached by content rather than by path: the line
+    count of each fingerprint, and the matched keywords, keyword counts and
+    snippets of each (fingerprint, scan key) pair, where the scan key
+    identifies the keywords and options the scan ran with. Copies of the same
+    content anywhere (clones, worktrees, backups) share one cached result, and
+    a file whose stat signature matches is answered without being opened.
+    MinHash signatures (see minhash_file) are cached by fingerprint the same way.
+    
+    The member listings of archives are kept as well, keyed on the archive's
+    size and mtime, so a warm --archives search knows which members are
+    worth reading without opening the archive.
+    """
+    VERSION = 2
+    SCHEMA = """
+        CREATE TABLE IF NOT EXISTS files (
+            path TEXT PRIMARY KEY,
+            size INTEGER NOT NULL,
+            mtime_ns INTEGER NOT NULL,
+            inode INTEGER NOT NULL,
+            line_count INTEGER NOT NULL,
+            fingerprint TEXT NOT NULL
+        );
+        CREATE TABLE IF NOT EXISTS blobs (
+            fingerprint TEXT PRIMARY KEY,
+            line_count INTEGER NOT NULL
+        ) WITHOUT ROWID;
+        CREATE TABLE IF NOT EXISTS scans (
+            fingerprint TEXT NOT NULL,
+            scan_key TEXT NOT NULL,
+            matched_keywords TEXT NOT NULL,
+            keyword_counts TEXT,
+            snippets TEXT,
+            PRIMARY KEY (fingerprint, scan_key)
+        ) WITHOUT ROWID;
+        CREATE TABLE IF NOT EXISTS minhashes (
+            fingerprint TEXT NOT NULL,
+            scheme TEXT NOT NULL,
+            signature BLOB NOT NULL,
+            PRIMARY KEY (fingerprint, scheme)
+        ) WITHOUT ROWID;
+        CREATE TABLE IF NOT EXISTS archives (
+            path TEXT PRIMARY KEY,
+            size INTEGER NOT NULL,
+            mtime_ns INTEGER NOT NULL,
+            members TEXT NOT NULL
+        );
+    """
+    
+    def __init__(self, index_file):
+        self.index_file = Path(index_file)
+        self._conn = sqlite3.connect(str(self.index_file))
+        # Indexes written by older versions used another fingerprint, so start over
+        if self._conn.execute('PRAGMA user_version').fetchone()[0] != self.VERSION:
+            with self._conn:
+                for table in ('files', 'blobs', 'scans', 'minhashes', 'archives'):
+                    self._conn.execute(f'DROP TABLE IF EXISTS {table}')
+                self._conn.execute(f'PRAGMA user_version = {self.VERSION}')
+        self._conn.executescript(self.SCHEMA)
+        self._pending = []
+        self._pending_blobs = {}
+        self._pending_scans = {}
+        self._pending_minhashes = {}
+        self._pending_archives = {}
+    
+    @staticmethod
+    def signature(stat_result):
+        """Return the (size, mtime_ns, inode) signature of a stat result."""
+        return stat_signature(stat_result)
+    
+    def load(self, directory):
+        """
+        Load index entries for all files under a directory.
+        
+        Returns:
+            dict: Absolute path -> (size, mtime_ns, inode, line_count, fingerprint)
+        """
+        rows = self._conn.execute(
+            'SELECT path, size, mtime_ns, inode, line_count, fingerprint FROM files '
+            'WHERE path >= ? AND path < ?', path_prefix_range(directory))
+        return {row[0]: row[1:] for row in rows}
+    
+    def update(self, path, stat_result, line_count, file_fingerprint):
+        """
+        Queue an entry for a freshly scanned file.
+        
+        Returns:
+            tuple: The entry as returned by load, or None if it was not recorded
+        """
+        # The line count belongs to the content whatever the state of the file
+        self._pending_blobs[file_fingerprint] = line_count
+        # A file modified within the mtime granularity could change again without
+        # its signature moving, so it is left out until it settles
+        if time.time() - stat_result.st_mtime < RACY_MTIME_SECONDS:
+            return None
+        entry = (*self.signature(stat_result), line_count, file_fingerprint)
+        self._pending.append((path, *entry))
+        if len(self._pending) >= 1000:
+            self.flush()
+        return entry
+    
+    def blob_line_count(self, file_fingerprint):
+        """Return the line count recorded for a fingerprint, or None."""
+        if file_fingerprint in self._pending_blobs:
+            return self._pending_blobs[file_fingerprint]
+        row = self._conn.execute('SELECT line_count FROM blobs WHERE fingerprint = ?',
+                                 (file_fingerprint,)).fetchone()
+        return row[0] if row else None
+    
+    def cached_scan(self, file_fingerprint, scan_key):
+        """
+        Return the scan result cached for some content, or None.
+        
+        Returns:
+            dict: The line count, matched keywords, keyword counts and snippets
+        """
+        cached = self._pending_scans.get((file_fingerprint, scan_key))
+        if cached is not None:
+            return cached
+        row = self._conn.execute(
+            'SELECT line_count, matched_keywords, keyword_counts, snippets '
+            'FROM scans JOIN blobs USING (fingerprint) WHERE fingerprint = ? AND scan_key = ?',
+            (file_fingerprint, scan_key)).fetchone()
+        if row is None:
+            return None
+        return {
+            'line_count': row[0],
+            'matched_keywords': json.loads(row[1]),
+            'keyword_counts': json.loads(row[2]) if row[2] is not None else None,
+            'snippets': json.loads(row[3]) if row[3] is not None else None
+        }
+    
+    def record_scan(self, scan_key, result):
+        """Queue the scan result of a fully read file for its fingerprint and scan key."""
+        self._pending_scans[(result['fingerprint'], scan_key)] = {
+            'line_count': result['line_count'],
+            'matched_keywords': result['matched_keywords'],
+            'keyword_counts': result['keyword_counts'],
+            'snippets': result['snippets']
+        }
+        if len(self._pending_scans) >= 1000:
+            self.flush()
+    
+    def cached_minhash(self, file_fingerprint):
+        """Return the MinHash signature recorded for a fingerprint, or None."""
+        if file_fingerprint in self._pending_minhashes:
+            return self._pending_minhashes[file_fingerprint]
+        row = self._conn.execute(
+            'SELECT signature FROM minhashes WHERE fingerprint = ? AND scheme = ?',
+            (file_fingerprint, MINHASH_SCHEME)).fetchone()
+        return row[0] if row else None
+    
+    def record_minhash(self, file_fingerprint, signature):
+        """Queue the MinHash signature of some content (empty if it has no tokens)."""
+        self._pending_minhashes[file_fingerprint] = signature
+        if len(self._pending_minhashes) >= 1000:
+            self.flush()
+    
+    def archive_listing(self, path, stat_result):
+        """
+        Return the member listing recorded for an archive, or None if there is
+        none for its current size and mtime.
+        
+        Returns:
+            list: [name, size, mtime] of each regular file in the archive
+        """
+        row = self._pending_archives.get(path)
+        if row is None:
+            row = self._conn.execute('SELECT size, mtime_ns, members FROM archives WHERE path = ?',
+                                     (path,)).fetchone()
+        if row is None or (row[0], row[1]) != (stat_result.st_size, stat_result.st_mtime_ns):
+            return None
+        return json.loads(row[2]) if isinstance(row[2], str) else row[2]
+    
+    def record_archive(self, path, stat_result, listing):
+        """Queue the member listing of an archive (see archive_listing)."""
+        # As with files, an archive modified within the mtime granularity is left out
+        if time.time() - stat_result.st_mtime < RACY_MTIME_SECONDS:
+            return
+        self._pending_archives[path] = (stat_result.st_size, stat_result.st_mtime_ns, listing)
+        if len(self._pending_archives) >= 100:
+            self.flush()
+    
+    def flush(self):
+        """Write queued entries to disk."""
+        if (self._pending or self._pending_blobs or self._pending_scans
+                or self._pending_minhashes or self._pending_archives):
+            with self._conn:
+                self._conn.executemany(
+                    'INSERT OR REPLACE INTO files VALUES (?, ?, ?, ?, ?, ?)', self._pending)
+                self._conn.executemany(
+                    'INSERT OR REPLACE INTO blobs VALUES (?, ?)', self._pending_blobs.items())
+                self._conn.executemany(
+                    'INSERT OR REPLACE INTO scans VALUES (?, ?, ?, ?, ?)',
+                    ((file_fingerprint, scan_key, json.dumps(cached['matched_keywords']),
+                      json.dumps(cached['keyword_counts'])
+                      if cached['keyword_counts'] is not None else None,
+                      json.dumps(cached['snippets']) if cached['snippets'] is not None else None)
+                     for (file_fingerprint, scan_key), cached in self._pending_scans.items()))
+                self._conn.executemany(
+                    'INSERT OR REPLACE INTO minhashes VALUES (?, ?, ?)',
+                    ((file_fingerprint, MINHASH_SCHEME, signature)
+                     for file_fingerprint, signature in self._pending_minhashes.items()))
+                self._conn.executemany(
+                    'INSERT OR REPLACE INTO archives VALUES (?, ?, ?, ?)',
+                    ((path, size, mtime_ns, json.dumps(listing))
+                     for path, (size, mtime_ns, listing) in self._pending_archives.items()))
+            self._pending = []
+            self._pending_blobs = {}
+            self._pending_scans = {}
+            self._pending_minhashes = {}
+            self._pending_archives = {}
+    
+    def close(self):
+        """Flush queued entries and close the index."""
+        self.flush()
+        self._conn.close()
+
+
+def read_git_index(index_file):
+    """
+    Read the entries of a git index file (versions 2 to 4).
+    
+    Only stage 0 entries for regular files are returned, without entries git
+    itself would not trust: assume-unchanged, skip-worktree and intent-to-add
+    entries, and racy entries whose mtime is not older than the index file.
+    Split indexes only hold part of the entries and are not read.
+    
+    Returns:
+        dict: Path relative to the work tree (with '/' separators) ->
+              (size, mtime_ns, inode, blob id)
+    """
+    with open(index_file, 'rb') as f:
+        index_mtime_ns = os.fstat(f.fileno()).st_mtime_ns
+        data = f.read()
+    if data[:4] != b'DIRC':
+        return {}
+    version, count = struct.unpack_from('>II', data, 4)
+    if version not in (2, 3, 4):
+        return {}
+    
+    entries = {}
+    position = 12
+    previous = b''
+    for _ in range(count):
+        (_, _, mtime_s, mtime_ns, _, inode, mode, _, _, size) = GIT_INDEX_ENTRY.unpack_from(
+            data, position)
+        blob_id = data[position + 40:position + 60].hex()
+        flags, = struct.unpack_from('>H', data, position + 60)
+        extended_flags = 0
+        name_start = position + 62
+        if flags & 0x4000 and version >= 3:
+            extended_flags, = struct.unpack_from('>H', data, name_start)
+            name_start += 2
+        if version == 4:
+            # The path drops a number of bytes from the end of the previous one
+            # and appends the rest, with no padding
+            byte = data[name_start]
+            strip = byte & 0x7F
+            name_start += 1
+            while byte & 0x80:
+                byte = data[name_start]
+                strip = ((strip + 1) << 7) | (byte & 0x7F)
+                name_start += 1
+            name_end = data.index(b'\0', name_start)
+            name = previous[:len(previous) - strip] + data[name_start:name_end]
+            position = name_end + 1
+        else:
+            name_end = data.index(b'\0', name_start)
+            name = data[name_start:name_end]
+            # Entries are NUL padded to a multiple of 8 bytes
+            position += (name_end - position + 8) // 8 * 8
+        previous = name
+        
+        if flags & 0xB000 or extended_flags & 0x6000 or mode & 0o170000 != 0o100000:
+            continue
+        mtime = mtime_s * 1_000_000_000 + mtime_ns
+        if mtime >= index_mtime_ns:
+            continue
+        entries[os.fsdecode(name)] = (size, mtime, inode, blob_id)
+    
+    # Extensions follow the entries; a link extension means a split index
+    while position + 8 <= len(data) - 20:
+        signature, length = struct.unpack_from('>4sI', data, position)
+        if signature == b'link':
+            return {}
+        position += 8 + length
+    return entries
+
+
+class GitBlobIndex:
+    """
+    Content fingerprints of git-tracked files, taken from their repositories' indexes.
+    
+    Git records the stat signature of every tracked file alongside the id of
+    the blob staged for it. While a working file's size, mtime and inode still
+    match, its content is that blob, so the blob id serves as its fingerprint
+    without the file being read. Repositories are found by looking for a .git
+    directory (or a .git file, for worktrees and submodules) above each file,
+    and each index is read once. Git itself is asked which files may be
+    converted on checkout, from the effective config (core.autocrlf and
+    core.eol, wherever they are set) and attributes (any .gitattributes,
+    .git/info/attributes or global attributes file): a work tree converting
+    line endings is not used, and files with any attribute set are left
+    out, since their working files can differ from the blobs. Without a git
+    executable no blob ids are used.
+    """
+    
+    GIT_TIMEOUT_SECONDS = 60
+    
+    def __init__(self):
+        self._work_trees = {}
+        self._indexes = {}
+    
+    def entry(self, path):
+        """
+        Return a file index entry built from the git index for a file.
+        
+        Returns:
+            tuple: (size, mtime_ns, inode, None, blob id) like FileIndex.load
+                   entries but without a line count, or None if the file is not
+                   tracked in a usable index
+        """
+        path = os.path.abspath(path)
+        work_tree = self._work_tree(os.path.dirname(path))
+        if work_tree is None:
+            return None
+        entries = self._indexes.get(work_tree)
+        if entries is None:
+            entries = self._indexes[work_tree] = self._load(work_tree)
+        git_entry = entries.get(os.path.relpath(path, work_tree).replace(os.sep, '/'))
+        if git_entry is None:
+            return None
+        size, mtime_ns, inode, blob_id = git_entry
+        return (size, mtime_ns, inode, None, blob_id)
+    
+    def _work_tree(self, directory):
+        """Return the work tree a directory belongs to, or None."""
+        visited = []
+        work_tree = None
+        while True:
+            if directory in self._work_trees:
+                work_tree = self._work_trees[directory]
+                break
+            visited.append(directory)
+            if os.path.lexists(os.path.join(directory, '.git')):
+                work_tree = directory
+                break
+            parent = os.path.dirname(directory)
+            if parent == directory:
+                break
+            directory = parent
+        for directory in visited:
+            self._work_trees[directory] = work_tree
+        return work_tree
+    
+    def _load(self, work_tree):
+        """Read the usable index entries of a work tree."""
+        git_dir = os.path.join(work_tree, '.git')
+        try:
+            if os.path.isfile(git_dir):
+                with open(git_dir, encoding='utf-8') as f:
+                    line = f.readline().strip()
+                if not line.startswith('gitdir:'):
+                    return {}
+                git_dir = os.path.join(work_tree, line[len('gitdir:'):].strip())
+            entries = read_git_index(os.path.join(git_dir, 'index'))
+            if not entries or self._converts_line_endings(work_tree):
+                return {}
+            for path in self._paths_with_attributes(work_tree, entries):
+                entries.pop(path, None)
+            return entries
+        except (OSError, ValueError, IndexError, struct.error, subprocess.SubprocessError):
+            return {}
+    
+    def _git(self, work_tree, *args, data=None):
+        """Run a git command in a work tree and return its output."""
+        return subprocess.run(['git', '-C', work_tree, *args], input=data, check=True,
+                              stdout=subprocess.PIPE, stderr=subprocess.DEVNULL,
+                              timeout=self.GIT_TIMEOUT_SECONDS).stdout
+    
+    def _converts_line_endings(self, work_tree):
+        """Return whether the effective config converts line endings on checkout."""
+        try:
+            output = self._git(work_tree, 'config', '--get-regexp', r'^core\.(autocrlf|eol)$')
+        except subprocess.CalledProcessError as e:
+            # Exit status 1 means neither is set
+            if e.returncode == 1:
+                return False
+            raise
+        for line in output.decode('utf-8', 'replace').splitlines():
+            name, _, value = line.partition(' ')
+            value = value.strip().lower()
+            if name.lower() == 'core.autocrlf' and value not in ('false', 'no', 'off', '0',
+                                                                 'input'):
+                return True
+            if name.lower() == 'core.eol' and value == 'crlf':
+                return True
+        return False
+    
+    def _paths_with_attributes(self, work_tree, entries):
+        """Return the tracked paths that have any git attribute set."""
+        data = b''.join(os.fsencode(path) + b'\0' for path in entries)
+        fields = self._git(work_tree, 'check-attr', '-a', '-z', '--stdin', data=data).split(b'\0')
+        # Output is path, attribute, value triples; unset attributes do not convert
+        return {os.fsdecode(fields[i]) for i in range(0, len(fields) - 2, 3)
+                if fields[i + 2] != b'unset'}
+
+
+class TrigramIndex:
+    """
+    Optional on-disk trigram inverted index over file contents.
+    
+    Every indexed file gets an integer id, and each lowercased UTF-8 byte trigram
+    maps to the ids of the files containing it. Posting lists are stored as
+    segments of packed ids, one new segment per indexing batch, so updating the
+    index for changed files never rewrites existing postings. Ids of files that
+    changed or disappeared are dropped from the file table and filtered out at
+    query time until a compaction rewrites the postings without them.
+    
+    A keyword query only needs the files whose postings contain every trigram of
+    some keyword; those candidates are then verified by the normal scan.
+    """
+    SCHEMA = """
+        CREATE TABLE IF NOT EXISTS indexed_files (
+            path TEXT PRIMARY KEY,
+            file_id INTEGER NOT NULL,
+            size INTEGER NOT NULL,
+            mtime_ns INTEGER NOT NULL,
+            inode INTEGER NOT NULL
+        );
+        CREATE TABLE IF NOT EXISTS postings (
+            trigram INTEGER NOT NULL,
+            segment INTEGER NOT NULL,
+            ids BLOB NOT NULL,
+            PRIMARY KEY (trigram, segment)
+        ) WITHOUT ROWID;
+        CREATE TABLE IF NOT EXISTS meta (
+            key TEXT PRIMARY KEY,
+            value INTEGER NOT NULL
+        );
+    """
+    BATCH_FILES = 2000
+    MAX_SEGMENTS = 32
+    
+    def __init__(self, index_file):
+        self.index_file = Path(index_file)
+        self._conn = sqlite3.connect(str(self.index_file))
+        self._conn.executescript(self.SCHEMA)
+    
+    def _get_meta(self, key):
+        row = self._conn.execute('SELECT value FROM meta WHERE key = ?', (key,)).fetchone()
+        return row[0] if row else 0
+    
+    def _set_meta(self, key, value):
+        self._conn.execute('INSERT OR REPLACE INTO meta VALUES (?, ?)', (key, value))
+    
+    def sync(self, directory, files, verbose=False, budget=None):
+        """
+        Bring the index up to date for the files gathered under a directory.
+        
+        Only files that are new or whose stat signature changed are read, in
+        chunks and within the same budget as a scan (see read_trigrams).
+        Files indexed under the directory but not in this file list (filtered
+        out by another query's extensions, globs or ignore rules) keep their
+        rows unless they no longer exist or their stat signature changed.
+        
+        Returns:
+            dict: File id -> path for every current file under the directory
+        """
+        rows = self._conn.execute(
+            'SELECT path, file_id, size, mtime_ns, inode FROM indexed_files '
+            'WHERE path >= ? AND path < ?', path_prefix_range(directory))
+        indexed = {row[0]: (row[1], row[2:]) for row in rows}
+        
+        live = {}
+        stale = []
+        batch = []
+        next_id = self._get_meta('next_id')
+        segment = self._get_meta('next_segment')
+        indexed_count = 0
+        
+        for file_path in files:
+            indexed_path = os.path.abspath(file_path)
+            known = indexed.pop(indexed_path, None)
+            try:
+                stat_result = os.stat(indexed_path)
+            except OSError:
+                continue
+            signature = FileIndex.signature(stat_result)
+            if known is not None and known[1] == signature:
+                live[known[0]] = file_path
+                continue
+            if known is not None:
+                stale.append(indexed_path)
+            grams = self.read_trigrams(indexed_path, budget)
+            if grams is None:
+                continue
+            # Racy files are still searchable through this run's ids but are
+            # reindexed next time
+            if time.time() - stat_result.st_mtime < RACY_MTIME_SECONDS:
+                signature = (-1, -1, -1)
+            batch.append((indexed_path, next_id, signature, grams))
+            live[next_id] = file_path
+            next_id += 1
+            if len(batch) >= self.BATCH_FILES:
+                self._write_segment(segment, batch)
+                segment += 1
+                indexed_count += len(batch)
+                batch = []
+        
+        gone = []
+        for indexed_path, (_, signature) in indexed.items():
+            try:
+                unchanged = FileIndex.signature(os.stat(indexed_path)) == signature
+            except OSError:
+                unchanged = False
+            if not unchanged:
+                gone.append(indexed_path)
+        stale.extend(gone)
+        if batch:
+            self._write_segment(segment, batch)
+            segment += 1
+            indexed_count += len(batch)
+        
+        with self._conn:
+            self._conn.executemany('DELETE FROM indexed_files WHERE path = ?',
+                                   [(p,) for p in gone])
+            self._set_meta('next_id', next_id)
+            self._set_meta('next_segment', segment)
+            self._set_meta('dead', self._get_meta('dead') + len(stale))
+        
+        if verbose and indexed_count:
+            print(f"🗂️  Trigram index updated for {indexed_count} files")
+        
+        self._maybe_compact(verbose)
+        return live
+    
+    @staticmethod
+    def read_trigrams(path, budget=None):
+        """
+        Return the trigrams of a file's lowercased contents, read chunk by chunk.
+        
+        The last two bytes of each chunk are carried over so trigrams spanning
+        chunks are kept. Reading stops where scan_stream would: at a NUL byte
+        in the first block when binary files are skipped, and at the byte
+        budget. A file not read to the end gets UNREAD_GRAM, because a scan
+        under another budget may match in the part that was not indexed.
+        
+        Returns:
+            set: Trigrams packed into ints, or None if the file cannot be read
+        """
+        if budget is None:
+            budget = ReadBudget()
+        decoder = codecs.getincrementaldecoder('utf-8')('ignore')
+        grams = set()
+        tail = b''
+        bytes_read = 0
+        try:
+            with open(path, 'rb') as f:
+                while True:
+                    read_size = SCAN_CHUNK_SIZE
+                    if budget.max_bytes is not None:
+                        read_size = min(read_size, budget.max_bytes - bytes_read)
+                        if read_size <= 0:
+                            if f.read(1):
+                                grams.add(UNREAD_GRAM)
+                            break
+                    chunk = f.read(read_size)
+                    if not chunk:
+                        break
+                    if not bytes_read and budget.skip_binary and \
+                            b'\0' in chunk[:BINARY_SNIFF_SIZE]:
+                        return {UNREAD_GRAM}
+                    bytes_read += len(chunk)
+                    window = tail + fold_case(decoder.decode(chunk)).encode('utf-8')
+                    grams |= trigrams(window)
+                    tail = window[-2:]
+        except OSError:
+            return None
+        return grams
+    
+    def _write_segment(self, segment, batch):
+        """Write the postings for a batch of freshly read files as one segment."""
+        postings = {}
+        for _, file_id, _, grams in batch:
+            for gram in grams:
+                postings.setdefault(gram, []).append(file_id)
+        with self._conn:
+            self._conn.executemany(
+                'INSERT OR REPLACE INTO indexed_files VALUES (?, ?, ?, ?, ?)',
+                [(path, file_id, *signature) for path, file_id, signature, _ in batch])
+            self._conn.executemany(
+                'INSERT INTO postings VALUES (?, ?, ?)',
+                [(gram, segment, array('I', ids).tobytes()) for gram, ids in postings.items()])
+    
+    def _maybe_compact(self, verbose=False):
+        """Merge segments and drop dead ids once either has accumulated."""
+        live_count = self._conn.execute('SELECT COUNT(*) FROM indexed_files').fetchone()[0]
+        segments = self._get_meta('next_segment')
+        if self._get_meta('dead') <= live_count and segments <= self.MAX_SEGMENTS:
+            return
+        
+        if verbose:
+            print("🗜️  Compacting trigram index...")
+        live_ids = {row[0] for row in self._conn.execute('SELECT file_id FROM indexed_files')}
+        merged = {}
+        for gram, ids in self._conn.execute('SELECT trigram, ids FROM postings'):
+            merged.setdefault(gram, array('I')).frombytes(ids)
+        with self._conn:
+            self._conn.execute('DELETE FROM postings')
+            for gram, ids in merged.items():
+                kept = array('I', (i for i in ids if i in live_ids))
+                if kept:
+                    self._conn.execute('INSERT INTO postings VALUES (?, 0, ?)',
+                                       (gram, kept.tobytes()))
+            self._set_meta('next_segment', 1)
+            self._set_meta('dead', 0)
+    
+    def _posting(self, gram):
+        """Return the set of file ids whose content contains a trigram."""
+        ids = array('I')
+        for (blob,) in self._conn.execute('SELECT ids FROM postings WHERE trigram = ?', (gram,)):
+            ids.frombytes(blob)
+        return set(ids)
+    
+    def candidates(self, keywords, live):
+        """
+        Return the file ids that may contain at least one of the keywords.
+        
+        Regex keywords are looked up by their literal prefix, and files that
+        were not read to the end are always candidates. Returns None when
+        some keyword (or prefix) is too short to be looked up, in which case
+        every file is a candidate.
+        """
+        result = set()
+        for keyword in keywords:
+            grams = trigrams(required_literal(keyword).encode('utf-8'))
+            if not grams:
+                return None
+            ids = None
+            for gram in grams:
+                posting = self._posting(gram)
+                ids = posting if ids is None else ids & posting
+                if not ids:
+                    break
+            result |= ids
+        result |= self._posting(UNREAD_GRAM)
+        return result & live.keys()
+    
+    def close(self):
+        self._conn.close()
@@ -0,0 +1,523 @@
+"""
+Script Finder Daemon
+
+The optional index daemon for find_script.py (--serve). It keeps file lists hot in
+memory, tracks changes with inotify (or mtime polling where inotify is unavailable)
+and answers searches from DaemonClient over a Unix domain socket.
+"""
+
+import os
+import sys
+import json
+import copy
+import select
+import socket
+import struct
+import ctypes
+import ctypes.util
+import threading
+from pathlib import Path
+
+from find_script_scan import ReadBudget, StatFilter
+from find_script_cache import (
+    DEFAULT_CACHE_DIR, DEFAULT_CACHE_SIZE_LIMIT, FILE_INDEX_NAME, FileIndex)
+from find_script_walk import PathGlob
+from find_script_search import ScriptFinder, SearchStats
+
+DAEMON_SOCKET_NAME = 'daemon.sock'
+
+# Seconds between mtime polls for trees the daemon cannot watch
+DAEMON_POLL_SECONDS = 30
+
+
+class Inotify:
+    """Minimal binding to Linux inotify through ctypes."""
+    IN_MOVED_FROM = 0x00000040
+    IN_MOVED_TO = 0x00000080
+    IN_CREATE = 0x00000100
+    IN_DELETE = 0x00000200
+    IN_DELETE_SELF = 0x00000400
+    IN_MOVE_SELF = 0x00000800
+    IN_Q_OVERFLOW = 0x00004000
+    IN_IGNORED = 0x00008000
+    IN_ONLYDIR = 0x01000000
+    IN_DONT_FOLLOW = 0x02000000
+    
+    # Changes to the list of entries in a watched directory
+    DIRECTORY_EVENTS = (IN_MOVED_FROM | IN_MOVED_TO | IN_CREATE | IN_DELETE |
+                        IN_DELETE_SELF | IN_MOVE_SELF | IN_ONLYDIR | IN_DONT_FOLLOW)
+    
+    EVENT = struct.Struct('iIII')
+    
+    def __init__(self):
+        if not sys.platform.startswith('linux'):
+            raise OSError("inotify is only available on Linux")
+        libc = ctypes.CDLL(ctypes.util.find_library('c') or 'libc.so.6', use_errno=True)
+        self._add_watch = libc.inotify_add_watch
+        self._add_watch.argtypes = [ctypes.c_int, ctypes.c_char_p, ctypes.c_uint32]
+        self._fd = libc.inotify_init1(os.O_NONBLOCK | os.O_CLOEXEC)
+        if self._fd < 0:
+            errno = ctypes.get_errno()
+            raise OSError(errno, os.strerror(errno))
+    
+    def fileno(self):
+        return self._fd
+    
+    def add_watch(self, path, mask=DIRECTORY_EVENTS):
+        """Watch a path, returning the watch descriptor."""
+        wd = self._add_watch(self._fd, os.fsencode(path), mask)
+        if wd < 0:
+            errno = ctypes.get_errno()
+            raise OSError(errno, os.strerror(errno), str(path))
+        return wd
+    
+    def read_events(self):
+        """Return the pending (watch descriptor, mask, name) events."""
+        events = []
+        while True:
+            try:
+                data = os.read(self._fd, 64 * 1024)
+            except BlockingIOError:
+                return events
+            offset = 0
+            while offset < len(data):
+                wd, mask, _, length = self.EVENT.unpack_from(data, offset)
+                offset += self.EVENT.size
+                name = data[offset:offset + length].rstrip(b'\0')
+                offset += length
+                events.append((wd, mask, os.fsdecode(name)))
+    
+    def close(self):
+        os.close(self._fd)
+
+
+class HotTree:
+    """A file list kept in memory by the daemon, along with its pending changes."""
+    
+    def __init__(self, root, extensions):
+        self.root = root
+        self.extensions = extensions
+        self.extension_set = {ext.lower() for ext in extensions}
+        self.records = {}
+        self.paths = {}
+        self.known = {}
+        # An empty tree is a valid result, so loading is tracked on its own
+        self.loaded = False
+        self.watches = set()
+        self.watching = False
+        self.watch_failed = False
+        self.rescan = True
+        self.lock = threading.Lock()
+        self._dirty = set()
+        self._dirty_lock = threading.Lock()
+    
+    def mark_dirty(self, rel_dir):
+        with self._dirty_lock:
+            self._dirty.add(rel_dir)
+    
+    def take_dirty(self):
+        with self._dirty_lock:
+            dirty, self._dirty = self._dirty, set()
+        return dirty
+    
+    def file_list(self):
+        """Return the current file paths in walk order."""
+        with self.lock:
+            return [path for rel_dir in self.records for path in self.paths[rel_dir]]
+    
+    def relative(self, path):
+        """Return a file path relative to the tree root."""
+        return os.path.relpath(path, self.root)
+
+
+class ScriptFinderDaemon:
+    """
+    Long-running index daemon answering find_script queries over a Unix socket.
+    
+    File lists (one HotTree per root and extension set) and per-file metadata
+    are loaded on first use and then kept in memory. On Linux, directory
+    changes are tracked with inotify, so a query only re-lists directories that
+    reported a change. Trees that cannot be watched (no inotify, or the watch
+    limit was reached) are revalidated by mtime polling every poll_interval
+    seconds instead.
+    
+    Requests and responses are newline-delimited JSON objects, one request per
+    connection. Each connection is handled on its own thread, so a slow query
+    does not hold up other clients. Use start()/stop() to run the daemon on a
+    background thread, or serve_forever() to run it in the calling thread.
+    """
+    
+    def __init__(self, cache_dir=None, socket_path=None, poll_interval=DAEMON_POLL_SECONDS,
+                 use_inotify=True, verbose=False, cache_size_limit=DEFAULT_CACHE_SIZE_LIMIT):
+        self.finder = ScriptFinder(cache_dir, cache_size_limit)
+        self.socket_path = Path(socket_path) if socket_path else self.finder.cache_dir / DAEMON_SOCKET_NAME
+        self.poll_interval = poll_interval
+        self.verbose = verbose
+        self._trees = {}
+        self._watch_map = {}
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._ready = threading.Event()
+        self._thread = None
+        self._inotify = None
+        if use_inotify:
+            try:
+                self._inotify = Inotify()
+            except (OSError, AttributeError):
+                self._inotify = None
+    
+    def _log(self, message):
+        if self.verbose:
+            print(message)
+            sys.stdout.flush()
+    
+    def get_tree(self, directory, extensions, finder=None):
+        """
+        Return the hot tree for a directory and extensions, loading it on first use.
+        
+        Args:
+            finder (ScriptFinder): Finder whose statistics the walk is counted
+                in (default: the daemon's own)
+        """
+        finder = finder or self.finder
+        root = os.path.abspath(directory)
+        key = (os.path.realpath(root), tuple(sorted(ext.lower() for ext in extensions)))
+        with self._lock:
+            tree = self._trees.get(key)
+            if tree is None:
+                tree = HotTree(root, extensions)
+                self._trees[key] = tree
+        
+        with tree.lock:
+            if not tree.loaded:
+                self._log(f"📂 Loading {root} ({' '.join(extensions)})")
+                cached, _ = self.finder.cache.lookup(root, extensions)
+                self._update_tree(tree, cached if cached is not None else {}, trusted=None,
+                                  finder=finder)
+                self.finder.cache.store(root, extensions, tree.records, previous=cached)
+                if tree.watching:
+                    # Every directory is watched now, so one more stat pass catches
+                    # anything that changed while the tree was being loaded
+                    tree.take_dirty()
+                    self._update_tree(tree, tree.records, trusted=None, finder=finder)
+                file_index = FileIndex(self.finder.cache_dir / FILE_INDEX_NAME)
+                try:
+                    tree.known = file_index.load(root)
+                finally:
+                    file_index.close()
+                tree.rescan = False
+                tree.loaded = True
+        return tree
+    
+    def refresh(self, tree=None, finder=None):
+        """Bring one tree (or all trees) up to date with the file system."""
+        trees = [tree] if tree is not None else list(self._trees.values())
+        for hot_tree in trees:
+            with hot_tree.lock:
+                if hot_tree.watching and not hot_tree.rescan:
+                    dirty = hot_tree.take_dirty()
+                    if not dirty:
+                        continue
+                    self._update_tree(hot_tree, hot_tree.records,
+                                      trusted=lambda rel_dir: rel_dir not in dirty,
+                                      finder=finder)
+                else:
+                    hot_tree.take_dirty()
+                    hot_tree.rescan = False
+                    self._update_tree(hot_tree, hot_tree.records, trusted=None, finder=finder)
+    
+    def _update_tree(self, tree, cached_dirs, trusted, finder=None):
+        """Walk a tree from its previous records. The caller holds tree.lock."""
+        finder = finder or self.finder
+        records = dict(finder._iter_walk(tree.root, tree.extension_set, cached_dirs,
+                                         trusted=trusted))
+        
+        paths = {}
+        new_dirs = []
+        for rel_dir, record in records.items():
+            if tree.records.get(rel_dir) is record:
+                paths[rel_dir] = tree.paths[rel_dir]
+            else:
+                dir_path = Path(tree.root) / rel_dir
+                paths[rel_dir] = [dir_path / name for name in record['files']]
+            if rel_dir not in tree.watches:
+                new_dirs.append(rel_dir)
+        
+        relisted = sum(1 for rel_dir in records if tree.records.get(rel_dir) is not records[rel_dir])
+        tree.records = records
+        tree.paths = paths
+        tree.watches.intersection_update(records)
+        if relisted:
+            self._log(f"🔄 {tree.root}: re-listed {relisted} of {len(records)} directories")
+        
+        if self._inotify is None or tree.watch_failed:
+            return
+        tree.watching = True
+        for rel_dir in new_dirs:
+            try:
+                wd = self._inotify.add_watch(os.path.join(tree.root, rel_dir))
+            except OSError as e:
+                # Most likely the inotify watch limit, so fall back to polling
+                self._log(f"⚠️  Cannot watch {os.path.join(tree.root, rel_dir)}: {e}, polling instead")
+                tree.watching = False
+                tree.watch_failed = True
+                return
+            with self._lock:
+                self._watch_map.setdefault(wd, []).append((tree, rel_dir))
+            tree.watches.add(rel_dir)
+            # Changes between listing the directory and watching it would be
+            # missed, so it is listed once more on the next refresh
+            tree.mark_dirty(rel_dir)
+    
+    def _watch_events(self):
+        """Mark directories dirty as inotify reports changes."""
+        while not self._stop.is_set():
+            readable, _, _ = select.select([self._inotify], [], [], 0.5)
+            if not readable:
+                continue
+            for wd, mask, _ in self._inotify.read_events():
+                if mask & Inotify.IN_Q_OVERFLOW:
+                    for tree in list(self._trees.values()):
+                        tree.rescan = True
+                    continue
+                with self._lock:
+                    watched = self._watch_map.get(wd, [])
+                    if mask & Inotify.IN_IGNORED:
+                        self._watch_map.pop(wd, None)
+                for tree, rel_dir in watched:
+                    tree.mark_dirty(rel_dir)
+                    if mask & Inotify.IN_IGNORED:
+                        tree.watches.discard(rel_dir)
+    
+    def _poll(self):
+        """Revalidate trees that are not watched by mtime polling."""
+        while not self._stop.wait(self.poll_interval):
+            for tree in list(self._trees.values()):
+                if not tree.watching or tree.rescan:
+                    self.refresh(tree)
+    
+    def handle_request(self, request):
+        """Yield the response objects for a request."""
+        command = request.get('command', 'query')
+        if command == 'ping':
+            yield {'pong': True, 'pid': os.getpid()}
+        elif command == 'shutdown':
+            self._stop.set()
+            yield {'done': True}
+        elif command == 'query':
+            # Queries run concurrently, so each gets its own view of the finder
+            # (sharing its cache manager) to count statistics in
+            finder = copy.copy(self.finder)
+            stats = finder.stats = SearchStats()
+            stats.enter('walk')
+            try:
+                tree = self.get_tree(request['directory'], request.get('extensions', ['.py']),
+                                     finder)
+                if tree.watching or request.get('refresh'):
+                    self.refresh(tree, finder)
+                files = tree.file_list()
+                if request.get('path_globs'):
+                    path_glob = PathGlob(request['path_globs'])
+                    files = [f for f in files if path_glob.match_path(tree.relative(f))]
+            finally:
+                stats.exit()
+            stats.add(files_listed=len(files))
+            stats.cache['status'] = 'daemon'
+            content_keywords = request.get('content_keywords', [])
+            budget = ReadBudget(*request['budget']) if request.get('budget') else None
+            if request.get('use_trigram_index'):
+                files = finder._trigram_candidates(tree.root, files, content_keywords,
+                                                   budget=budget)
+            stat_filter = StatFilter(*request['stat_filter']) \
+                if request.get('stat_filter') else None
+            # SQLite connections belong to the thread that opened them
+            file_index = FileIndex(self.finder.cache_dir / FILE_INDEX_NAME)
+            if request.get('top'):
+                ranked = finder._rank_matches(
+                    files, tree.known, file_index, request.get('min_lines', 300),
+                    content_keywords, request['top'], jobs=request.get('jobs', 1),
+                    context_lines=request.get('context_lines'), budget=budget,
+                    stat_filter=stat_filter)
+                matches = (match for match in ranked)
+            else:
+                matches = finder._scan_matches(
+                    files, tree.known, file_index, request.get('min_lines', 300),
+                    content_keywords, jobs=request.get('jobs', 1), limit=request.get('limit'),
+                    context_lines=request.get('context_lines'), budget=budget,
+                    stat_filter=stat_filter)
+            try:
+                for match in matches:
+                    yield {'match': dict(match, path=tree.relative(match['path']))}
+            finally:
+                matches.close()
+                file_index.close()
+            yield {'done': True, 'stats': stats.as_dict()}
+        else:
+            yield {'error': f"Unknown command: {command}"}
+    
+    def _handle_connection(self, conn):
+        try:
+            with conn, conn.makefile('rwb') as stream:
+                try:
+                    request = json.loads(stream.readline())
+                    for response in self.handle_request(request):
+                        stream.write(json.dumps(response).encode('utf-8') + b'\n')
+                        stream.flush()
+                except (BrokenPipeError, ConnectionResetError):
+                    pass
+                except Exception as e:
+                    try:
+                        stream.write(json.dumps({'error': str(e)}).encode('utf-8') + b'\n')
+                        stream.flush()
+                    except OSError:
+                        pass
+        except OSError:
+            # The client went away before the response was flushed
+            pass
+    
+    def _bind(self):
+        if DaemonClient(self.socket_path).ping():
+            raise RuntimeError(f"A daemon is already listening on {self.socket_path}")
+        if self.socket_path.exists():
+            self.socket_path.unlink()
+        server = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        server.bind(str(self.socket_path))
+        server.listen(16)
+        server.settimeout(0.5)
+        return server
+    
+    def serve_forever(self, preload=()):
+        """
+        Serve requests until stopped.
+        
+        Args:
+            preload (iterable): (directory, extensions) pairs to load before serving
+        """
+        if not hasattr(socket, 'AF_UNIX'):
+            raise RuntimeError("Unix domain sockets are not supported on this platform")
+        server = self._bind()
+        handlers = []
+        workers = [threading.Thread(target=self._poll, daemon=True)]
+        if self._inotify is not None:
+            workers.append(threading.Thread(target=self._watch_events, daemon=True))
+        for worker in workers:
+            worker.start()
+        
+        try:
+            for directory, extensions in preload:
+                self.get_tree(directory, extensions)
+            self._log(f"🛰️  Serving on {self.socket_path} "
+                      f"({'inotify' if self._inotify is not None else 'polling'})")
+            self._ready.set()
+            while not self._stop.is_set():
+                try:
+                    conn, _ = server.accept()
+                except socket.timeout:
+                    continue
+                conn.settimeout(None)
+                handler = threading.Thread(target=self._handle_connection, args=(conn,),
+                                           daemon=True)
+                handler.start()
+                handlers = [(h, c) for h, c in handlers if h.is_alive()] + [(handler, conn)]
+        finally:
+            self._stop.set()
+            self._ready.set()
+            server.close()
+            if self.socket_path.exists():
+                self.socket_path.unlink()
+            for handler, conn in handlers:
+                # Clients that never sent a request would block the join
+                try:
+                    conn.shutdown(socket.SHUT_RD)
+                except OSError:
+                    pass
+                handler.join()
+            for worker in workers:
+                worker.join()
+            for tree in list(self._trees.values()):
+                with tree.lock:
+                    if tree.loaded:
+                        self.finder.cache.store(tree.root, tree.extensions, tree.records)
+            if self._inotify is not None:
+                self._inotify.close()
+    
+    def start(self, preload=()):
+        """Serve on a background thread, returning once the socket is listening."""
+        self._thread = threading.Thread(target=self.serve_forever, args=(preload,), daemon=True)
+        self._thread.start()
+        self._ready.wait()
+        return self
+    
+    def stop(self):
+        """Stop a daemon started with start()."""
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+
+
+class DaemonClient:
+    """Thin client for a ScriptFinderDaemon."""
+    
+    def __init__(self, socket_path=None, cache_dir=None):
+        if socket_path is None:
+            socket_path = Path(cache_dir or DEFAULT_CACHE_DIR) / DAEMON_SOCKET_NAME
+        self.socket_path = Path(socket_path)
+        # Statistics the daemon reported for the most recent query
+        self.stats = None
+    
+    def request(self, request):
+        """Send a request and yield the response objects."""
+        with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as conn:
+            conn.connect(str(self.socket_path))
+            with conn.makefile('rwb') as stream:
+                stream.write(json.dumps(request).encode('utf-8') + b'\n')
+                stream.flush()
+                for line in stream:
+                    response = json.loads(line)
+                    if 'error' in response:
+                        raise RuntimeError(f"Daemon error: {response['error']}")
+                    yield response
+                    if response.get('done'):
+                        return
+    
+    def ping(self):
+        """Return whether a daemon is listening on the socket."""
+        if not hasattr(socket, 'AF_UNIX') or not self.socket_path.exists():
+            return False
+        try:
+            return any(r.get('pong') for r in self.request({'command': 'ping'}))
+        except (OSError, RuntimeError, ValueError):
+            return False
+    
+    def shutdown(self):
+        """Ask the daemon to stop."""
+        for _ in self.request({'command': 'shutdown'}):
+            pass
+    
+    def iter_matches(self, directory, extensions=None, min_lines=300, content_keywords=None,
+                     refresh=False, use_trigram_index=False, jobs=1, limit=None, top=None,
+                     context_lines=None, path_globs=None, budget=None, stat_filter=None):
+        """Yield match records from the daemon, like ScriptFinder.iter_matches."""
+        request = {
+            'command': 'query',
+            'directory': os.path.abspath(directory),
+            'extensions': extensions or ['.py'],
+            'min_lines': min_lines,
+            'content_keywords': content_keywords or [],
+            'refresh': refresh,
+            'use_trigram_index': use_trigram_index,
+            'jobs': jobs,
+            'limit': limit,
+            'top': top,
+            'context_lines': context_lines,
+            'path_globs': path_globs,
+            'budget': list(budget) if budget is not None else None,
+            'stat_filter': list(stat_filter) if stat_filter is not None else None
+        }
+        for response in self.request(request):
+            if 'match' in response:
+                match = response['match']
+                match['path'] = Path(directory) / match['path']
+                yield match
+            elif 'stats' in response:
+                self.stats = response['stats']
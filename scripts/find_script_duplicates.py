@@ -0,0 +1,291 @@
+"""
+Script Finder Duplicates
+
+Exact and near-duplicate detection for find_script.py. Exact duplicates are split by
+a hash of the first and last blocks of each file before being hashed in full
+(partial_digest, content_fingerprint); near duplicates are found from MinHash
+signatures of token shingles (minhash_file), matched through the bands of an LSHIndex
+so that candidate pairs are found without comparing every pair of files.
+"""
+
+import os
+import hashlib
+import operator
+import re
+import struct
+
+from find_script_scan import (
+    BINARY_SNIFF_SIZE, SCAN_CHUNK_SIZE, count_newlines, git_blob_id_hasher,
+    stat_signature)
+
+# Bytes hashed from each end of a file to split same-size duplicate candidates
+DUPLICATE_BLOCK_SIZE = 4096
+
+# MinHash signatures for --similar-to and --near-dups: tokens per shingle, number of
+# signature slots, and the scheme name signatures are cached under in the file index
+MINHASH_SHINGLE_SIZE = 5
+MINHASH_SLOTS = 128
+MINHASH_SCHEME = f'oph-blake2b-{MINHASH_SHINGLE_SIZE}x{MINHASH_SLOTS}'
+# Default Jaccard similarity threshold, and the share of pairs at the threshold
+# that the LSH bands must turn up as candidates
+DEFAULT_SIMILARITY = 0.8
+LSH_RECALL = 0.95
+
+
+def partial_digest(file_path, size, block_size=DUPLICATE_BLOCK_SIZE):
+    """
+    Hash the first and last blocks of a file to split duplicate candidates.
+    
+    A file no longer than two blocks is read whole, and its digest is then
+    the content fingerprint itself (its git blob id).
+    
+    Returns:
+        tuple: (whether the digest is the full fingerprint, hex digest, bytes
+               read), or None if the file could not be read or changed size
+    """
+    try:
+        with open(file_path, 'rb') as f:
+            if size <= 2 * block_size:
+                data = f.read(size + 1)
+                if len(data) != size:
+                    return None
+                hasher = git_blob_id_hasher(size)
+                hasher.update(data)
+                return True, hasher.hexdigest(), size
+            head = f.read(block_size)
+            f.seek(size - block_size)
+            tail = f.read(block_size + 1)
+    except OSError:
+        return None
+    if len(tail) != block_size:
+        return None
+    return False, hashlib.sha1(head + tail).hexdigest(), 2 * block_size
+
+
+def content_fingerprint(file_path, size):
+    """
+    Hash a file's whole content into its fingerprint (the git blob id).
+    
+    Returns:
+        str: Hex fingerprint, or None if the file could not be read or
+             changed size while being read
+    """
+    hasher = git_blob_id_hasher(size)
+    bytes_read = 0
+    try:
+        with open(file_path, 'rb') as f:
+            while True:
+                chunk = f.read(SCAN_CHUNK_SIZE)
+                if not chunk:
+                    break
+                hasher.update(chunk)
+                bytes_read += len(chunk)
+    except OSError:
+        return None
+    return hasher.hexdigest() if bytes_read == size else None
+
+
+# Identifiers and numbers, or single punctuation characters
+TOKEN_PATTERN = re.compile(rb'\w+|[^\w\s]')
+WORD_BYTES = b'0123456789_ABCDEFGHIJKLMNOPQRSTUVWXYZabcdefghijklmnopqrstuvwxyz'
+EMPTY_SLOT = 1 << 32
+# Added per slot of distance to a value an empty slot borrows from a filled one
+BORROW_STEP = 0x9E3779B9
+
+
+def minhash_file(file_path, indexed_entry=None, cached_signature=None, stat_filter=None):
+    """
+    Compute the MinHash signature of a file's token shingles.
+    
+    Tokens are identifiers, numbers and single punctuation characters, so
+    changes to whitespace and indentation do not count as edits, and every
+    run of MINHASH_SHINGLE_SIZE consecutive tokens is a shingle. Rather than
+    hashing each shingle once per slot, one-permutation hashing is used:
+    each shingle is hashed once (blake2b), the hash picks one of
+    MINHASH_SLOTS slots, and each slot keeps the smallest value it sees.
+    Empty slots borrow the value of the next filled slot (offset by the
+    distance to it), so short files still get full signatures. The share of
+    slots on which two signatures agree estimates the Jaccard similarity of
+    their shingle sets (see signature_similarity).
+    
+    The file is read in fixed-size chunks and its fingerprint is computed in
+    the same pass, so memory stays bounded. If the indexed entry's stat
+    signature still matches the file, the cached signature of its
+    fingerprint is used without opening it. Binary files are skipped.
+    
+    Returns:
+        dict: Result with the path, stat result, fingerprint, line count
+              and signature (MINHASH_SLOTS packed 32-bit values, empty if
+              the file has no tokens), along with the I/O fields counted by
+              SearchStats.record_scan
+    """
+    result = {
+        'path': file_path,
+        'stat': None,
+        'error': None,
+        'indexed': False,
+        'cached': False,
+        'below_min_size': False,
+        'rejected_by_stat': False,
+        'bytes_read': None,
+        'match_seconds': 0.0,
+        'limited': None,
+        'fingerprint': None,
+        'line_count': None,
+        'signature': None
+    }
+    try:
+        stat_result = os.stat(file_path)
+        result['stat'] = stat_result
+        if stat_filter is not None and stat_filter.rejects(stat_result):
+            result['rejected_by_stat'] = True
+            return result
+        if (indexed_entry is not None and cached_signature is not None
+                and stat_signature(stat_result) == indexed_entry[:3]):
+            result.update(cached=True, fingerprint=indexed_entry[4],
+                          line_count=indexed_entry[3], signature=cached_signature)
+            return result
+        
+        size = stat_result.st_size
+        hasher = git_blob_id_hasher(size)
+        mins = [EMPTY_SLOT] * MINHASH_SLOTS
+        blake2b = hashlib.blake2b
+        shingled = False
+        context = []
+        carry = b''
+        newlines = 0
+        last_byte = b''
+        bytes_read = 0
+        with open(file_path, 'rb') as f:
+            while True:
+                chunk = f.read(SCAN_CHUNK_SIZE)
+                if not bytes_read and b'\0' in chunk[:BINARY_SNIFF_SIZE]:
+                    result.update(limited='binary', bytes_read=len(chunk))
+                    return result
+                if chunk:
+                    bytes_read += len(chunk)
+                    hasher.update(chunk)
+                    split_crlf = last_byte == b'\r' and chunk[:1] == b'\n'
+                    newlines += count_newlines(chunk) - split_crlf
+                    last_byte = chunk[-1:]
+                    # Hold back a word cut off at the end of the chunk
+                    data = carry + chunk
+                    cut = len(data.rstrip(WORD_BYTES))
+                    data, carry = data[:cut], data[cut:]
+                else:
+                    data = carry
+                tokens = context + TOKEN_PATTERN.findall(data)
+                for shingle in set(zip(*(tokens[i:] for i in range(MINHASH_SHINGLE_SIZE)))):
+                    shingled = True
+                    value = int.from_bytes(blake2b(b' '.join(shingle), digest_size=8).digest(),
+                                           'little')
+                    slot = value % MINHASH_SLOTS
+                    value >>= 32
+                    if value < mins[slot]:
+                        mins[slot] = value
+                context = tokens[1 - MINHASH_SHINGLE_SIZE:]
+                if not chunk:
+                    break
+        # A file shorter than one shingle is a shingle of its own
+        if not shingled and context:
+            value = int.from_bytes(blake2b(b' '.join(context), digest_size=8).digest(), 'little')
+            mins[value % MINHASH_SLOTS] = value >> 32
+        
+        result['bytes_read'] = bytes_read
+        result['line_count'] = newlines + (1 if last_byte and last_byte not in (b'\r', b'\n')
+                                           else 0)
+        result['fingerprint'] = hasher.hexdigest() if bytes_read == size else None
+        result['signature'] = densify_signature(mins)
+    except Exception as e:
+        result['error'] = e
+    return result
+
+
+def densify_signature(mins):
+    """
+    Fill the empty slots of a one-permutation MinHash and pack it.
+    
+    Each empty slot takes the value of the nearest filled slot to its right
+    (wrapping around), plus BORROW_STEP for each slot of distance, so two
+    files only agree on a borrowed slot if they borrowed the same value from
+    the same distance.
+    
+    Returns:
+        bytes: Packed little-endian 32-bit slots, or b'' if every slot is empty
+    """
+    slots = len(mins)
+    signature = list(mins)
+    borrowed = None
+    distance = 0
+    # Walk right to left twice so slots near the end can borrow from the start
+    for slot in range(2 * slots - 1, -1, -1):
+        value = mins[slot % slots]
+        if value != EMPTY_SLOT:
+            borrowed, distance = value, 0
+            continue
+        distance += 1
+        if slot < slots and borrowed is not None:
+            signature[slot] = (borrowed + distance * BORROW_STEP) & 0xFFFFFFFF
+    if borrowed is None:
+        return b''
+    return struct.pack(f'<{slots}I', *signature)
+
+
+def signature_similarity(signature, other):
+    """Estimate the Jaccard similarity of two files from their MinHash signatures."""
+    slots = memoryview(signature).cast('I')
+    same = sum(map(operator.eq, slots, memoryview(other).cast('I')))
+    return same / len(slots)
+
+
+def lsh_bands(threshold, slots=MINHASH_SLOTS, recall=LSH_RECALL):
+    """
+    Choose how to cut signatures into bands for locality-sensitive hashing.
+    
+    Two signatures become candidates when all rows of any one band agree,
+    which for files of Jaccard similarity s happens with probability
+    1 - (1 - s**rows)**bands. The longest bands that still turn up recall of
+    the pairs right at the threshold are chosen, which keeps dissimilar
+    pairs out of the candidates while pairs above the threshold are found
+    even more reliably.
+    
+    Returns:
+        tuple: (bands, rows)
+    """
+    best = (slots, 1)
+    for rows in range(1, slots + 1):
+        bands = slots // rows
+        if 1 - (1 - threshold ** rows) ** bands >= recall:
+            best = (bands, rows)
+    return best
+
+
+class LSHIndex:
+    """
+    Locality-sensitive hashing index over MinHash signatures.
+    
+    Each signature is cut into bands (see lsh_bands) and every band is a key
+    into its own hash table, so the candidates for a signature, the items
+    that agree with it on at least one band, are found without comparing it
+    to every item added so far.
+    """
+    
+    def __init__(self, threshold, slots=MINHASH_SLOTS):
+        self.bands, self.rows = lsh_bands(threshold, slots)
+        self.tables = [{} for _ in range(self.bands)]
+    
+    def _keys(self, signature):
+        width = self.rows * 4
+        return (signature[band * width:(band + 1) * width] for band in range(self.bands))
+    
+    def add(self, item, signature):
+        """Add an item under its signature."""
+        for table, key in zip(self.tables, self._keys(signature)):
+            table.setdefault(key, []).append(item)
+    
+    def candidates(self, signature):
+        """Return the items that share a band with a signature, in the order they were added."""
+        found = set()
+        for table, key in zip(self.tables, self._keys(signature)):
+            found.update(table.get(key, ()))
+        return sorted(found)
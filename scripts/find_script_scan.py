@@ -0,0 +1,703 @@
+"""
+Script Finder Scanning
+
+Keyword matching and the streaming file scanner used by find_script.py. Content
+keywords and regexes are compiled into one KeywordMatcher, and scan_stream counts
+lines, finds keywords, captures snippets and computes the git blob id of a file in a
+single pass over fixed-size chunks, stopping early once the search criteria are met
+or a read budget runs out. scan_file wraps it with the stat, binary and index checks
+and is safe to run in thread or process pools (see ordered_map).
+"""
+
+import os
+import json
+import hashlib
+import codecs
+import functools
+import re
+import time
+from collections import deque, namedtuple
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
+from datetime import datetime
+
+# Scans kept in flight per worker when scanning in parallel
+SCAN_QUEUE_DEPTH = 4
+
+# Bytes read per chunk when streaming file contents
+SCAN_CHUNK_SIZE = 1024 * 1024
+
+# Content keywords with this prefix are regular expressions
+REGEX_PREFIX = 're:'
+
+# Tail kept between chunks for regex keywords; longer matches spanning two
+# chunks can be missed
+REGEX_OVERLAP = 1024
+
+# Longest unfinished line held back for regex keywords until its line break is
+# read; past it regexes are matched up to the chunk edge, where $ can match
+REGEX_LINE_LIMIT = 1024 * 1024
+
+# Leading bytes checked for NUL bytes when deciding whether a file is binary
+BINARY_SNIFF_SIZE = 8192
+
+# Characters kept of each line of a match snippet
+SNIPPET_LINE_LIMIT = 200
+
+
+def fold_case(text):
+    """
+    Lowercase text (str or bytes) without changing its length, so positions
+    in the result are positions in the original.
+    
+    str.lower() turns a few characters into longer sequences ('İ' becomes 'i'
+    and a combining dot); those are lowered to the first character of their
+    lowercase form instead. Keywords and contents are folded alike.
+    """
+    lowered = text.lower()
+    if len(lowered) == len(text):
+        return lowered
+    return ''.join(lower[0] for lower in map(str.lower, text))
+
+
+def is_regex_keyword(keyword):
+    """Return whether a content keyword is a regular expression ('re:' prefix)."""
+    return keyword.startswith(REGEX_PREFIX)
+
+
+def regex_literal_prefix(pattern):
+    """
+    Return a lowercased literal that every match of a regex starts with.
+    
+    Only a plain run of literal characters at the start of the pattern is
+    used; an empty string is returned when there is none, or when the pattern
+    has a top-level alternation.
+    """
+    depth = 0
+    in_class = False
+    i = 0
+    while i < len(pattern):
+        char = pattern[i]
+        if char == '\\':
+            i += 1
+        elif in_class:
+            in_class = char != ']'
+        elif char == '[':
+            in_class = True
+        elif char == '(':
+            depth += 1
+        elif char == ')':
+            depth -= 1
+        elif char == '|' and depth == 0:
+            return ''
+        i += 1
+    
+    prefix = []
+    i = 0
+    while i < len(pattern):
+        char = pattern[i]
+        if char == '\\':
+            escaped = pattern[i + 1:i + 2]
+            if not escaped or escaped.isalnum():
+                break
+            literal, i = escaped, i + 2
+        elif char in '.^$*+?{}[]()|':
+            break
+        else:
+            literal, i = char, i + 1
+        # A quantifier that allows zero repeats makes the last literal optional
+        if pattern[i:i + 1] in ('*', '?', '{'):
+            break
+        prefix.append(literal)
+        if pattern[i:i + 1] == '+':
+            break
+    return fold_case(''.join(prefix))
+
+
+def required_literal(keyword):
+    """Return the lowercased literal text any match of a keyword must contain."""
+    if is_regex_keyword(keyword):
+        return regex_literal_prefix(keyword[len(REGEX_PREFIX):])
+    return fold_case(keyword)
+
+
+def trigrams(data):
+    """Return the set of distinct byte trigrams in data, each packed into an int."""
+    return {(a << 16) | (b << 8) | c for a, b, c in set(zip(data, data[1:], data[2:]))}
+
+
+class KeywordMatcher:
+    """
+    Case-insensitive multi-keyword matcher over a stream of chunks.
+    
+    All keywords that have not been seen yet are compiled into a single
+    alternation, so each chunk is searched in one pass however many keywords
+    there are. Whenever a keyword is found the pattern is narrowed to the
+    remaining keywords and the search resumes at the same position, so a
+    keyword shadowed by a longer or shorter alternative there is not missed
+    and frequent keywords are never matched twice.
+    
+    ASCII keywords are matched directly against lowercased bytes. If any keyword
+    is non-ASCII the chunks are decoded as UTF-8 and matched as text instead.
+    
+    Keywords starting with 're:' are case-insensitive regular expressions.
+    They join the same alternation as named groups (so one pass still covers
+    every keyword), and a regex whose literal prefix does not occur in a
+    chunk is left out of the alternation for that chunk. They are compiled
+    with re.MULTILINE, so ^ and $ anchor at line boundaries; scan_stream
+    only matches them over complete lines for that reason.
+    """
+    
+    def __init__(self, keywords):
+        self.keywords = list(keywords)
+        self.text_mode = not all(keyword.isascii() for keyword in self.keywords)
+        self._needles = {}
+        self._prefixes = {}
+        for keyword in self.keywords:
+            if is_regex_keyword(keyword):
+                source = keyword[len(REGEX_PREFIX):]
+                prefix = regex_literal_prefix(source)
+                if not self.text_mode:
+                    source, prefix = source.encode('ascii'), prefix.encode('ascii')
+                needle = re.compile(source, re.IGNORECASE | re.MULTILINE)
+                self._prefixes[needle] = prefix
+            else:
+                needle = fold_case(keyword)
+                if not self.text_mode:
+                    needle = needle.encode('ascii')
+            self._needles.setdefault(needle, []).append(keyword)
+        # Tail of the previous window kept so matches spanning chunks are found
+        literal_overlap = max((len(needle) for needle in self._needles
+                               if needle not in self._prefixes), default=1) - 1
+        self.overlap = max(literal_overlap, REGEX_OVERLAP if self._prefixes else 0)
+        self.has_regexes = bool(self._prefixes)
+        # Fail early on patterns that cannot be combined
+        self._pattern(frozenset(self._needles))
+    
+    @staticmethod
+    @functools.lru_cache(maxsize=256)
+    def _pattern(needles):
+        """
+        Compile needles into one alternation.
+        
+        Returns:
+            tuple: (compiled pattern, needles by group number or None when the
+                    needles are all literals and the matched text is the needle)
+        """
+        literals = sorted((needle for needle in needles if not isinstance(needle, re.Pattern)),
+                          key=len, reverse=True)
+        regexes = sorted((needle for needle in needles if isinstance(needle, re.Pattern)),
+                         key=lambda needle: needle.pattern)
+        bytes_mode = any(isinstance(needle, bytes) for needle in literals) \
+            or any(isinstance(needle.pattern, bytes) for needle in regexes)
+        joiner = b'|' if bytes_mode else '|'
+        if not regexes:
+            return re.compile(joiner.join(re.escape(needle) for needle in literals)), None
+        
+        order = literals + regexes
+        sources = [re.escape(needle) for needle in literals] + [needle.pattern for needle in regexes]
+        if bytes_mode:
+            groups = [b'(?P<k%d>%s)' % (i, source) for i, source in enumerate(sources)]
+        else:
+            groups = [f'(?P<k{i}>{source})' for i, source in enumerate(sources)]
+        return re.compile(joiner.join(groups), re.IGNORECASE | re.MULTILINE), order
+    
+    def needles(self):
+        """Return the set of lowercased needles still to be found."""
+        return set(self._needles)
+    
+    def search(self, window, remaining, start=0, end=None):
+        """
+        Remove every needle found in window[start:end] from remaining.
+        
+        Text before start and from end on is only looked at by anchors and
+        lookarounds, which see where the window really starts and ends a line.
+        
+        Returns:
+            dict: Position in window of the first occurrence of each needle found
+        """
+        if end is None:
+            end = len(window)
+        found = {}
+        pos = start
+        # Regexes whose literal prefix is absent cannot match in this window
+        candidates = {needle for needle in remaining
+                      if needle not in self._prefixes or self._prefixes[needle] in window}
+        while candidates:
+            pattern, order = self._pattern(frozenset(candidates))
+            match = pattern.search(window, pos, end)
+            if match is None:
+                break
+            needle = match.group() if order is None else order[int(match.lastgroup[1:])]
+            found[needle] = match.start()
+            remaining.discard(needle)
+            candidates.discard(needle)
+            pos = match.start()
+        return found
+    
+    def count(self, window, tail, counts, offset, ends, start=0, end=None):
+        """
+        Add the occurrences of every needle in window to counts.
+        
+        tail is the start of window carried over from the previous window;
+        literal occurrences lying entirely inside it were already counted.
+        Regex matches are counted in window[start:end] (see search), resuming
+        where the last match counted for that regex ended, tracked in ends as
+        positions in the stream (offset is the stream position of the window).
+        """
+        if end is None:
+            end = len(window)
+        for needle in self._needles:
+            if needle in self._prefixes:
+                if self._prefixes[needle] not in window:
+                    continue
+                count = 0
+                for match in needle.finditer(window, max(start, ends.get(needle, 0) - offset), end):
+                    count += 1
+                    # Step past an empty match so it is not counted again
+                    ends[needle] = offset + match.end() + (match.end() == match.start())
+            else:
+                count = window.count(needle) - tail.count(needle)
+            counts[needle] = counts.get(needle, 0) + count
+    
+    def keywords_for(self, found):
+        """Map found needles back to the keywords, in keyword order."""
+        matched = {keyword for needle in found for keyword in self._needles[needle]}
+        return [keyword for keyword in self.keywords if keyword in matched]
+    
+    def counts_for(self, counts):
+        """Map needle counts back to the keywords that occurred, in keyword order."""
+        keyword_counts = {}
+        for needle, keywords in self._needles.items():
+            if counts.get(needle):
+                keyword_counts.update(dict.fromkeys(keywords, counts[needle]))
+        return {keyword: keyword_counts[keyword] for keyword in self.keywords
+                if keyword in keyword_counts}
+    
+    def snippets_for(self, snippets):
+        """Label snippets (keyed by needle) with their first keyword, in keyword order."""
+        labelled = []
+        for needle, keywords in self._needles.items():
+            if needle in snippets:
+                labelled.append(dict(snippets[needle], keyword=keywords[0]))
+        order = {keyword: i for i, keyword in enumerate(self.keywords)}
+        labelled.sort(key=lambda snippet: order[snippet['keyword']])
+        return labelled
+
+
+@functools.lru_cache(maxsize=32)
+def get_keyword_matcher(keywords):
+    """Return a (cached) KeywordMatcher for a tuple of keywords."""
+    return KeywordMatcher(keywords)
+
+
+def count_newlines(data, start=0, end=None):
+    """Count line breaks in data[start:end] the way universal newlines would."""
+    if end is None:
+        end = len(data)
+    cr, lf = ('\r', '\n') if isinstance(data, str) else (b'\r', b'\n')
+    return data.count(lf, start, end) + data.count(cr, start, end) - data.count(cr + lf, start, end)
+
+
+def line_context(text, pos, first_line, context):
+    """
+    Return the line holding text[pos] with up to context lines on either side.
+    
+    Args:
+        text (str or bytes): Text the position refers to
+        pos (int): Position of the hit in text
+        first_line (int): Line number of the first line of text
+        context (int): Number of lines to include before and after the hit
+        
+    Returns:
+        dict: The hit's line number and a list of [line number, line] pairs,
+              with bytes decoded as UTF-8 and long lines shortened
+    """
+    newline = '\n' if isinstance(text, str) else b'\n'
+    begin = text.rfind(newline, 0, pos) + 1
+    for _ in range(context):
+        if begin == 0:
+            break
+        begin = text.rfind(newline, 0, begin - 1) + 1
+    end = pos
+    for _ in range(context + 1):
+        end = text.find(newline, end)
+        if end == -1:
+            end = len(text)
+            break
+        end += 1
+    
+    line = first_line + count_newlines(text, 0, pos)
+    begin_line = first_line + count_newlines(text, 0, begin)
+    lines = text[begin:end].splitlines()
+    hit = line - begin_line
+    lines = lines[max(0, hit - context):hit + context + 1]
+    begin_line += max(0, hit - context)
+    
+    context_lines = []
+    for number, content in enumerate(lines, begin_line):
+        if isinstance(content, bytes):
+            content = content.decode('utf-8', 'replace')
+        context_lines.append([number, content[:SNIPPET_LINE_LIMIT]])
+    return {'line': line, 'context': context_lines}
+
+
+# Per-file read limits: bytes and lines read, seconds spent, and whether
+# files with a NUL byte in their first block are skipped as binary
+ReadBudget = namedtuple('ReadBudget', 'max_bytes max_lines max_seconds skip_binary',
+                        defaults=(None, None, None, True))
+
+LINE_BREAK = re.compile(rb'\r\n?|\n')
+
+
+class StatFilter(namedtuple('StatFilter', 'min_size max_size newer_than older_than',
+                            defaults=(0, None, None, None))):
+    """
+    Predicates answered from a file's stat data, before it is opened.
+    
+    Sizes are in bytes and times are Unix timestamps compared with the
+    mtime; None leaves a bound open.
+    """
+    __slots__ = ()
+    
+    def rejects(self, stat_result):
+        """Return whether a file with this stat result fails any predicate."""
+        size = stat_result.st_size
+        if size < self.min_size or (self.max_size is not None and size > self.max_size):
+            return True
+        mtime = stat_result.st_mtime
+        if self.newer_than is not None and mtime < self.newer_than:
+            return True
+        return self.older_than is not None and mtime >= self.older_than
+    
+    def describe(self):
+        """Return a short description of the active predicates."""
+        parts = []
+        if self.min_size:
+            parts.append(f"size >= {self.min_size}")
+        if self.max_size is not None:
+            parts.append(f"size <= {self.max_size}")
+        for label, timestamp in (('newer than', self.newer_than), ('older than', self.older_than)):
+            if timestamp is not None:
+                parts.append(f"{label} {datetime.fromtimestamp(timestamp):%Y-%m-%d %H:%M}")
+        return ', '.join(parts)
+
+
+def git_blob_id_hasher(size):
+    """Return a sha1 hasher primed with the git blob header for content of a given size."""
+    return hashlib.sha1(b'blob %d\0' % size)
+
+
+def stat_signature(stat_result):
+    """Return the (size, mtime_ns, inode) signature of a stat result."""
+    return (stat_result.st_size, stat_result.st_mtime_ns, stat_result.st_ino)
+
+
+def scan_stream(f, min_lines, matcher, counts=None, snippets=None, context=2, budget=None,
+                size=None):
+    """
+    Scan a binary file object in fixed-size chunks.
+    
+    Newlines are counted the way readlines() in text mode would count lines
+    (universal newlines) and all keywords are matched in the same pass. Only
+    one chunk (plus its lowercased copy) is held in memory at a time, along
+    with the unfinished line regex keywords have not been matched over yet
+    (up to REGEX_LINE_LIMIT characters). The scan
+    stops early once every keyword has been seen and min_lines is satisfied,
+    in which case the line count is only a lower bound and no fingerprint is
+    computed.
+    
+    The fingerprint is the git blob id of the content, so it can be compared
+    with the ids git records for tracked files. size is the expected content
+    length (taken from the open file when omitted); if a different number of
+    bytes is read, the file changed under the scan and no fingerprint is given.
+    
+    When a counts dict is given, every occurrence of each keyword is counted
+    into it (keyed by lowercased needle) and the whole file is always read.
+    
+    When a snippets dict is given, the first hit of each keyword is recorded
+    in it (keyed by needle) with context lines around it (see line_context).
+    Context does not extend past the chunk holding the hit.
+    
+    A ReadBudget bounds the work done per file. A file whose first block
+    contains a NUL byte is given up on straight away as binary. Reading stops
+    once the byte, line or time budget is spent, in which case the line count
+    and keywords only cover what was read.
+    
+    Returns:
+        tuple: (line_count, lines_exact, matched_keywords, fingerprint,
+                seconds spent matching keywords, the reason the file was
+                skipped or truncated ('binary', 'max_bytes', 'max_lines' or
+                'time') or None)
+    """
+    if budget is None:
+        budget = ReadBudget()
+    started_at = time.monotonic()
+    if size is None:
+        size = os.fstat(f.fileno()).st_size
+    hasher = git_blob_id_hasher(size)
+    decoder = codecs.getincrementaldecoder('utf-8')('ignore') if matcher.text_mode else None
+    remaining = matcher.needles()
+    found = {}
+    newlines = 0
+    last_byte = b''
+    tail = source_tail = '' if matcher.text_mode else b''
+    newline = '\n' if matcher.text_mode else b'\n'
+    # Matches start at or after start in the window; tail[:start] is the
+    # character before the tail, which anchors and lookbehinds look at
+    start = 0
+    position = 0
+    regex_ends = {}
+    match_seconds = 0.0
+    bytes_read = 0
+    limit = None
+    
+    def match(text, chunk_line, final=False):
+        nonlocal tail, source_tail, start, position
+        window = tail + fold_case(text)
+        end = len(window)
+        if matcher.has_regexes and not final:
+            # Regexes are matched up to the last line break, so $ does not
+            # match at the chunk edge; the rest is matched with the next chunk
+            end = window.rfind(newline, start)
+            if len(window) - end > REGEX_LINE_LIMIT:
+                end = len(window)
+        if counts is not None and end >= start:
+            matcher.count(window, tail, counts, position - len(tail), regex_ends, start, end)
+        position += len(text)
+        if remaining and end >= start:
+            hits = matcher.search(window, remaining, start, end)
+            if hits and snippets is not None:
+                # fold_case keeps the original-case text lined up with the window
+                source = source_tail + text
+                first_line = chunk_line - count_newlines(source_tail)
+                for needle, pos in hits.items():
+                    snippets[needle] = line_context(source, pos, first_line, context)
+            found.update(hits)
+        # Keep what the next window needs: the overlap, anything not matched
+        # yet and the character before them
+        keep = max(start, end - matcher.overlap)
+        tail = window[keep - 1:] if keep else window
+        if snippets is not None:
+            source_tail = (source_tail + text)[keep - 1:] if keep else source_tail + text
+        start = min(keep, 1)
+    
+    while True:
+        read_size = SCAN_CHUNK_SIZE
+        if budget.max_bytes is not None:
+            read_size = min(read_size, budget.max_bytes - bytes_read)
+            if read_size <= 0:
+                limit = 'max_bytes' if f.read(1) else None
+                break
+        chunk = f.read(read_size)
+        if not chunk:
+            break
+        if not bytes_read and budget.skip_binary and b'\0' in chunk[:BINARY_SNIFF_SIZE]:
+            return 0, False, [], None, 0.0, 'binary'
+        bytes_read += len(chunk)
+        # A CRLF split across chunks was counted with the previous chunk
+        split_crlf = last_byte == b'\r' and chunk[:1] == b'\n'
+        
+        if budget.max_lines is not None and \
+                newlines + count_newlines(chunk) - split_crlf >= budget.max_lines:
+            # Cut the chunk just after the last line break within the budget
+            wanted = budget.max_lines - newlines
+            for count, line_break in enumerate(LINE_BREAK.finditer(chunk, split_crlf), 1):
+                if count == wanted:
+                    if line_break.end() < len(chunk) or f.read(1):
+                        limit = 'max_lines'
+                    chunk = chunk[:line_break.end()]
+                    break
+        
+        hasher.update(chunk)
+        chunk_line = newlines + 1 - split_crlf
+        newlines += count_newlines(chunk) - split_crlf
+        last_byte = chunk[-1:]
+        
+        if remaining or counts is not None:
+            started = time.perf_counter()
+            match(decoder.decode(chunk) if decoder else chunk, chunk_line)
+            match_seconds += time.perf_counter() - started
+        
+        line_count = newlines + (1 if last_byte not in (b'\r', b'\n') else 0)
+        if limit is not None:
+            break
+        if not remaining and counts is None and line_count >= min_lines:
+            # Peek so a file that ends exactly here still gets an exact count
+            if not f.read(1):
+                break
+            return line_count, False, matcher.keywords_for(found), None, match_seconds, None
+        if budget.max_seconds is not None and time.monotonic() - started_at > budget.max_seconds:
+            limit = 'time' if f.read(1) else None
+            break
+    
+    if matcher.has_regexes and (remaining or counts is not None):
+        # Match regexes over the last line, which has no line break to wait for
+        started = time.perf_counter()
+        match(tail[:0], newlines + 1, final=True)
+        match_seconds += time.perf_counter() - started
+    
+    line_count = newlines + (1 if last_byte and last_byte not in (b'\r', b'\n') else 0)
+    if limit is not None:
+        return line_count, False, matcher.keywords_for(found), None, match_seconds, limit
+    fingerprint = hasher.hexdigest() if bytes_read == size else None
+    return line_count, True, matcher.keywords_for(found), fingerprint, match_seconds, None
+
+
+def new_scan_result(file_path):
+    """Return a scan result for a file that has not been looked at yet (see scan_file)."""
+    return {
+        'path': file_path,
+        'stat': None,
+        'line_count': 0,
+        'lines_exact': True,
+        'fingerprint': None,
+        'matched_keywords': [],
+        'keyword_counts': None,
+        'snippets': None,
+        'rejected_by_stat': False,
+        'below_min_size': False,
+        'indexed': False,
+        'bytes_read': None,
+        'match_seconds': 0.0,
+        'limited': None,
+        'cached': False,
+        'error': None
+    }
+
+
+def scan_file(file_path, min_lines, content_keywords, indexed_entry=None, count_keywords=False,
+              min_size=0, context_lines=None, budget=None, cached_scan=None, stat_filter=None):
+    """
+    Scan a single file for its line count and keyword matches.
+    
+    This is a module-level function so it can run in worker threads or
+    processes; it does no printing and never touches the file index.
+    
+    Predicates are checked from the cheapest up: the stat data first (the
+    stat_filter, and min_lines, since a file of n lines has at least n
+    bytes), then the line count from the index, and only then the contents.
+    
+    When the file's stat signature matches indexed_entry, its content is the
+    one fingerprinted there, so a cached_scan of that fingerprint is used as
+    is and the file is not opened.
+    
+    Args:
+        file_path (Path): File to scan
+        min_lines (int): Minimum number of lines required
+        content_keywords (list): Keywords to search for in file content
+        indexed_entry (tuple): File index entry for the file, if any; the line
+            count in it may be None when only the fingerprint is known
+        count_keywords (bool): Whether to count every keyword occurrence
+            (reading the whole file) rather than stop at the first of each
+        min_size (int): Files smaller than this many bytes are not opened
+        context_lines (int): Record a snippet with this many lines of context
+            around the first hit of each keyword (None to record none)
+        budget (ReadBudget): Per-file read limits (None for the defaults)
+        cached_scan (dict): Scan result cached for the fingerprint in
+            indexed_entry (see FileIndex.cached_scan), if any
+        stat_filter (StatFilter): Size and mtime predicates
+        
+    Returns:
+        dict: Scan result with the path, stat result, line count (and whether it
+              is exact), content fingerprint (None when the file was not fully
+              read), matched keywords, keyword counts (when counting), snippets
+              (when recording them), whether the file was rejected from its
+              stat data, whether
+              the file was skipped for being under min_size, whether the line
+              count came from the index, bytes read (None when the file was not
+              opened), seconds spent matching keywords, why the file was
+              skipped or truncated by the read budget (None if it was not),
+              whether the result came from the scan cache, and any error
+    """
+    result = new_scan_result(file_path)
+    try:
+        stat_result = file_path.stat()
+        result['stat'] = stat_result
+        
+        if stat_result.st_size < min_lines or (
+                stat_filter is not None and stat_filter.rejects(stat_result)):
+            result['rejected_by_stat'] = True
+            return result
+        
+        if stat_result.st_size < min_size:
+            result['below_min_size'] = True
+            return result
+        
+        # Answer from the index and the scan cache when the file is unchanged
+        if indexed_entry is not None and stat_signature(stat_result) == indexed_entry[:3]:
+            if cached_scan is not None:
+                result['line_count'] = cached_scan['line_count']
+                result['fingerprint'] = indexed_entry[4]
+                result['cached'] = True
+                if count_keywords:
+                    result['keyword_counts'] = cached_scan['keyword_counts']
+                if result['line_count'] >= min_lines:
+                    result['matched_keywords'] = cached_scan['matched_keywords']
+                    if context_lines is not None:
+                        result['snippets'] = cached_scan['snippets']
+                return result
+            if indexed_entry[3] is not None:
+                result['line_count'] = indexed_entry[3]
+                if result['line_count'] < min_lines:
+                    result['indexed'] = True
+                    return result
+        
+        # Count lines and match keywords in a single streaming pass
+        matcher = get_keyword_matcher(tuple(content_keywords))
+        counts = {} if count_keywords else None
+        snippets = {} if context_lines is not None else None
+        with open(file_path, 'rb') as f:
+            result['bytes_read'] = 0
+            (result['line_count'], result['lines_exact'], matched_keywords,
+             result['fingerprint'], result['match_seconds'], result['limited']) = scan_stream(
+                f, min_lines, matcher, counts, snippets, context_lines, budget,
+                stat_result.st_size)
+            result['bytes_read'] = f.tell()
+        
+        if counts is not None:
+            result['keyword_counts'] = matcher.counts_for(counts)
+        if result['line_count'] >= min_lines:
+            result['matched_keywords'] = matched_keywords
+            if snippets is not None:
+                result['snippets'] = matcher.snippets_for(snippets)
+    except Exception as e:
+        result['error'] = e
+    return result
+
+
+def ordered_map(func, items, jobs=1, pool='thread'):
+    """
+    Call func(*item) for each item, yielding the results in order.
+    
+    With more than one job the calls run in a thread pool (hashlib releases
+    the GIL while hashing) or, for CPU-bound work in pure Python, a process
+    pool (func must then be a module-level function), with at most a few
+    calls per worker in flight.
+    """
+    if jobs <= 1:
+        for item in items:
+            yield func(*item)
+        return
+    executor_class = ProcessPoolExecutor if pool == 'process' else ThreadPoolExecutor
+    pending = deque()
+    with executor_class(max_workers=jobs) as executor:
+        for item in items:
+            pending.append(executor.submit(func, *item))
+            if len(pending) >= jobs * SCAN_QUEUE_DEPTH:
+                yield pending.popleft().result()
+        while pending:
+            yield pending.popleft().result()
+
+
+def scan_key(content_keywords, count_keywords, context_lines, budget=None):
+    """
+    Return the key cached scan results are stored under for a set of scan options.
+    
+    The read budget is part of the key: a file scanned without skipping
+    binary content, or with other limits, may not give the result a scan
+    with the defaults would.
+    """
+    if budget is None:
+        budget = ReadBudget()
+    options = json.dumps([list(content_keywords), count_keywords, context_lines, list(budget)])
+    return hashlib.sha1(options.encode('utf-8')).hexdigest()
@@ -0,0 +1,1832 @@
+"""
+Script Finder Search
+
+ScriptFinder, the search engine behind find_script.py: gathering candidate files from
+the tree or the file list cache, filtering them cheapest predicate first, scanning
+their contents in parallel, and the duplicate, near-duplicate, name and --top searches,
+along with the per-phase SearchStats and the BM25 RelevanceRanker.
+"""
+
+import os
+import queue
+import math
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
+from pathlib import Path
+
+from find_script_scan import (
+    SCAN_QUEUE_DEPTH, StatFilter, fold_case, is_regex_keyword, ordered_map,
+    required_literal, scan_file, scan_key)
+from find_script_duplicates import (
+    DEFAULT_SIMILARITY, LSHIndex, content_fingerprint, minhash_file, partial_digest,
+    signature_similarity)
+from find_script_cache import (
+    DEFAULT_CACHE_SIZE_LIMIT, FILE_INDEX_NAME, NAME_RESULT_LIMIT,
+    RACY_MTIME_SECONDS, TRIGRAM_INDEX_NAME, CacheManager, FileIndex, GitBlobIndex,
+    TrigramIndex)
+from find_script_archives import (
+    ARCHIVE_EXTENSIONS, archive_kind, member_rejection, scan_archive)
+from find_script_walk import SKIP_DIRS, IgnoreMatcher, PathGlob, TreeWalker
+
+# Files handed over per batch, and batches queued per root, when walking
+# several roots concurrently
+ROOT_BATCH_SIZE = 256
+ROOT_QUEUE_DEPTH = 4
+
+# Files skipped or truncated by read budgets that are listed in the stats
+STATS_MAX_LIMITED_FILES = 100
+
+
+class RelevanceRanker:
+    """
+    Keep the K best matches of a scan by BM25 relevance.
+    
+    A file's score is the sum over distinct keywords of idf * weight, where
+    weight = tf * (k1 + 1) / (tf + k1 * (1 - b + b * size / avg_size)), with the
+    file size in bytes standing in for document length. The average size is
+    taken over the whole file list before the scan (see set_collection).
+    Keyword rarity is estimated from the files whose keywords were actually
+    counted, since skipped files were never read, so idf is only final once
+    the scan ends.
+    
+    The ranking is exact all the same. Each file still to come may or may not
+    be read and may or may not hold a keyword, which brackets every term's
+    final idf, and with it every kept match's final score, between bounds
+    that close in as the scan proceeds. A match is only dropped once its upper
+    bound falls below the K-th best lower bound, so a few more than K matches
+    may be kept while the bounds are wide.
+    
+    Because a keyword can occur at most size / len(keyword) times, a file's
+    upper bound is also bounded by a function of its size alone, which grows
+    with the size. min_size() turns the K-th best lower bound into the
+    smallest file size that could still reach the top K, so smaller files are
+    skipped after a stat without being opened.
+    
+    Without set_collection (when archive members, which are only listed as
+    they are scanned, join the collection), the average size is a running
+    estimate and nothing is dropped or skipped until the scan ends.
+    """
+    
+    K1 = 1.2
+    B = 0.75
+    # Bounds are refreshed this many times over a scan
+    BOUND_REFRESHES = 256
+    
+    def __init__(self, content_keywords, k):
+        self.k = k
+        # Keywords differing only in case are one term
+        self.terms = list(dict.fromkeys(self._term(keyword) for keyword in content_keywords))
+        # Shortest possible match of each term, bounding how often it can occur
+        self.term_lengths = {self._term(keyword): max(len(required_literal(keyword)), 1)
+                             for keyword in content_keywords}
+        self.doc_freq = dict.fromkeys(self.terms, 0)
+        self.counted_files = 0
+        self.file_count = 0
+        self.total_size = 0
+        self.observed = 0
+        # Scan results to come in all, None while unknown
+        self.expected = None
+        self._kept = []
+        self._prune_at = 2 * k
+        self._bounds = None
+        self._bounds_at = None
+        self._threshold = None
+        self._min_size = None
+    
+    def set_collection(self, file_count, total_size, expected):
+        """
+        Fix the collection statistics before the scan.
+        
+        Args:
+            file_count (int): Number of files to be scanned that have a size
+            total_size (int): Their total size in bytes
+            expected (int): Number of scan results that will be observed
+        """
+        self.file_count = file_count
+        self.total_size = total_size
+        self.expected = expected
+    
+    def observe(self, results):
+        """Yield scan results unchanged, updating the collection statistics from them."""
+        for result in results:
+            self.observed += 1
+            if self.expected is None and result['stat'] is not None:
+                self.file_count += 1
+                self.total_size += result['stat'].st_size
+            if result['keyword_counts'] is not None:
+                self.counted_files += 1
+                for term in {self._term(keyword) for keyword in result['keyword_counts']}:
+                    self.doc_freq[term] += 1
+            yield result
+    
+    @staticmethod
+    def _term(keyword):
+        return keyword if is_regex_keyword(keyword) else fold_case(keyword)
+    
+    @staticmethod
+    def _idf(counted_files, doc_freq):
+        return math.log(1 + (counted_files - doc_freq + 0.5) / (doc_freq + 0.5))
+    
+    def _avg_size(self):
+        return max(self.total_size / self.file_count, 1) if self.file_count else 1
+    
+    def _norm(self, size):
+        return self.K1 * (1 - self.B + self.B * size / self._avg_size())
+    
+    def _weights(self, keyword_counts, size):
+        """Return each term's weight in a file, so that its score is the idf-weighted sum."""
+        term_counts = {}
+        for keyword, count in keyword_counts.items():
+            term_counts[self._term(keyword)] = count
+        norm = self._norm(size)
+        return {term: tf * (self.K1 + 1) / (tf + norm) for term, tf in term_counts.items()}
+    
+    @staticmethod
+    def _score(weights, idf):
+        return sum(idf[term] * weight for term, weight in weights.items())
+    
+    def score(self, keyword_counts, size):
+        """Score a file from its keyword counts and size in bytes, with the current statistics."""
+        idf = {term: self._idf(self.counted_files, df) for term, df in self.doc_freq.items()}
+        return self._score(self._weights(keyword_counts, size), idf)
+    
+    def _refresh(self):
+        """
+        Narrow the idf bounds to the files still to come, and drop the kept
+        matches that can no longer reach the top K. Bounds only narrow, so
+        they are refreshed a limited number of times and stay valid between.
+        """
+        if self._bounds_at is not None and self.observed - self._bounds_at < \
+                max(self.expected // self.BOUND_REFRESHES, 1):
+            return
+        self._bounds_at = self.observed
+        pending = max(self.expected - self.observed, 0)
+        # The lowest idf if every file to come is read and holds the term,
+        # the highest if every one is read and none holds it
+        self._bounds = (
+            {term: self._idf(self.counted_files + pending, df + pending)
+             for term, df in self.doc_freq.items()},
+            {term: self._idf(self.counted_files + pending, df)
+             for term, df in self.doc_freq.items()})
+        self._prune()
+    
+    def _prune(self):
+        low, high = self._bounds
+        if len(self._kept) >= self.k:
+            lows = sorted((self._score(weights, low) for _, weights in self._kept), reverse=True)
+            self._threshold = lows[self.k - 1]
+            self._min_size = None
+            self._kept = [(match, weights) for match, weights in self._kept
+                          if self._score(weights, high) >= self._threshold]
+        self._prune_at = max(2 * self.k, 2 * len(self._kept))
+    
+    def _bound(self, size):
+        """Upper bound on the final score of any file of the given size."""
+        norm = self._norm(size)
+        bound = 0.0
+        for term in self.terms:
+            tf = size / self.term_lengths[term]
+            bound += self._bounds[1][term] * tf * (self.K1 + 1) / (tf + norm)
+        return bound
+    
+    def min_size(self):
+        """Smallest file size whose score bound reaches the K-th best lower bound."""
+        if self.expected is None:
+            return 0
+        self._refresh()
+        if self._threshold is None:
+            return 0
+        # Only redo the search when the threshold or the bounds moved
+        if self._min_size is None:
+            low, high = 0, 1 << 48
+            if self._bound(high) < self._threshold:
+                self._min_size = high
+            else:
+                while low < high:
+                    middle = (low + high) // 2
+                    if self._bound(middle) >= self._threshold:
+                        high = middle
+                    else:
+                        low = middle + 1
+                self._min_size = low
+        return self._min_size
+    
+    def push(self, match):
+        """Offer a match record (with keyword_counts and size) for the top K."""
+        weights = self._weights(match['keyword_counts'], match['size'])
+        if self.expected is not None:
+            self._refresh()
+            if self._threshold is not None and \
+                    self._score(weights, self._bounds[1]) < self._threshold:
+                return
+        self._kept.append((match, weights))
+        if self.expected is not None and len(self._kept) >= self._prune_at:
+            self._prune()
+    
+    def ranked(self):
+        """Return the top K matches scored with the final statistics, best first."""
+        matches = []
+        for match, _ in self._kept:
+            match['score'] = round(self.score(match['keyword_counts'], match['size']), 4)
+            matches.append(match)
+        matches.sort(key=lambda match: match['score'], reverse=True)
+        return matches[:self.k]
+
+
+class SearchStats:
+    """
+    Phase timings and I/O counters for one search.
+    
+    Phases are timed exclusively: entering a phase while another is running
+    pauses the outer one, so the time the scan spends pulling files from a
+    lazy walk is charged to the walk rather than the scan. Each thread keeps
+    its own phase stack, so when several roots are walked concurrently their
+    walk times add up. Counters may be bumped from any thread and are
+    guarded by a lock. Files skipped or cut short by the read budget are
+    counted by reason, and the first few are listed.
+    
+    Files ruled out are also counted by the predicate stage that eliminated
+    them, cheapest first: extension (only known for directories listed in
+    this search), path (globs and ignore files), stat (size and mtime),
+    lines and keywords (including files the trigram index ruled out). A
+    near-duplicate search counts pairs of files at its lsh and similarity
+    stages: pairs that share no LSH band, and candidate pairs whose
+    signatures fall below the threshold.
+    """
+    
+    COUNTERS = ('dirs_visited', 'dirs_listed', 'dirs_pruned', 'dirs_ignored', 'dirs_stat',
+                'files_listed', 'files_ignored', 'files_stat', 'files_opened', 'files_indexed',
+                'files_below_min_size', 'files_cached', 'files_duplicate',
+                'archives_opened', 'archive_listings_cached', 'bytes_read', 'matches')
+    STAGES = ('extension', 'path', 'stat', 'lines', 'keywords')
+    DUPLICATE_STAGES = ('extension', 'path', 'stat', 'size', 'partial_hash', 'full_hash')
+    SIMILARITY_STAGES = ('extension', 'path', 'stat', 'lsh', 'similarity')
+    
+    def __init__(self, profiler=None, stages=None):
+        """
+        Args:
+            profiler (cProfile.Profile): Optional profiler, enabled only while
+                the scan loop runs
+            stages (tuple): Predicate stages eliminations are counted for
+                (default: STAGES; DUPLICATE_STAGES or SIMILARITY_STAGES for a
+                duplicate or similarity search)
+        """
+        self.profiler = profiler
+        self.phases = {}
+        self.counters = dict.fromkeys(self.COUNTERS, 0)
+        self.eliminated = dict.fromkeys(stages or self.STAGES, 0)
+        self.match_seconds = 0.0
+        self.limited = {}
+        self.limited_files = []
+        self.cache = {'status': 'disabled', 'source': None, 'age_hours': None}
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        self._started = time.perf_counter()
+    
+    @property
+    def _stack(self):
+        stack = getattr(self._local, 'stack', None)
+        if stack is None:
+            stack = self._local.stack = []
+        return stack
+    
+    def add(self, **amounts):
+        """Add to counters by name; safe to call from any thread."""
+        with self._lock:
+            for counter, amount in amounts.items():
+                self.counters[counter] += amount
+    
+    def eliminate(self, stage, count=1):
+        """Count files ruled out at a predicate stage; safe to call from any thread."""
+        with self._lock:
+            self.eliminated[stage] += count
+    
+    def enter(self, name):
+        """Start timing a phase, pausing the phase currently running."""
+        now = time.perf_counter()
+        stack = self._stack
+        if stack:
+            outer, started = stack[-1]
+            self._add_time(outer, now - started)
+        stack.append((name, now))
+        if name == 'scan' and self.profiler is not None:
+            self.profiler.enable()
+    
+    def exit(self):
+        """Stop timing the current phase and resume the one it paused."""
+        now = time.perf_counter()
+        stack = self._stack
+        name, started = stack.pop()
+        self._add_time(name, now - started)
+        if name == 'scan' and self.profiler is not None:
+            self.profiler.disable()
+        if stack:
+            stack[-1] = (stack[-1][0], now)
+    
+    def _add_time(self, name, seconds):
+        with self._lock:
+            self.phases[name] = self.phases.get(name, 0.0) + seconds
+    
+    def timed(self, name, iterable):
+        """Yield from an iterable, charging the time spent producing each item to a phase."""
+        iterator = iter(iterable)
+        try:
+            while True:
+                self.enter(name)
+                try:
+                    item = next(iterator)
+                except StopIteration:
+                    return
+                finally:
+                    self.exit()
+                yield item
+        finally:
+            close = getattr(iterator, 'close', None)
+            if close is not None:
+                close()
+    
+    def record_scan(self, result):
+        """Count the I/O done by one scan_file result."""
+        with self._lock:
+            counters = self.counters
+            if result['stat'] is not None or result['error'] is not None:
+                counters['files_stat'] += 1
+            counters['files_indexed'] += result['indexed']
+            counters['files_cached'] += result['cached']
+            counters['files_below_min_size'] += result['below_min_size']
+            counters['files_opened'] += result['bytes_read'] is not None
+            counters['bytes_read'] += result['bytes_read'] or 0
+            self.match_seconds += result['match_seconds']
+            reason = result['limited']
+            if reason is not None:
+                self.limited[reason] = self.limited.get(reason, 0) + 1
+                if len(self.limited_files) < STATS_MAX_LIMITED_FILES:
+                    self.limited_files.append({'path': str(result['path']), 'reason': reason})
+    
+    def as_dict(self):
+        """Return the statistics as a JSON-serializable dict."""
+        return {
+            'wall_seconds': round(time.perf_counter() - self._started, 6),
+            'phases': {name: round(seconds, 6) for name, seconds in self.phases.items()},
+            'keyword_match_seconds': round(self.match_seconds, 6),
+            'counters': dict(self.counters),
+            'eliminated': dict(self.eliminated),
+            'skipped': {reason: count for reason, count in self.limited.items()
+                        if reason == 'binary'},
+            'truncated': {reason: count for reason, count in self.limited.items()
+                          if reason != 'binary'},
+            'limited_files': list(self.limited_files),
+            'cache': dict(self.cache)
+        }
+    
+    def dump_profile(self, path):
+        """Write the scan loop profile in pstats format."""
+        if self.profiler is not None:
+            self.profiler.dump_stats(path)
+
+
+class ScriptFinder:
+    def __init__(self, cache_dir=None, cache_size_limit=DEFAULT_CACHE_SIZE_LIMIT):
+        self.cache = CacheManager(cache_dir, cache_size_limit)
+        self.cache_dir = self.cache.cache_dir
+        # Statistics of the most recent search
+        self.stats = SearchStats()
+    
+    def _list_directory(self, directory, extension_set):
+        """
+        List a single directory.
+        
+        Returns a record holding the directory mtime, the names of files with a
+        matching extension and the names of subdirectories to descend into. The
+        mtime is left as None when it cannot be trusted for later revalidation.
+        """
+        try:
+            mtime = os.stat(directory).st_mtime
+        except OSError:
+            return {'mtime': None, 'files': [], 'subdirs': []}
+        
+        files = []
+        subdirs = []
+        pruned = 0
+        other_files = 0
+        try:
+            with os.scandir(directory) as entries:
+                for entry in entries:
+                    try:
+                        is_dir = entry.is_dir()
+                    except OSError:
+                        is_dir = False
+                    if is_dir:
+                        # Like os.walk, symlinked directories are not followed
+                        if entry.is_symlink():
+                            continue
+                        if self._should_skip_directory(entry.name):
+                            pruned += 1
+                        else:
+                            subdirs.append(entry.name)
+                    elif os.path.splitext(entry.name)[1].lower() in extension_set:
+                        files.append(entry.name)
+                    else:
+                        other_files += 1
+        except OSError:
+            mtime = None
+        
+        # A directory modified within the mtime granularity of the listing could
+        # change again without its mtime moving, so force a relist next time
+        if mtime is not None and time.time() - mtime < RACY_MTIME_SECONDS:
+            mtime = None
+        
+        self.stats.add(dirs_stat=1, dirs_listed=1, dirs_pruned=pruned)
+        self.stats.eliminate('extension', other_files)
+        return {'mtime': mtime, 'files': files, 'subdirs': subdirs}
+    
+    def _visit_directory(self, root, rel_dir, extension_set, cached_dirs, trusted=None):
+        """
+        Produce the record for one directory of a walk.
+        
+        The cached record is kept when the directory mtime is unchanged (or,
+        without a stat, when trusted says the directory is known not to have
+        changed), otherwise the directory is listed again.
+        
+        Returns:
+            tuple: (record, relisted) or None if the directory no longer exists
+        """
+        current = os.path.join(root, rel_dir) if rel_dir else root
+        record = cached_dirs.get(rel_dir)
+        
+        if record is not None and record['mtime'] is not None and trusted is not None \
+                and trusted(rel_dir):
+            return record, False
+        
+        if record is not None and record['mtime'] is not None:
+            self.stats.add(dirs_stat=1)
+            try:
+                if os.stat(current).st_mtime == record['mtime']:
+                    return record, False
+            except OSError:
+                # Directory no longer exists
+                return None
+        
+        return self._list_directory(current, extension_set), True
+    
+    def _iter_walk(self, directory, extension_set, cached_dirs=None, verbose=False, jobs=1,
+                   trusted=None, path_glob=None, ignore=None):
+        """
+        Walk a directory tree, reusing cached directory records where possible.
+        
+        Directories whose mtime matches the cached record keep their cached
+        listing, so revalidating an existing cache costs one stat per directory.
+        Only directories that changed (or are new) are listed again.
+        
+        A single-threaded walk is lazy: each directory is visited only when the
+        caller asks for the next record, so closing the generator stops the walk.
+        With more than one job, sibling subtrees are walked concurrently by a
+        TreeWalker and the records are yielded once the walk completes.
+        
+        Args:
+            trusted (callable): Optional predicate on relative directory paths;
+                cached records of trusted directories are reused without a stat
+            path_glob (PathGlob): Only descend into directories that can hold
+                files matching it
+            ignore (IgnoreMatcher): Do not descend into ignored directories
+            
+        Yields:
+            tuple: (directory path relative to the root ('' for the root), record),
+                   in top-down walk order
+        """
+        if cached_dirs is None:
+            cached_dirs = {}
+        
+        root = str(directory)
+        dir_records = {}
+        progress = {'files': 0, 'relisted': 0}
+        progress_lock = threading.Lock()
+        
+        def visit(rel_dir):
+            visited = self._visit_directory(root, rel_dir, extension_set, cached_dirs, trusted)
+            if visited is None:
+                return []
+            record, relisted = visited
+            dir_records[rel_dir] = record
+            self.stats.add(dirs_visited=1)
+            with progress_lock:
+                progress['relisted'] += relisted
+                if verbose and record['files']:
+                    previous = progress['files']
+                    progress['files'] += len(record['files'])
+                    if progress['files'] // 100 > previous // 100:
+                        print(f"   Found {progress['files']} files so far...")
+            children = [os.path.join(rel_dir, d) for d in record['subdirs']]
+            if path_glob is not None:
+                kept = [child for child in children if path_glob.may_contain(child)]
+                self.stats.add(dirs_pruned=len(children) - len(kept))
+                children = kept
+            if ignore is not None:
+                kept = [child for child in children if not ignore.ignores_dir(child)]
+                ignored = len(children) - len(kept)
+                self.stats.add(dirs_pruned=ignored, dirs_ignored=ignored)
+                children = kept
+            return children
+        
+        if jobs > 1:
+            TreeWalker(visit, jobs).run('')
+            yield from self._ordered_records(dir_records).items()
+        else:
+            stack = ['']
+            while stack:
+                rel_dir = stack.pop()
+                children = visit(rel_dir)
+                if rel_dir in dir_records:
+                    yield rel_dir, dir_records[rel_dir]
+                stack.extend(reversed(children))
+        
+        if verbose and cached_dirs:
+            print(f"   Revalidated {len(dir_records)} directories, "
+                  f"re-listed {progress['relisted']} changed")
+    
+    def _ordered_records(self, dir_records):
+        """Reorder directory records into top-down walk order."""
+        ordered = {}
+        stack = ['']
+        while stack:
+            rel_dir = stack.pop()
+            record = dir_records.get(rel_dir)
+            if record is None:
+                continue
+            ordered[rel_dir] = record
+            stack.extend(os.path.join(rel_dir, d) for d in reversed(record['subdirs']))
+        return ordered
+    
+    def gather_files(self, directory, extensions, use_cache=True, verbose=False,
+                     max_age_hours=24, refresh=False, jobs=1, stats=None, path_globs=None,
+                     gitignore=False):
+        """
+        Gather all files with specified extensions, with optional caching.
+        
+        Args:
+            directory (str): Directory to search
+            extensions (list): File extensions to include
+            use_cache (bool): Whether to use cached results
+            verbose (bool): Whether to print progress
+            max_age_hours (float): Age after which the cache is revalidated
+            refresh (bool): Whether to revalidate the cache regardless of age
+            jobs (int): Number of threads walking the directory tree
+            stats (SearchStats): Collector for timings and counters (a fresh one
+                is created when omitted); also available as self.stats
+            path_globs (list): Only include files whose path relative to the
+                directory matches one of these globs (see PathGlob)
+            gitignore (bool): Leave out files and subtrees ignored by the
+                .gitignore files, .git/info/exclude files and the user's
+                global ignore file (see IgnoreMatcher)
+            
+        Returns:
+            list: List of file paths
+        """
+        return list(self.iter_files(directory, extensions, use_cache, verbose,
+                                    max_age_hours, refresh, jobs, stats, path_globs,
+                                    gitignore))
+    
+    def iter_files(self, directory, extensions, use_cache=True, verbose=False,
+                   max_age_hours=24, refresh=False, jobs=1, stats=None, path_globs=None,
+                   gitignore=False):
+        """
+        Yield all files with specified extensions, with optional caching.
+        
+        A cache younger than max_age_hours is used as-is. An older cache (or any
+        cache when refresh is set) is revalidated incrementally using the stored
+        directory mtimes instead of being discarded.
+        
+        Files found by a walk are yielded as each directory is listed. The cache
+        is only written once the walk has completed, so closing the generator
+        early leaves the previous cache in place.
+        
+        With path_globs, subtrees no glob can match are not walked (or, from a
+        cache, not decoded), and likewise for ignored subtrees with gitignore.
+        Such a partial walk is never written to the cache.
+        
+        Args:
+            See gather_files.
+            
+        Yields:
+            Path: File paths
+        """
+        self.stats = stats = stats if stats is not None else SearchStats()
+        extension_set = {ext.lower() for ext in extensions}
+        path_glob = PathGlob(path_globs) if path_globs else None
+        ignore = IgnoreMatcher(directory) if gitignore else None
+        cached_dirs = None
+        
+        # Try to read from this cache or any cache covering it
+        if use_cache:
+            stats.enter('cache_load')
+            try:
+                cached, cache_age = self.cache.lookup(directory, extensions)
+            finally:
+                stats.exit()
+            stats.cache['status'] = 'miss'
+            if cached is not None:
+                stats.cache.update(source=str(cached.source), age_hours=round(cache_age, 3))
+                if cache_age <= max_age_hours and not refresh:
+                    stats.cache['status'] = 'hit'
+                    if verbose:
+                        print(f"📁 Using cached file list from {cached.source}")
+                    try:
+                        yield from stats.timed('file_list', self._iter_files_from_records(
+                            directory, cached, path_glob, ignore))
+                    finally:
+                        cached.close()
+                    return
+                stats.cache['status'] = 'revalidated'
+                cached_dirs = cached
+        
+        if verbose:
+            if cached_dirs is not None:
+                print(f"🔄 Revalidating cached file list for: {directory}")
+            else:
+                print(f"🔍 Gathering files from: {directory}")
+            print(f"   Extensions: {', '.join(extensions)}")
+        
+        root = Path(directory)
+        dir_records = {}
+        file_count = 0
+        walk = stats.timed('walk', self._iter_walk(directory, extension_set, cached_dirs,
+                                                   verbose, jobs, path_glob=path_glob,
+                                                   ignore=ignore))
+        for rel_dir, record in walk:
+            dir_records[rel_dir] = record
+            file_count += len(record['files'])
+            stats.add(files_listed=len(record['files']))
+            dir_path = root / rel_dir
+            for name in record['files']:
+                if path_glob is not None and not path_glob.matches(rel_dir, name):
+                    stats.eliminate('path')
+                    continue
+                if ignore is not None and ignore.ignores_file(rel_dir, name):
+                    stats.add(files_ignored=1)
+                    stats.eliminate('path')
+                    continue
+                yield dir_path / name
+        
+        if use_cache and path_glob is None and ignore is None:
+            stats.enter('cache_write')
+            try:
+                self.cache.store(directory, extensions, dir_records, previous=cached_dirs)
+            finally:
+                stats.exit()
+            if verbose:
+                print(f"💾 Cached {file_count} files for future searches")
+        elif cached_dirs is not None:
+            cached_dirs.close()
+    
+    def _iter_files_from_records(self, directory, dir_records, path_glob=None, ignore=None):
+        """Yield the file paths held in directory records, decoding one directory at a time."""
+        root = Path(directory)
+        for rel_dir, record in dir_records.items():
+            if path_glob is not None and not path_glob.may_contain(rel_dir):
+                continue
+            if ignore is not None and ignore.ignores_dir(rel_dir):
+                continue
+            dir_path = root / rel_dir
+            self.stats.add(dirs_visited=1, files_listed=len(record['files']))
+            for name in record['files']:
+                if path_glob is not None and not path_glob.matches(rel_dir, name):
+                    self.stats.eliminate('path')
+                    continue
+                if ignore is not None and ignore.ignores_file(rel_dir, name):
+                    self.stats.add(files_ignored=1)
+                    self.stats.eliminate('path')
+                    continue
+                yield dir_path / name
+    
+    def _normalize_roots(self, directories, gitignore=False):
+        """
+        Drop duplicate search roots and roots the walk of another root covers.
+        
+        Roots are compared by their resolved real paths. A root nested inside
+        another is dropped unless the walk of the outer root would skip it
+        (for example a root inside node_modules, or with gitignore one inside
+        an ignored directory), in which case both are kept and any files they
+        share are deduplicated while searching.
+        
+        Returns:
+            list: The remaining roots as given, in their original order
+        """
+        resolved = {}
+        for directory in directories:
+            resolved.setdefault(os.path.realpath(directory), directory)
+        
+        roots = []
+        for real_root, directory in resolved.items():
+            covered = False
+            for other in resolved:
+                if other == real_root or not real_root.startswith(os.path.join(other, '')):
+                    continue
+                rel_path = os.path.relpath(real_root, other)
+                if any(self._should_skip_directory(part) for part in rel_path.split(os.sep)):
+                    continue
+                if gitignore and IgnoreMatcher(other).ignores_dir(rel_path):
+                    continue
+                covered = True
+                break
+            if not covered:
+                roots.append(directory)
+        return roots
+    
+    def _iter_root_files(self, roots, extensions, use_cache=True, verbose=False, refresh=False,
+                         jobs=1, stats=None, path_globs=None, gitignore=False):
+        """
+        Yield the files under several roots, walking each root in its own thread.
+        
+        Files are handed over in batches through a bounded queue, so a slow
+        consumer holds the walks back rather than buffering every path. Each
+        walker stats its files and skips any file already yielded from another
+        root (same device and inode, e.g. reached through a symlink or hard
+        link), so every physical file is yielded at most once. Files from
+        different roots are interleaved in no particular order.
+        
+        Args:
+            roots (list): Roots to walk (see _normalize_roots)
+            See gather_files for the remaining arguments.
+        """
+        batches = queue.Queue(maxsize=len(roots) * ROOT_QUEUE_DEPTH)
+        stop = threading.Event()
+        seen = set()
+        seen_lock = threading.Lock()
+        
+        def put(item):
+            while not stop.is_set():
+                try:
+                    batches.put(item, timeout=0.1)
+                    return True
+                except queue.Full:
+                    continue
+            return False
+        
+        def walk_root(root):
+            files = self.iter_files(root, extensions, use_cache, verbose, refresh=refresh,
+                                    jobs=jobs, stats=stats, path_globs=path_globs,
+                                    gitignore=gitignore)
+            batch = []
+            try:
+                for file_path in files:
+                    try:
+                        stat_result = os.stat(file_path)
+                    except OSError:
+                        stat_result = None
+                    if stat_result is not None:
+                        key = (stat_result.st_dev, stat_result.st_ino)
+                        with seen_lock:
+                            duplicate = key in seen
+                            seen.add(key)
+                        if duplicate:
+                            stats.add(files_duplicate=1)
+                            continue
+                    batch.append(file_path)
+                    if len(batch) >= ROOT_BATCH_SIZE:
+                        if not put(batch):
+                            return
+                        batch = []
+                if batch:
+                    put(batch)
+            except Exception as e:
+                put(e)
+            finally:
+                files.close()
+                put(None)
+        
+        threads = [threading.Thread(target=walk_root, args=(root,), daemon=True)
+                   for root in roots]
+        for thread in threads:
+            thread.start()
+        
+        finished = 0
+        try:
+            while finished < len(threads):
+                item = batches.get()
+                if item is None:
+                    finished += 1
+                elif isinstance(item, Exception):
+                    raise item
+                else:
+                    yield from item
+        finally:
+            stop.set()
+            for thread in threads:
+                thread.join()
+    
+    def _should_skip_directory(self, dir_name):
+        """Check if a directory should be skipped during search."""
+        return dir_name in SKIP_DIRS or dir_name.startswith('.')
+    
+    def find_script(self, directory, extensions=None, min_lines=300, 
+                   content_keywords=None, use_cache=True, verbose=False, refresh=False,
+                   use_trigram_index=False, jobs=1, pool='thread', limit=None, stats=None,
+                   top=None, context_lines=None, path_globs=None, budget=None,
+                   gitignore=False, stat_filter=None, archives=False):
+        """
+        Find scripts based on file size, line count, and content keywords.
+        
+        Args:
+            directory (str or list): Root directory to search, or a list of
+                roots; nested and duplicate roots are collapsed, the roots are
+                walked concurrently and each physical file is scanned once
+            extensions (list): File extensions to search for (default: ['.py'])
+            min_lines (int): Minimum number of lines required
+            content_keywords (list): Keywords to search for in file content;
+                keywords starting with 're:' are case-insensitive regexes
+            use_cache (bool): Whether to use cached file lists
+            verbose (bool): Whether to print detailed progress
+            refresh (bool): Whether to revalidate cached file lists regardless of age
+            use_trigram_index (bool): Whether to narrow keyword checks to the
+                candidates found in the on-disk trigram index (requires use_cache)
+            jobs (int): Number of parallel workers used to walk the tree and
+                scan file contents
+            pool (str): Worker pool type, 'thread' or 'process'
+            limit (int): Stop once this many matches have been found
+            stats (SearchStats): Collector for phase timings and I/O counters (a
+                fresh one is created when omitted); also available as self.stats
+            top (int): Rank matches by BM25 keyword relevance and return only
+                this many, best first, with their score and keyword counts
+            context_lines (int): Record a snippet for the first hit of each
+                keyword with this many lines of context, captured during the
+                scan (None to record no snippets)
+            path_globs (list): Only search files whose path relative to the
+                directory matches one of these globs, e.g. '**/train_*.py'
+            budget (ReadBudget): Per-file limits on bytes, lines and seconds
+                spent reading, and whether binary files are skipped; files
+                cut short are searched only as far as they were read
+            gitignore (bool): Skip files and prune subtrees ignored by the
+                .gitignore and exclude files of the trees searched
+            stat_filter (StatFilter): Size and mtime predicates, checked from
+                each file's stat data before it is opened
+            archives (bool): Also search the members of zip, wheel, egg and tar
+                archives found during the walk, read in place (see scan_archive);
+                path globs and ignore files apply to the archives themselves
+            
+        Returns:
+            list: Match records
+        """
+        return list(self.iter_matches(directory, extensions, min_lines, content_keywords,
+                                      use_cache, verbose, refresh, use_trigram_index,
+                                      jobs, pool, limit, stats, top, context_lines,
+                                      path_globs, budget, gitignore, stat_filter, archives))
+    
+    def iter_matches(self, directory, extensions=None, min_lines=300,
+                     content_keywords=None, use_cache=True, verbose=False, refresh=False,
+                     use_trigram_index=False, jobs=1, pool='thread', limit=None, stats=None,
+                     top=None, context_lines=None, path_globs=None, budget=None,
+                     gitignore=False, stat_filter=None, archives=False):
+        """
+        Yield match records as soon as each one is confirmed.
+        
+        Files are scanned while the walk is still producing them, so the first
+        results arrive long before a large tree has been fully walked. Once
+        limit matches have been yielded (or the caller stops iterating) both the
+        walk and the scan stop. With top, the whole tree is scanned first and
+        the best matches are yielded in score order.
+        
+        Files are ruled out at the cheapest stage that settles them: extension
+        and path while walking, then size and mtime from a stat (a file of n
+        lines has at least n bytes, so min_lines is checked here too), then
+        the line count from the index or a streamed read, and keywords last.
+        
+        With archives, the archives found during the walk are set aside and
+        their members searched once the plain files have been scanned.
+        
+        Args:
+            See find_script.
+            
+        Yields:
+            dict: Match record with the path, line count, matched keywords and size
+        """
+        if extensions is None:
+            extensions = ['.py']
+        if content_keywords is None:
+            content_keywords = ['lora', 'LoRA', 'model', 'tag']
+        
+        directories = [directory] if isinstance(directory, (str, os.PathLike)) else list(directory)
+        roots = self._normalize_roots(directories, gitignore)
+        
+        if verbose:
+            print(f"Search criteria:")
+            print(f"  Directory: {', '.join(str(root) for root in roots)}")
+            print(f"  Extensions: {extensions}")
+            print(f"  Minimum lines: {min_lines}")
+            print(f"  Content keywords: {content_keywords}")
+            if path_globs:
+                print(f"  Path globs: {path_globs}")
+            if gitignore:
+                print(f"  Respecting .gitignore files")
+            if archives:
+                print(f"  Searching inside archives")
+            print(f"  Use cache: {use_cache}")
+            if jobs > 1:
+                print(f"  Jobs: {jobs} ({pool} pool)")
+            # A file of n lines has at least n bytes
+            plan_filter = stat_filter if stat_filter is not None else StatFilter()
+            plan_filter = plan_filter._replace(min_size=max(plan_filter.min_size, min_lines))
+            print(f"  Plan: extension -> path -> stat ({plan_filter.describe() or 'no bounds'}) "
+                  f"-> lines -> keywords")
+            print("-" * 50)
+        
+        self.stats = stats = stats if stats is not None else SearchStats()
+        
+        # Gather files (with caching), listing archives alongside them
+        walk_extensions = list(extensions)
+        if archives:
+            walk_extensions += [ext for ext in ARCHIVE_EXTENSIONS if ext not in walk_extensions]
+        
+        def walk(walk_stats, verbose=verbose, refresh=refresh):
+            if len(roots) == 1:
+                return self.iter_files(roots[0], walk_extensions, use_cache, verbose,
+                                       refresh=refresh, jobs=jobs, stats=walk_stats,
+                                       path_globs=path_globs, gitignore=gitignore)
+            return self._iter_root_files(roots, walk_extensions, use_cache, verbose,
+                                         refresh=refresh, jobs=jobs, stats=walk_stats,
+                                         path_globs=path_globs, gitignore=gitignore)
+        
+        def rewalk():
+            # Walks the same files again, quietly and from the list just cached,
+            # leaving out the archives already set aside
+            extension_set = {ext.lower() for ext in extensions}
+            for file_path in walk(SearchStats(), verbose=False, refresh=False):
+                if file_path.suffix.lower() in extension_set and \
+                        archive_kind(file_path.name) is None:
+                    yield file_path
+        
+        file_iter = walk(stats)
+        all_files = file_iter
+        archive_paths = None
+        if archives:
+            archive_paths = []
+            all_files = self._set_aside_archives(all_files, extensions, archive_paths)
+        
+        # The trigram index needs the full file list up front
+        if use_trigram_index and use_cache:
+            all_files = list(all_files)
+            if verbose:
+                print(f"📁 Total files to check: {len(all_files)}")
+            all_files = self._trigram_candidates(roots, all_files, content_keywords, verbose,
+                                                 budget)
+        
+        stats.enter('file_index_load')
+        try:
+            file_index = FileIndex(self.cache_dir / FILE_INDEX_NAME) if use_cache else None
+            known = {}
+            if file_index is not None:
+                for root in roots:
+                    known.update(file_index.load(root))
+        finally:
+            stats.exit()
+        
+        try:
+            if top is not None:
+                yield from self._rank_matches(all_files, known, file_index, min_lines,
+                                              content_keywords, top, verbose, jobs, pool,
+                                              context_lines, budget, stat_filter,
+                                              archive_paths, extensions,
+                                              None if isinstance(all_files, list) else rewalk)
+            else:
+                yield from self._scan_matches(all_files, known, file_index, min_lines,
+                                              content_keywords, verbose, jobs, pool, limit,
+                                              context_lines, budget, stat_filter,
+                                              archive_paths, extensions)
+        finally:
+            file_iter.close()
+            if file_index is not None:
+                file_index.close()
+    
+    def _scan_matches(self, files, known, file_index, min_lines, content_keywords,
+                      verbose=False, jobs=1, pool='thread', limit=None, context_lines=None,
+                      budget=None, stat_filter=None, archive_paths=None, extensions=None):
+        """
+        Scan files and yield match records.
+        
+        Args:
+            files (iterable): File paths to scan
+            known (dict): File index entries by absolute path; entries for
+                freshly scanned files are updated in place
+            file_index (FileIndex): Index to record scanned files in, or None
+            archive_paths (list): Archives set aside during the walk (filled
+                in while files are consumed), whose members with one of the
+                extensions are scanned after the files; None for no archives
+            See find_script for the remaining arguments.
+        """
+        key = scan_key(content_keywords, False, context_lines, budget)
+        tasks = self._scan_tasks(files, known, file_index, key)
+        results = self.stats.timed('scan', self._scan_results(
+            tasks, min_lines, content_keywords, jobs, pool, context_lines=context_lines,
+            budget=budget, stat_filter=stat_filter))
+        if archive_paths is not None:
+            results = self._with_archive_results(
+                results, archive_paths, file_index, extensions, min_lines, content_keywords,
+                verbose, jobs, pool, context_lines=context_lines, budget=budget,
+                stat_filter=stat_filter)
+        try:
+            yield from self._matches_from_results(results, file_index, known, min_lines,
+                                                  verbose, limit, key)
+        finally:
+            results.close()
+    
+    def _rank_matches(self, files, known, file_index, min_lines, content_keywords, top,
+                      verbose=False, jobs=1, pool='thread', context_lines=None, budget=None,
+                      stat_filter=None, archive_paths=None, extensions=None, rewalk=None):
+        """
+        Scan files and return the top matches by keyword relevance, best first.
+        
+        The files are gone through twice. The first pass only sums up the
+        collection statistics (see RelevanceRanker), taking sizes from the file
+        index where it has them and from a stat otherwise; the second scans
+        them. Matches that can no longer reach the top are dropped while
+        scanning, and files too small to reach it are skipped without being
+        read, so memory stays proportional to top rather than to the tree.
+        
+        Args:
+            files (iterable): File paths; a list is simply gone through twice,
+                any other iterable is consumed by the first pass
+            rewalk (callable): Returns the files again for the second pass,
+                when files is not a list
+            See _scan_matches for the remaining arguments.
+        """
+        ranker = RelevanceRanker(content_keywords, top)
+        file_count = total_size = expected = 0
+        self.stats.enter('collection')
+        try:
+            for file_path in files:
+                expected += 1
+                entry = known.get(os.path.abspath(file_path))
+                if entry is not None:
+                    size = entry[0]
+                else:
+                    try:
+                        size = os.stat(file_path).st_size
+                    except OSError:
+                        continue
+                file_count += 1
+                total_size += size
+        finally:
+            self.stats.exit()
+        # Archive members are only known as the archives are scanned
+        if not archive_paths:
+            ranker.set_collection(file_count, total_size, expected)
+        if rewalk is not None:
+            files = rewalk()
+        key = scan_key(content_keywords, True, context_lines, budget)
+        tasks = self._scan_tasks(files, known, file_index, key)
+        results = self.stats.timed('scan', self._scan_results(
+            tasks, min_lines, content_keywords, jobs, pool, count_keywords=True,
+            min_size=ranker.min_size, context_lines=context_lines, budget=budget,
+            stat_filter=stat_filter))
+        if archive_paths is not None:
+            results = self._with_archive_results(
+                results, archive_paths, file_index, extensions, min_lines, content_keywords,
+                verbose, jobs, pool, count_keywords=True, context_lines=context_lines,
+                budget=budget, stat_filter=stat_filter)
+        try:
+            for match in self._matches_from_results(ranker.observe(results), file_index,
+                                                    known, min_lines, verbose, scan_key=key):
+                ranker.push(match)
+        finally:
+            results.close()
+            if rewalk is not None:
+                files.close()
+        return ranker.ranked()
+    
+    def _scan_tasks(self, files, known, file_index, key):
+        """
+        Pair each file with what is known about its content, for scan_file.
+        
+        Files missing from the file index fall back to the blob ids of their
+        git index entries, and the cached scan result of the fingerprint is
+        looked up; scan_file only uses either if the file's stat signature
+        still matches.
+        
+        Yields:
+            tuple: (file path, file index entry or None, cached scan or None)
+        """
+        git_blobs = GitBlobIndex() if file_index is not None else None
+        for file_path in files:
+            entry = known.get(os.path.abspath(file_path))
+            if entry is None and git_blobs is not None:
+                entry = git_blobs.entry(file_path)
+                if entry is not None:
+                    entry = (*entry[:3], file_index.blob_line_count(entry[4]), entry[4])
+            cached = None
+            if entry is not None and file_index is not None:
+                cached = file_index.cached_scan(entry[4], key)
+            yield file_path, entry, cached
+    
+    def _matches_from_results(self, results, file_index, known, min_lines, verbose=False,
+                              limit=None, scan_key=None):
+        """Turn scan results into match records, recording them in the file index."""
+        match_count = 0
+        for result in results:
+            file_path = result['path']
+            line_count = result['line_count']
+            self.stats.record_scan(result)
+            
+            if result['error'] is not None:
+                if verbose:
+                    print(f"❌ Error reading {file_path}: {result['error']}")
+                continue
+            
+            if result['rejected_by_stat']:
+                self.stats.eliminate('stat')
+                if verbose:
+                    print(f"⏩ Skipping {file_path.name} - ruled out by its size or mtime "
+                          f"({result['stat'].st_size} bytes)")
+                continue
+            
+            if result['below_min_size']:
+                if verbose:
+                    print(f"⏩ Skipping {file_path.name} - too small to rank in the top results")
+                continue
+            
+            if result['limited'] == 'binary':
+                if verbose:
+                    print(f"⏩ Skipping {file_path.name} - binary file")
+                continue
+            if result['limited'] is not None and verbose:
+                print(f"✂️  Truncated {file_path.name} - {result['limited'].replace('_', ' ')} "
+                      f"budget reached after {line_count} lines")
+            
+            if file_index is not None and result['fingerprint'] is not None:
+                indexed_path = os.path.abspath(file_path)
+                if not result['cached'] or indexed_path not in known:
+                    entry = file_index.update(indexed_path, result['stat'],
+                                              line_count, result['fingerprint'])
+                    if entry is not None:
+                        known[indexed_path] = entry
+                # Matches are only filled in above min_lines, so only those
+                # results hold for any threshold
+                if scan_key is not None and not result['cached'] and line_count >= min_lines:
+                    file_index.record_scan(scan_key, result)
+            
+            if line_count < min_lines:
+                self.stats.eliminate('lines')
+                if verbose:
+                    indexed = ", indexed" if result['indexed'] else ""
+                    print(f"⏩ Skipping {file_path.name} - {line_count} lines (< {min_lines}{indexed})")
+                continue
+            
+            keyword_matches = result['matched_keywords']
+            if keyword_matches:
+                match_info = {
+                    'path': file_path,
+                    'line_count': line_count,
+                    'lines_exact': result['lines_exact'],
+                    'matched_keywords': keyword_matches,
+                    'size': result['stat'].st_size,
+                    'size_kb': round(result['stat'].st_size / 1024, 2)
+                }
+                if result['keyword_counts'] is not None:
+                    match_info['keyword_counts'] = result['keyword_counts']
+                if result['snippets'] is not None:
+                    match_info['snippets'] = result['snippets']
+                match_count += 1
+                self.stats.add(matches=1)
+                
+                if verbose:
+                    print(f"✅ Match: {file_path}")
+                    print(f"     Lines: {format_line_count(match_info)}, Size: {match_info['size_kb']}KB")
+                    print(f"     Keywords: {', '.join(keyword_matches)}")
+                
+                yield match_info
+                if limit is not None and match_count >= limit:
+                    return
+            else:
+                self.stats.eliminate('keywords')
+                if verbose:
+                    print(f"⏩ Skipping {file_path.name} - no keyword matches")
+    
+    def _scan_results(self, tasks, min_lines, content_keywords, jobs=1, pool='thread',
+                      count_keywords=False, min_size=None, context_lines=None, budget=None,
+                      stat_filter=None):
+        """
+        Scan files, yielding results in the same order as the tasks.
+        
+        With more than one job the scans are fanned out to a thread pool (suited
+        to I/O-bound trees) or a process pool (suited to CPU-bound matching).
+        At most a few scans per worker are in flight at any time, so memory
+        stays bounded however many files there are, and all results are
+        consumed (and printed) from the calling thread.
+        
+        min_size, if given, is called as each scan is started and returns the
+        size below which the file is skipped unopened.
+        """
+        if min_size is None:
+            min_size = lambda: 0
+        
+        if jobs <= 1:
+            for file_path, entry, cached in tasks:
+                yield scan_file(file_path, min_lines, content_keywords, entry,
+                                count_keywords, min_size(), context_lines, budget,
+                                cached, stat_filter)
+            return
+        
+        executor_class = ProcessPoolExecutor if pool == 'process' else ThreadPoolExecutor
+        max_pending = jobs * SCAN_QUEUE_DEPTH
+        pending = deque()
+        
+        with executor_class(max_workers=jobs) as executor:
+            for file_path, entry, cached in tasks:
+                pending.append(executor.submit(scan_file, file_path, min_lines,
+                                               content_keywords, entry, count_keywords,
+                                               min_size(), context_lines, budget,
+                                               cached, stat_filter))
+                if len(pending) >= max_pending:
+                    yield pending.popleft().result()
+            while pending:
+                yield pending.popleft().result()
+    
+    def _set_aside_archives(self, files, extensions, archive_paths):
+        """
+        Yield the files with one of the extensions, appending archives to archive_paths.
+        
+        Files listed only because the walk also looked for archive extensions
+        (a .gz that is not a tarball, say) are dropped.
+        """
+        extension_set = {ext.lower() for ext in extensions}
+        for file_path in files:
+            if archive_kind(file_path.name) is not None:
+                archive_paths.append(file_path)
+            elif file_path.suffix.lower() in extension_set:
+                yield file_path
+            else:
+                self.stats.eliminate('extension')
+    
+    def _with_archive_results(self, results, archive_paths, file_index, extensions, min_lines,
+                              content_keywords, verbose=False, jobs=1, pool='thread',
+                              count_keywords=False, context_lines=None, budget=None,
+                              stat_filter=None):
+        """
+        Yield the file scan results, then the results of the archive members.
+        
+        Archives are scanned with jobs workers, one archive per task (see
+        scan_archive). Member listings are looked up in the file index by the
+        archive's size and mtime, so an archive none of whose members can
+        match is not opened at all, and fresh listings are recorded there.
+        """
+        try:
+            yield from results
+        finally:
+            results.close()
+        
+        extension_set = {ext.lower() for ext in extensions}
+        
+        def tasks():
+            for archive_path in archive_paths:
+                listing = None
+                if file_index is not None:
+                    try:
+                        listing = file_index.archive_listing(os.path.abspath(archive_path),
+                                                             os.stat(archive_path))
+                    except OSError:
+                        pass
+                if listing is not None:
+                    self.stats.add(archive_listings_cached=1)
+                    rejected = [member_rejection(member, extension_set, min_lines, stat_filter)
+                                for member in listing]
+                    if None not in rejected:
+                        for stage in rejected:
+                            self.stats.eliminate(stage)
+                        continue
+                yield (archive_path, listing, extension_set, min_lines, content_keywords,
+                       count_keywords, context_lines, budget, stat_filter)
+        
+        outcomes = self.stats.timed('archive_scan', ordered_map(scan_archive, tasks(), jobs, pool))
+        try:
+            for outcome in outcomes:
+                archive_path = outcome['path']
+                self.stats.add(archives_opened=1)
+                for stage, count in outcome['eliminated'].items():
+                    self.stats.eliminate(stage, count)
+                if outcome['error'] is not None:
+                    if verbose:
+                        print(f"❌ Error reading archive {archive_path}: {outcome['error']}")
+                    continue
+                if file_index is not None and outcome['fresh']:
+                    file_index.record_archive(os.path.abspath(archive_path), outcome['stat'],
+                                              outcome['listing'])
+                if verbose:
+                    print(f"📦 {archive_path}: {len(outcome['listing'])} members, "
+                          f"{len(outcome['results'])} scanned")
+                yield from outcome['results']
+        finally:
+            outcomes.close()
+    
+    def find_names(self, directory, pattern, extensions=None, verbose=False, refresh=False,
+                   jobs=1, limit=NAME_RESULT_LIMIT, stats=None, path_globs=None):
+        """
+        Find files by name from the cached file lists, without walking the tree.
+        
+        Basenames are matched case-insensitively as substrings or, failing
+        that, as subsequences, through the basename index of the cached list
+        covering each root (see CacheManager.name_index and NameIndex). A warm
+        query reads only the index, never the tree or any file contents. A
+        root without a cached list is walked once to create one, and refresh
+        revalidates the cached list first; otherwise the list is used however
+        old it is.
+        
+        Args:
+            pattern (str): Text to look for in basenames
+            limit (int): Return at most this many files (None for all)
+            See find_script for the remaining arguments.
+            
+        Returns:
+            list: Match records with the path, the kind of match ('exact',
+                  'prefix', 'substring' or 'fuzzy') and its score, best first
+        """
+        if extensions is None:
+            extensions = ['.py']
+        extension_set = {ext.lower() for ext in extensions}
+        directories = [directory] if isinstance(directory, (str, os.PathLike)) else list(directory)
+        self.stats = stats = stats if stats is not None else SearchStats()
+        path_glob = PathGlob(path_globs) if path_globs else None
+        
+        matches = []
+        for root in self._normalize_roots(directories):
+            if refresh:
+                self.gather_files(root, extensions, verbose=verbose, refresh=True, jobs=jobs,
+                                  stats=stats)
+            found = self._open_name_index(root, extensions)
+            if found[0] is None:
+                if verbose:
+                    print(f"📂 No cached file list covers {root}, walking it once")
+                self.gather_files(root, extensions, verbose=verbose, jobs=jobs, stats=stats)
+                found = self._open_name_index(root, extensions)
+            index, dir_range, index_root, source, cache_age = found
+            if index is None:
+                continue
+            stats.cache.update(status='hit', source=source, age_hours=round(cache_age, 3))
+            if verbose:
+                print(f"🗂️  Name index of {source}: {index.name_count} names in "
+                      f"{len(dir_range)} directories")
+            
+            stats.enter('name_search')
+            try:
+                results = index.search(pattern, extension_set, dir_range,
+                                       None if path_glob is not None else limit)
+            finally:
+                stats.exit()
+                index.close()
+            real_root = os.path.realpath(root)
+            for score, kind, rel_dir, name in results:
+                file_path = Path(index_root, rel_dir, name)
+                if path_glob is not None and \
+                        not path_glob.match_path(os.path.relpath(file_path, real_root)):
+                    continue
+                matches.append({'path': Path(root, os.path.relpath(file_path, real_root)),
+                                'name': name, 'kind': kind, 'score': round(score, 4)})
+        
+        matches.sort(key=lambda match: (-match['score'], str(match['path'])))
+        if limit is not None:
+            matches = matches[:limit]
+        stats.add(matches=len(matches))
+        return matches
+    
+    def _open_name_index(self, root, extensions):
+        """Open the name index covering a root (see CacheManager.name_index), timed."""
+        self.stats.enter('name_index')
+        try:
+            return self.cache.name_index(root, extensions)
+        finally:
+            self.stats.exit()
+    
+    def iter_duplicates(self, directory, extensions=None, use_cache=True, verbose=False,
+                        refresh=False, jobs=1, stats=None, path_globs=None, gitignore=False,
+                        stat_filter=None, limit=None):
+        """
+        Yield groups of files with identical content.
+        
+        The gathered files are narrowed in stages, each cheaper than the next:
+        files are grouped by size and files with a unique size are dropped;
+        the rest are split by a hash of their first and last blocks; and only
+        files that still collide are hashed in full. Files no longer than two
+        blocks are read whole in the second stage, so their groups are final
+        there. Full fingerprints already recorded in the file index or a git
+        index for an unchanged file are used without reading it. Empty files
+        and further links to the same inode are left out.
+        
+        Sizes are grouped once every file has been stat'd; groups are then
+        yielded as soon as they are settled, largest files first, with the
+        hashing spread over jobs threads.
+        
+        Args:
+            limit (int): Stop once this many groups have been yielded
+            See find_script for the remaining arguments.
+            
+        Yields:
+            dict: Group with its number, the file size, the content
+                  fingerprint and the paths of the identical files
+        """
+        if extensions is None:
+            extensions = ['.py']
+        directories = [directory] if isinstance(directory, (str, os.PathLike)) else list(directory)
+        roots = self._normalize_roots(directories, gitignore)
+        self.stats = stats = stats if stats is not None else SearchStats(
+            stages=SearchStats.DUPLICATE_STAGES)
+        
+        if len(roots) == 1:
+            file_iter = self.iter_files(roots[0], extensions, use_cache, verbose,
+                                        refresh=refresh, jobs=jobs, stats=stats,
+                                        path_globs=path_globs, gitignore=gitignore)
+        else:
+            file_iter = self._iter_root_files(roots, extensions, use_cache, verbose,
+                                              refresh=refresh, jobs=jobs, stats=stats,
+                                              path_globs=path_globs, gitignore=gitignore)
+        
+        def stat_file(file_path):
+            try:
+                return file_path, os.stat(file_path)
+            except OSError:
+                return file_path, None
+        
+        # Stage 1: group by size
+        by_size = {}
+        inodes = set()
+        try:
+            stat_results = ordered_map(stat_file, ((file_path,) for file_path in file_iter), jobs)
+            for file_path, stat_result in stats.timed('stat', stat_results):
+                stats.add(files_stat=1)
+                if stat_result is None:
+                    continue
+                if stat_filter is not None and stat_filter.rejects(stat_result):
+                    stats.eliminate('stat')
+                    continue
+                inode = (stat_result.st_dev, stat_result.st_ino)
+                if stat_result.st_size == 0 or inode in inodes:
+                    continue
+                inodes.add(inode)
+                by_size.setdefault(stat_result.st_size, []).append((file_path, stat_result))
+        finally:
+            file_iter.close()
+        
+        buckets = []
+        for size in sorted(by_size, reverse=True):
+            if len(by_size[size]) > 1:
+                buckets.append(by_size[size])
+            else:
+                stats.eliminate('size')
+        if verbose:
+            candidates = sum(len(bucket) for bucket in buckets)
+            print(f"📏 {candidates} files share their size with another file "
+                  f"({len(buckets)} sizes)")
+        
+        known = {}
+        if use_cache:
+            file_index = FileIndex(self.cache_dir / FILE_INDEX_NAME)
+            try:
+                for root in roots:
+                    known.update(file_index.load(root))
+            finally:
+                file_index.close()
+        git_blobs = GitBlobIndex() if use_cache else None
+        
+        def known_fingerprint(file_path, stat_result):
+            entry = known.get(os.path.abspath(file_path))
+            if entry is None and git_blobs is not None:
+                entry = git_blobs.entry(file_path)
+            if entry is not None and FileIndex.signature(stat_result) == entry[:3]:
+                return entry[4]
+            return None
+        
+        group_count = 0
+        
+        def settled(size, file_fingerprint, members):
+            nonlocal group_count
+            group_count += 1
+            stats.add(matches=1)
+            return {
+                'group': group_count,
+                'size': size,
+                'fingerprint': file_fingerprint,
+                'paths': [file_path for file_path, _ in members]
+            }
+        
+        # Stage 2: hash the first and last blocks, bucket by bucket in size order
+        collisions = []
+        tasks = ((file_path, stat_result.st_size) for bucket in buckets
+                 for file_path, stat_result in bucket)
+        digests = stats.timed('partial_hash', ordered_map(partial_digest, tasks, jobs))
+        try:
+            for bucket in buckets:
+                groups = {}
+                for member in bucket:
+                    digest = next(digests)
+                    if digest is None:
+                        continue
+                    is_full, value, bytes_read = digest
+                    stats.add(files_opened=1, bytes_read=bytes_read)
+                    groups.setdefault((is_full, value), []).append(member)
+                size = bucket[0][1].st_size
+                for (is_full, value), members in groups.items():
+                    if len(members) == 1:
+                        stats.eliminate('partial_hash')
+                    elif is_full:
+                        yield settled(size, value, members)
+                        if limit is not None and group_count >= limit:
+                            return
+                    else:
+                        collisions.append(members)
+        finally:
+            digests.close()
+        
+        # Stage 3: hash the remaining collisions in full
+        def fingerprint_task(file_path, stat_result):
+            file_fingerprint = known_fingerprint(file_path, stat_result)
+            if file_fingerprint is not None:
+                return file_fingerprint, 0
+            return content_fingerprint(file_path, stat_result.st_size), stat_result.st_size
+        
+        tasks = (member for members in collisions for member in members)
+        fingerprints = stats.timed('full_hash', ordered_map(fingerprint_task, tasks, jobs))
+        try:
+            for members in collisions:
+                groups = {}
+                for member in members:
+                    file_fingerprint, bytes_read = next(fingerprints)
+                    stats.add(bytes_read=bytes_read)
+                    if file_fingerprint is not None:
+                        groups.setdefault(file_fingerprint, []).append(member)
+                for file_fingerprint, group in groups.items():
+                    if len(group) == 1:
+                        stats.eliminate('full_hash')
+                        continue
+                    yield settled(group[0][1].st_size, file_fingerprint, group)
+                    if limit is not None and group_count >= limit:
+                        return
+        finally:
+            fingerprints.close()
+    
+    def iter_similar(self, similar_to, directory, extensions=None,
+                     threshold=DEFAULT_SIMILARITY, use_cache=True, verbose=False, refresh=False,
+                     jobs=1, pool='thread', stats=None, path_globs=None, gitignore=False,
+                     stat_filter=None, limit=None):
+        """
+        Yield files whose content is similar to a given file.
+        
+        Every gathered file gets a MinHash signature (see minhash_file), and
+        only files that share an LSH band with the given file (see LSHIndex)
+        have their signatures compared with it in full. Signatures are cached
+        by fingerprint in the file index, so unchanged files are not read again.
+        
+        Args:
+            similar_to (str): File to compare the gathered files with
+            threshold (float): Smallest estimated Jaccard similarity of the
+                token shingles reported
+            limit (int): Stop once this many files have been yielded
+            See find_script for the remaining arguments.
+            
+        Yields:
+            dict: Record with the path, size and estimated similarity
+            
+        Raises:
+            ValueError: If the file cannot be read or has no tokens to compare
+        """
+        query = minhash_file(similar_to)
+        if query['error'] is not None:
+            raise ValueError(f"cannot read {similar_to}: {query['error']}")
+        if not query['signature']:
+            raise ValueError(f"{similar_to} has no tokens to compare")
+        query_inode = (query['stat'].st_dev, query['stat'].st_ino)
+        
+        self.stats = stats = stats if stats is not None else SearchStats(
+            stages=SearchStats.SIMILARITY_STAGES)
+        lsh = LSHIndex(threshold)
+        lsh.add(0, query['signature'])
+        if verbose:
+            print(f"🧮 LSH: {lsh.bands} bands of {lsh.rows} rows for a Jaccard threshold "
+                  f"of {threshold}")
+        
+        match_count = 0
+        for result in self._iter_signatures(directory, extensions, use_cache, verbose, refresh,
+                                            jobs, pool, stats, path_globs, gitignore,
+                                            stat_filter):
+            stat_result = result['stat']
+            if (stat_result.st_dev, stat_result.st_ino) == query_inode:
+                continue
+            if not lsh.candidates(result['signature']):
+                stats.eliminate('lsh')
+                continue
+            similarity = signature_similarity(query['signature'], result['signature'])
+            if similarity < threshold:
+                stats.eliminate('similarity')
+                if verbose:
+                    print(f"⏩ Skipping {result['path'].name} - {similarity:.0%} similar")
+                continue
+            match_count += 1
+            stats.add(matches=1)
+            yield {
+                'path': result['path'],
+                'size': stat_result.st_size,
+                'similarity': similarity
+            }
+            if limit is not None and match_count >= limit:
+                return
+    
+    def iter_near_duplicates(self, directory, extensions=None, threshold=DEFAULT_SIMILARITY,
+                             use_cache=True, verbose=False, refresh=False, jobs=1,
+                             pool='thread', stats=None, path_globs=None, gitignore=False,
+                             stat_filter=None, limit=None):
+        """
+        Yield pairs of files with similar content.
+        
+        Each file's MinHash signature is looked up in an LSHIndex of the
+        files seen before it, and only the candidates it shares a band with
+        are compared in full, so the number of comparisons grows with the
+        number of similar pairs rather than with the square of the number of
+        files. Pairs are yielded as soon as the second file is reached.
+        
+        Files with identical content are paired with the first copy only,
+        and that copy stands in for them when matching further files
+        (--duplicates lists copies in full).
+        
+        Args:
+            threshold (float): Smallest estimated Jaccard similarity of the
+                token shingles reported
+            limit (int): Stop once this many pairs have been yielded
+            See find_script for the remaining arguments.
+            
+        Yields:
+            dict: Record with the pair number, estimated similarity and the
+                  paths and sizes of both files
+        """
+        self.stats = stats = stats if stats is not None else SearchStats(
+            stages=SearchStats.SIMILARITY_STAGES)
+        lsh = LSHIndex(threshold)
+        if verbose:
+            print(f"🧮 LSH: {lsh.bands} bands of {lsh.rows} rows for a Jaccard threshold "
+                  f"of {threshold}")
+        
+        files = []
+        by_fingerprint = {}
+        pair_count = 0
+        
+        def pair(first, second, similarity):
+            nonlocal pair_count
+            pair_count += 1
+            stats.add(matches=1)
+            return {
+                'pair': pair_count,
+                'similarity': similarity,
+                'paths': [first['path'], second['path']],
+                'sizes': [first['stat'].st_size, second['stat'].st_size]
+            }
+        
+        for result in self._iter_signatures(directory, extensions, use_cache, verbose, refresh,
+                                            jobs, pool, stats, path_globs, gitignore,
+                                            stat_filter):
+            file_fingerprint = result['fingerprint']
+            if file_fingerprint is not None and file_fingerprint in by_fingerprint:
+                yield pair(files[by_fingerprint[file_fingerprint]], result, 1.0)
+                if limit is not None and pair_count >= limit:
+                    return
+                continue
+            
+            item = len(files)
+            candidates = lsh.candidates(result['signature'])
+            stats.eliminate('lsh', item - len(candidates))
+            for candidate in candidates:
+                similarity = signature_similarity(files[candidate]['signature'],
+                                                  result['signature'])
+                if similarity < threshold:
+                    stats.eliminate('similarity')
+                    continue
+                yield pair(files[candidate], result, similarity)
+                if limit is not None and pair_count >= limit:
+                    return
+            
+            files.append({key: result[key] for key in ('path', 'stat', 'signature')})
+            lsh.add(item, result['signature'])
+            if file_fingerprint is not None:
+                by_fingerprint[file_fingerprint] = item
+    
+    def _iter_signatures(self, directory, extensions, use_cache, verbose, refresh, jobs, pool,
+                         stats, path_globs, gitignore, stat_filter):
+        """
+        Yield minhash_file results for the gathered files that have tokens.
+        
+        Signatures are computed while the walk is still producing files, with
+        jobs workers, and fresh ones are recorded in the file index under the
+        file's fingerprint. Further links to an inode already seen are left out.
+        """
+        if extensions is None:
+            extensions = ['.py']
+        directories = [directory] if isinstance(directory, (str, os.PathLike)) else list(directory)
+        roots = self._normalize_roots(directories, gitignore)
+        
+        if len(roots) == 1:
+            file_iter = self.iter_files(roots[0], extensions, use_cache, verbose,
+                                        refresh=refresh, jobs=jobs, stats=stats,
+                                        path_globs=path_globs, gitignore=gitignore)
+        else:
+            file_iter = self._iter_root_files(roots, extensions, use_cache, verbose,
+                                              refresh=refresh, jobs=jobs, stats=stats,
+                                              path_globs=path_globs, gitignore=gitignore)
+        
+        stats.enter('file_index_load')
+        try:
+            file_index = FileIndex(self.cache_dir / FILE_INDEX_NAME) if use_cache else None
+            known = {}
+            if file_index is not None:
+                for root in roots:
+                    known.update(file_index.load(root))
+        finally:
+            stats.exit()
+        git_blobs = GitBlobIndex() if file_index is not None else None
+        
+        def tasks():
+            for file_path in file_iter:
+                entry = known.get(os.path.abspath(file_path))
+                if entry is None and git_blobs is not None:
+                    entry = git_blobs.entry(file_path)
+                cached = None
+                if entry is not None and file_index is not None:
+                    cached = file_index.cached_minhash(entry[4])
+                yield file_path, entry, cached, stat_filter
+        
+        inodes = set()
+        results = stats.timed('minhash', ordered_map(minhash_file, tasks(), jobs, pool))
+        try:
+            for result in results:
+                file_path = result['path']
+                stats.record_scan(result)
+                if result['error'] is not None:
+                    if verbose:
+                        print(f"❌ Error reading {file_path}: {result['error']}")
+                    continue
+                if result['rejected_by_stat']:
+                    stats.eliminate('stat')
+                    continue
+                if result['limited'] == 'binary':
+                    if verbose:
+                        print(f"⏩ Skipping {file_path.name} - binary file")
+                    continue
+                
+                stat_result = result['stat']
+                inode = (stat_result.st_dev, stat_result.st_ino)
+                if inode in inodes:
+                    continue
+                inodes.add(inode)
+                
+                if file_index is not None and result['fingerprint'] is not None \
+                        and not result['cached']:
+                    indexed_path = os.path.abspath(file_path)
+                    entry = file_index.update(indexed_path, stat_result, result['line_count'],
+                                              result['fingerprint'])
+                    if entry is not None:
+                        known[indexed_path] = entry
+                    file_index.record_minhash(result['fingerprint'], result['signature'])
+                if result['signature']:
+                    yield result
+        finally:
+            results.close()
+            file_iter.close()
+            if file_index is not None:
+                file_index.close()
+    
+    def _trigram_candidates(self, directory, all_files, content_keywords, verbose=False,
+                            budget=None):
+        """
+        Narrow a file list to the files the trigram index says may match.
+        
+        directory may also be a list of non-nested roots, each of which is
+        synced with the files under it.
+        """
+        roots = [directory] if isinstance(directory, (str, os.PathLike)) else directory
+        self.stats.enter('trigram_index')
+        trigram_index = TrigramIndex(self.cache_dir / TRIGRAM_INDEX_NAME)
+        try:
+            live = {}
+            for root in roots:
+                if len(roots) == 1:
+                    root_files = all_files
+                else:
+                    prefix = os.path.join(str(Path(root)), '')
+                    root_files = [f for f in all_files if str(f).startswith(prefix)]
+                live.update(trigram_index.sync(root, root_files, verbose, budget))
+            candidate_ids = trigram_index.candidates(content_keywords, live)
+        finally:
+            trigram_index.close()
+            self.stats.exit()
+        
+        if candidate_ids is None:
+            if verbose:
+                print("💡 Keywords shorter than 3 characters, trigram index not used")
+            return all_files
+        
+        candidates = {os.path.abspath(live[i]) for i in candidate_ids}
+        # Keep the walk order so results are the same as a full scan
+        narrowed = [f for f in all_files if os.path.abspath(f) in candidates]
+        self.stats.eliminate('keywords', len(all_files) - len(narrowed))
+        if verbose:
+            print(f"🗂️  Trigram index narrowed {len(all_files)} files to {len(narrowed)} candidates")
+        return narrowed
+
+
+def format_line_count(match):
+    """Format a match's line count, marking counts cut short by an early exit."""
+    return f"{match['line_count']}{'' if match.get('lines_exact', True) else '+'}"
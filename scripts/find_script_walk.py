@@ -0,0 +1,441 @@
+"""
+Script Finder Tree Walk
+
+Walking directory trees for find_script.py: the os.scandir based TreeWalker that
+lists sibling subtrees concurrently, --glob patterns compiled into PathGlob (which
+also prunes subtrees no pattern can match), and .gitignore rules compiled into one
+regex per ignore file by IgnoreMatcher.
+"""
+
+import os
+import fnmatch
+import re
+import subprocess
+import threading
+from collections import deque
+
+# Per-repository and per-directory ignore files read with --gitignore
+GITIGNORE_NAME = '.gitignore'
+GIT_EXCLUDE_PATH = os.path.join('info', 'exclude')
+
+# Directories that are unlikely to contain the script
+SKIP_DIRS = frozenset({
+    'node_modules', '.git', '__pycache__', '.pytest_cache', '.vscode',
+    '.idea', 'venv', 'env', '.env', 'build', 'dist', 'target',
+    'AppData', 'Local Settings', 'Windows', 'System32', 'Temp', 'tmp',
+    "installer_files", "miniconda3", "anaconda3", "miniconda", "anaconda"
+})
+
+
+class TreeWalker:
+    """
+    Work-stealing parallel tree walker.
+    
+    Each worker thread owns a deque of pending items. A worker takes new work
+    from the end of its own deque (depth first, so its subtree stays local)
+    and, when that is empty, steals from the opposite end of another worker's
+    deque, which hands over the largest remaining subtrees. os.scandir
+    releases the GIL while listing, so threads overlap directory I/O.
+    
+    Work is only ever added to a deque under the condition's lock, so an idle
+    worker that finds every deque empty while holding it can sleep until it
+    is notified of new work, or of the end of the walk, without missing either.
+    """
+    
+    def __init__(self, visit, workers):
+        """
+        Args:
+            visit (callable): Called with an item, returns the child items to walk
+            workers (int): Number of worker threads
+        """
+        self._visit = visit
+        self._workers = max(1, workers)
+        self._queues = [deque() for _ in range(self._workers)]
+        self._pending = 0
+        self._error = None
+        self._cond = threading.Condition()
+    
+    def run(self, root):
+        """Walk everything reachable from root, returning once all items are visited."""
+        self._pending = 1
+        self._queues[0].append(root)
+        threads = [threading.Thread(target=self._work, args=(i,), daemon=True)
+                   for i in range(self._workers)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        if self._error is not None:
+            raise self._error
+    
+    def _take(self, index):
+        try:
+            return self._queues[index].pop()
+        except IndexError:
+            pass
+        for offset in range(1, self._workers):
+            try:
+                return self._queues[(index + offset) % self._workers].popleft()
+            except IndexError:
+                continue
+        return None
+    
+    def _work(self, index):
+        while True:
+            item = self._take(index)
+            if item is None:
+                with self._cond:
+                    while self._pending and not any(self._queues):
+                        self._cond.wait()
+                    if self._pending == 0:
+                        return
+                continue
+            
+            try:
+                children = self._visit(item)
+                error = None
+            except Exception as e:
+                children = []
+                error = e
+            
+            with self._cond:
+                if error is not None and self._error is None:
+                    self._error = error
+                # Children become visible and pending in the same step, so the
+                # walk can never look finished while work is still queued
+                self._queues[index].extend(children)
+                self._pending += len(children) - 1
+                if self._pending == 0:
+                    self._cond.notify_all()
+                elif children:
+                    self._cond.notify(len(children))
+
+
+class PathGlob:
+    """
+    Match relative paths against one or more glob patterns during a walk.
+    
+    Patterns use '/' as separator, '*', '?' and '[...]' within one path
+    component, and '**' for any number of components, e.g. '**/train_*.py' or
+    'src/**/test_*.py'. A pattern without a '/' matches the file name at any
+    depth. Each directory gets the set of pattern positions still reachable
+    after its path, so a subtree no pattern can match is pruned without
+    being listed.
+    """
+    
+    def __init__(self, patterns):
+        self.patterns = list(patterns)
+        flags = re.IGNORECASE if os.path.normcase('A') == 'a' else 0
+        self._parts = []
+        for pattern in self.patterns:
+            parts = [part for part in pattern.replace(os.sep, '/').split('/') if part]
+            if len(parts) == 1:
+                parts.insert(0, '**')
+            self._parts.append([part if part == '**' else re.compile(fnmatch.translate(part), flags)
+                                for part in parts])
+        self._states = {'': self._closure({(p, 0) for p in range(len(self._parts))})}
+    
+    def _closure(self, positions):
+        """Add the positions reachable by letting each '**' match nothing."""
+        pending = list(positions)
+        closed = set(positions)
+        while pending:
+            p, i = pending.pop()
+            if i < len(self._parts[p]) and self._parts[p][i] == '**' and (p, i + 1) not in closed:
+                closed.add((p, i + 1))
+                pending.append((p, i + 1))
+        return frozenset(closed)
+    
+    def _step(self, state, name):
+        """Return the positions reached from state by consuming one path component."""
+        positions = set()
+        for p, i in state:
+            if i == len(self._parts[p]):
+                continue
+            part = self._parts[p][i]
+            if part == '**':
+                positions.add((p, i))
+            elif part.match(name):
+                positions.add((p, i + 1))
+        return self._closure(positions)
+    
+    def _state(self, rel_dir):
+        state = self._states.get(rel_dir)
+        if state is None:
+            parent, name = os.path.split(rel_dir)
+            state = self._step(self._state(parent), name)
+            self._states[rel_dir] = state
+        return state
+    
+    def may_contain(self, rel_dir):
+        """Return whether a directory (relative to the root) can hold a matching file."""
+        return any(i < len(self._parts[p]) for p, i in self._state(rel_dir))
+    
+    def matches(self, rel_dir, name):
+        """Return whether the file name in directory rel_dir matches a pattern."""
+        return any(i == len(self._parts[p]) for p, i in self._step(self._state(rel_dir), name))
+    
+    def match_path(self, rel_path):
+        """Return whether a file path relative to the root matches a pattern."""
+        rel_dir, name = os.path.split(rel_path)
+        return self.may_contain(rel_dir) and self.matches(rel_dir, name)
+
+
+def gitignore_regex(pattern):
+    """
+    Translate a gitignore pattern into a regex over '/'-separated relative paths.
+    
+    The pattern must already be stripped of a leading '!' and trailing '/'.
+    A pattern with a '/' anywhere but at its end is anchored to the directory
+    of its ignore file; any other pattern matches at any depth below it.
+    """
+    anchored = '/' in pattern
+    if pattern.startswith('/'):
+        pattern = pattern[1:]
+    out = []
+    i = 0
+    n = len(pattern)
+    while i < n:
+        char = pattern[i]
+        if pattern.startswith('**', i) and (i == 0 or pattern[i - 1] == '/') \
+                and (i + 2 == n or pattern[i + 2] == '/'):
+            if i + 2 == n:
+                out.append('.*')
+                i += 2
+            else:
+                out.append('(?:.*/)?')
+                i += 3
+            continue
+        if char == '*':
+            out.append('[^/]*')
+        elif char == '?':
+            out.append('[^/]')
+        elif char == '[':
+            end = i + 1
+            if end < n and pattern[end] in '!^':
+                end += 1
+            if end < n and pattern[end] == ']':
+                end += 1
+            end = pattern.find(']', end)
+            if end == -1:
+                out.append(re.escape(char))
+            else:
+                body = pattern[i + 1:end]
+                negated = body[:1] in ('!', '^')
+                if negated:
+                    body = body[1:]
+                body = body.replace('\\', '\\\\').replace('[', '\\[')
+                out.append(f"[^/{body}]" if negated else f"[{body}]")
+                i = end
+        elif char == '\\' and i + 1 < n:
+            i += 1
+            out.append(re.escape(pattern[i]))
+        else:
+            out.append(re.escape(char))
+        i += 1
+    regex = ''.join(out)
+    return regex if anchored else '(?:.*/)?' + regex
+
+
+def parse_gitignore_line(line):
+    """
+    Parse one line of an ignore file.
+    
+    Returns:
+        tuple: (regex, negated, directories only), or None for blank and
+               comment lines
+    """
+    line = line.rstrip('\r\n')
+    if not line or line.startswith('#'):
+        return None
+    # Trailing spaces are dropped unless escaped
+    stripped = line.rstrip(' ')
+    if stripped.endswith('\\') and len(stripped) < len(line):
+        stripped += ' '
+    line = stripped
+    negated = line.startswith('!')
+    if negated:
+        line = line[1:]
+    dir_only = line.endswith('/')
+    line = line.rstrip('/')
+    if not line:
+        return None
+    return gitignore_regex(line), negated, dir_only
+
+
+def read_ignore_file(path):
+    """Return the lines of an ignore file, or an empty list if it cannot be read."""
+    try:
+        with open(path, encoding='utf-8', errors='replace') as f:
+            return f.readlines()
+    except OSError:
+        return []
+
+
+class IgnoreRules:
+    """
+    The patterns of one ignore file, each compiled into a single regex.
+    
+    All patterns are joined into one alternation in reverse order, so the
+    alternative that matches a path is the last matching pattern, which
+    decides as in git. Directory-only patterns get a separate alternation
+    without them for files. When no pattern matches, the rules of the
+    enclosing directory decide.
+    """
+    
+    def __init__(self, lines, parent=None, base='', prefix=''):
+        """
+        Args:
+            lines (list): Lines of the ignore file
+            parent (IgnoreRules): Rules of lower precedence, or None
+            base (str): Directory of the ignore file relative to the walk root
+                ('/' separated, '' for the root or an ancestor of it)
+            prefix (str): Path of the walk root relative to the directory of
+                the ignore file, for ignore files above the root ('' otherwise)
+        """
+        self.parent = parent
+        self.base = base
+        self.prefix = prefix
+        patterns = [parsed for parsed in map(parse_gitignore_line, lines) if parsed is not None]
+        self.empty = not patterns
+        self._dirs = self._compile([(regex, negated) for regex, negated, _ in patterns])
+        self._files = self._compile([(regex, negated) for regex, negated, dir_only in patterns
+                                     if not dir_only])
+    
+    @staticmethod
+    def _compile(patterns):
+        if not patterns:
+            return None, ()
+        flags = re.IGNORECASE if os.path.normcase('A') == 'a' else 0
+        alternation = '|'.join(f'(?P<p{i}>{regex})'
+                               for i, (regex, _) in reversed(list(enumerate(patterns))))
+        return re.compile(alternation, flags), [negated for _, negated in patterns]
+    
+    def ignored(self, rel_path, is_dir):
+        """Return whether a '/'-separated path relative to the walk root is ignored."""
+        rules = self
+        while rules is not None:
+            regex, negated = rules._dirs if is_dir else rules._files
+            if regex is not None:
+                path = rel_path[len(rules.base) + 1:] if rules.base else rel_path
+                if rules.prefix:
+                    path = f"{rules.prefix}/{path}"
+                match = regex.fullmatch(path)
+                if match is not None:
+                    return not negated[int(match.lastgroup[1:])]
+            rules = rules.parent
+        return False
+
+
+class IgnoreMatcher:
+    """
+    Prune a walk by the .gitignore files of the trees it covers.
+    
+    Every directory gets the rules of its own .gitignore chained to those of
+    its parent; a repository root (a directory holding .git) starts a new
+    chain from its .git/info/exclude, so the rules of an enclosing repository
+    do not leak into a nested one. The user's ignore file (git's
+    core.excludesFile, as configured for the root) has the lowest precedence.
+    Ignore files between the walk root and the top of its repository apply
+    too. Directories are decided before they are listed, so ignored subtrees
+    are never walked.
+    """
+    
+    GIT_TIMEOUT_SECONDS = 60
+    
+    def __init__(self, root, user_ignore_file=None):
+        self.root = str(root)
+        if user_ignore_file is None:
+            user_ignore_file = self._excludes_file()
+        user_rules = IgnoreRules(read_ignore_file(user_ignore_file) if user_ignore_file else [])
+        self._user_rules = None if user_rules.empty else user_rules
+        self._rules = {'': self._root_rules()}
+        self._ignored_dirs = {'': False}
+    
+    def _excludes_file(self):
+        """
+        Return the path of the user's ignore file.
+        
+        The effective core.excludesFile is asked from git, so the global,
+        system and repository config all count; when it is not set (or git
+        cannot be run) git's default under $XDG_CONFIG_HOME is used.
+        """
+        try:
+            output = subprocess.run(
+                ['git', '-C', self.root, 'config', '--path', '--get', 'core.excludesFile'],
+                check=True, stdout=subprocess.PIPE, stderr=subprocess.DEVNULL,
+                timeout=self.GIT_TIMEOUT_SECONDS).stdout
+            path = os.fsdecode(output.rstrip(b'\n'))
+            # An empty value turns the user's ignore file off
+            return os.path.join(self.root, path) if path else None
+        except (OSError, subprocess.SubprocessError):
+            config_home = os.environ.get('XDG_CONFIG_HOME') or os.path.join(
+                os.path.expanduser('~'), '.config')
+            return os.path.join(config_home, 'git', 'ignore')
+    
+    def _root_rules(self):
+        """Chain the rules from the top of the root's repository down to the root."""
+        directories = []
+        directory = os.path.abspath(self.root)
+        while True:
+            directories.append(directory)
+            if os.path.lexists(os.path.join(directory, '.git')):
+                break
+            parent = os.path.dirname(directory)
+            if parent == directory:
+                # Not in a repository: only the root's own ignore files apply
+                directories = directories[:1]
+                break
+            directory = parent
+        
+        rules = self._user_rules
+        for directory in reversed(directories):
+            prefix = os.path.relpath(self.root, directory)
+            prefix = '' if prefix == '.' else prefix.replace(os.sep, '/')
+            rules = self._load(directory, rules, '', prefix)
+        return rules
+    
+    def _load(self, directory, parent, base, prefix=''):
+        """Chain the ignore files of one directory onto the rules of its parent."""
+        git_dir = os.path.join(directory, '.git')
+        if os.path.lexists(git_dir):
+            parent = self._user_rules
+            if os.path.isfile(git_dir):
+                line = (read_ignore_file(git_dir) or [''])[0].strip()
+                git_dir = os.path.join(directory, line[len('gitdir:'):].strip()) \
+                    if line.startswith('gitdir:') else None
+            if git_dir is not None:
+                exclude = IgnoreRules(read_ignore_file(os.path.join(git_dir, GIT_EXCLUDE_PATH)),
+                                      parent, base, prefix)
+                if not exclude.empty:
+                    parent = exclude
+        rules = IgnoreRules(read_ignore_file(os.path.join(directory, GITIGNORE_NAME)),
+                            parent, base, prefix)
+        return parent if rules.empty else rules
+    
+    def _rules_for(self, rel_dir):
+        rules = self._rules.get(rel_dir, self)
+        if rules is self:
+            parent = self._rules_for(os.path.dirname(rel_dir))
+            rules = self._load(os.path.join(self.root, rel_dir), parent,
+                               rel_dir.replace(os.sep, '/'))
+            self._rules[rel_dir] = rules
+        return rules
+    
+    def ignores_dir(self, rel_dir):
+        """Return whether a directory (relative to the root) is ignored or inside one."""
+        ignored = self._ignored_dirs.get(rel_dir)
+        if ignored is None:
+            parent = os.path.dirname(rel_dir)
+            rules = self._rules_for(parent)
+            ignored = self.ignores_dir(parent) or (
+                rules is not None and rules.ignored(rel_dir.replace(os.sep, '/'), True))
+            self._ignored_dirs[rel_dir] = ignored
+        return ignored
+    
+    def ignores_file(self, rel_dir, name):
+        """Return whether the file name in directory rel_dir is ignored."""
+        rules = self._rules_for(rel_dir)
+        if rules is None:
+            return False
+        return rules.ignored(os.path.join(rel_dir, name).replace(os.sep, '/'), False)
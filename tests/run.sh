@@ -22,6 +22,11 @@ if ! zsh tests/commands_tests.sh; then
     echo 'Failed zsh run'
     err=1
 fi
+echo -e "\n---- Running find_script tests ----\n"
+if ! python3 -m unittest discover -s tests -p 'test_find_script*.py'; then
+    echo 'Failed find_script run'
+    err=1
+fi
 if [ "$err" ]; then
     echo -e "\nOne or more test failures observed."
 else
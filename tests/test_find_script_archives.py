@@ -0,0 +1,139 @@
+"""
+Tests for searching inside archives (scripts/find_script_archives.py). Run with:
+    python -m unittest discover -s tests -p 'test_find_script*.py'
+"""
+
+import io
+import os
+import sys
+import tarfile
+import tempfile
+import time
+import unittest
+import zipfile
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / 'scripts'))
+
+from find_script_archives import archive_kind, scan_archive  # noqa: E402
+from find_script_search import ScriptFinder  # noqa: E402
+
+MEMBERS = {
+    'pkg/train.py': 'import torch\n' + 'x = 1\n' * 9,
+    'pkg/short.py': 'pass',
+    'pkg/other.py': 'nothing\n' * 10,
+    'README.md': 'torch\n' * 10,
+}
+
+
+def write_zip(path, members):
+    with zipfile.ZipFile(path, 'w') as archive:
+        for name, text in members.items():
+            archive.writestr(name, text)
+
+
+def write_tar(path, members, mode='w:gz'):
+    with tarfile.open(path, mode) as archive:
+        for name, text in members.items():
+            data = text.encode('utf-8')
+            info = tarfile.TarInfo(name)
+            info.size = len(data)
+            info.mtime = time.time() - 3600
+            archive.addfile(info, io.BytesIO(data))
+
+
+def matches(outcome):
+    return sorted(str(Path(result['path']).relative_to(outcome['path']))
+                  for result in outcome['results'] if result['matched_keywords'])
+
+
+class ScanArchiveTest(unittest.TestCase):
+
+    def setUp(self):
+        self._tmp = tempfile.TemporaryDirectory()
+        self.tmp = Path(self._tmp.name)
+
+    def tearDown(self):
+        self._tmp.cleanup()
+
+    def test_archive_kind(self):
+        self.assertEqual(archive_kind('a.whl'), 'zip')
+        self.assertEqual(archive_kind('A.TAR.GZ'), 'tar')
+        self.assertEqual(archive_kind('a.tgz'), 'tar')
+        self.assertIsNone(archive_kind('a.gz'))
+        self.assertIsNone(archive_kind('a.py'))
+
+    def test_zip_and_tar_members(self):
+        archives = [self.tmp / 'bundle.zip', self.tmp / 'bundle.tar.gz', self.tmp / 'plain.tar']
+        write_zip(archives[0], MEMBERS)
+        write_tar(archives[1], MEMBERS)
+        write_tar(archives[2], MEMBERS, 'w')
+        for archive_path in archives:
+            with self.subTest(archive=archive_path.name):
+                outcome = scan_archive(archive_path, None, {'.py'}, 5, ['torch'])
+                self.assertIsNone(outcome['error'])
+                self.assertTrue(outcome['fresh'])
+                self.assertEqual(matches(outcome), ['pkg/train.py'])
+                self.assertEqual(sorted(member[0] for member in outcome['listing']),
+                                 sorted(MEMBERS))
+                # short.py is ruled out by its size, README.md by its extension
+                self.assertEqual(outcome['eliminated'], {'extension': 1, 'stat': 1})
+                self.assertEqual(len(outcome['results']), 2)
+
+                # A cached listing gives the same results without being rebuilt
+                again = scan_archive(archive_path, outcome['listing'], {'.py'}, 5, ['torch'])
+                self.assertFalse(again['fresh'])
+                self.assertEqual(matches(again), ['pkg/train.py'])
+
+    def test_broken_archive(self):
+        archive_path = self.tmp / 'broken.zip'
+        archive_path.write_bytes(b'not a zip file')
+        outcome = scan_archive(archive_path, None, {'.py'}, 1, ['torch'])
+        self.assertIsNotNone(outcome['error'])
+        self.assertIsNone(outcome['listing'])
+        self.assertEqual(outcome['results'], [])
+
+
+class ArchiveSearchTest(unittest.TestCase):
+
+    def setUp(self):
+        self._tmp = tempfile.TemporaryDirectory()
+        self.tmp = Path(self._tmp.name)
+        self.root = self.tmp / 'tree'
+        (self.root / 'wheels').mkdir(parents=True)
+        (self.root / 'plain.py').write_text('import torch\n' * 5)
+        write_zip(self.root / 'wheels' / 'bundle.whl', MEMBERS)
+        write_tar(self.root / 'wheels' / 'sources.tgz', MEMBERS)
+        write_zip(self.root / 'docs.zip', {'index.md': 'torch\n'})
+        for path in self.root.rglob('*.*'):
+            mtime = time.time() - 3600
+            os.utime(path, (mtime, mtime))
+
+    def tearDown(self):
+        self._tmp.cleanup()
+
+    def search(self, archives=True):
+        finder = ScriptFinder(self.tmp / 'cache')
+        found = finder.find_script(str(self.root), ['.py'], min_lines=5,
+                                   content_keywords=['torch'], archives=archives)
+        names = sorted(Path(match['path']).relative_to(self.root).as_posix() for match in found)
+        return names, finder.stats.counters
+
+    def test_search_and_cached_listings(self):
+        self.assertEqual(self.search(archives=False)[0], ['plain.py'])
+        expected = ['plain.py', 'wheels/bundle.whl/pkg/train.py',
+                    'wheels/sources.tgz/pkg/train.py']
+        names, counters = self.search()
+        self.assertEqual(names, expected)
+        self.assertEqual(counters['archives_opened'], 3)
+
+        # Warm searches find the same members from the cached listings and
+        # skip the archive without .py members unopened
+        names, counters = self.search()
+        self.assertEqual(names, expected)
+        self.assertEqual(counters['archive_listings_cached'], 3)
+        self.assertEqual(counters['archives_opened'], 2)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,533 @@
+"""
+Tests for the find_script cache and indexes (scripts/find_script_cache.py). Run with:
+    python -m unittest discover -s tests -p 'test_find_script*.py'
+"""
+
+import hashlib
+import os
+import random
+import re
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+import unittest
+from pathlib import Path
+from unittest import mock
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / 'scripts'))
+
+import find_script_cache  # noqa: E402
+from find_script_cache import (  # noqa: E402
+    CACHE_HEADER, UNREAD_GRAM, CacheManager, CachedDirRecords, FileIndex, GitBlobIndex,
+    TrigramIndex, encode_cache, name_score)
+from find_script_scan import ReadBudget, fold_case, trigrams  # noqa: E402
+from find_script_search import ScriptFinder  # noqa: E402
+
+
+def write_tree(root, files):
+    """Create files (relative path -> text) under root."""
+    for rel_path, text in files.items():
+        path = Path(root) / rel_path
+        path.parent.mkdir(parents=True, exist_ok=True)
+        path.write_text(text)
+
+
+def backdate(path, seconds=3600):
+    """Move a file's mtime into the past, out of the racy window."""
+    mtime = time.time() - seconds
+    os.utime(path, (mtime, mtime))
+
+
+class BinaryCacheTest(unittest.TestCase):
+
+    def setUp(self):
+        self._tmp = tempfile.TemporaryDirectory()
+        self.tmp = Path(self._tmp.name)
+
+    def tearDown(self):
+        self._tmp.cleanup()
+
+    def records(self):
+        return {
+            '': {'mtime': 1.5, 'files': ['top.py', 'setup.py']},
+            'pkg': {'mtime': None, 'files': []},
+            os.path.join('pkg', 'sub'): {'mtime': 3.25, 'files': ['deep.py']},
+            # Names that are not valid UTF-8 round-trip through os.fsencode
+            os.fsdecode(b'odd\xff'): {'mtime': 4.0, 'files': [os.fsdecode(b'n\xe9.py')]},
+        }
+
+    def test_round_trip(self):
+        cache_file = self.tmp / 'list.sfc'
+        cache_file.write_bytes(encode_cache(self.records()))
+        decoded = CachedDirRecords(cache_file)
+        try:
+            self.assertEqual(list(decoded), list(self.records()))
+            self.assertEqual(decoded.file_count, 4)
+            for rel_dir, record in self.records().items():
+                self.assertEqual(decoded[rel_dir]['mtime'], record['mtime'])
+                self.assertEqual(decoded[rel_dir]['files'], record['files'])
+            self.assertEqual(sorted(decoded['']['subdirs']), ['odd\udcff', 'pkg'])
+            self.assertEqual(decoded['pkg']['subdirs'], ['sub'])
+            self.assertNotIn('missing', decoded)
+        finally:
+            decoded.close()
+
+    def test_lookups_decode_on_demand(self):
+        rng = random.Random(8)
+        records = {'': {'mtime': 1.0, 'files': []}}
+        for _ in range(300):
+            parent = rng.choice(list(records))
+            name = rng.choice(['a', 'b', 'ab', 'b.c', 'z' * 3, 'é']) + str(rng.randrange(40))
+            rel_dir = os.path.join(parent, name) if parent else name
+            records.setdefault(rel_dir, {'mtime': rng.random(), 'files': [name + '.py']})
+        # Records are stored in top-down walk order, children in listing order
+        subdirs = {rel_dir: [] for rel_dir in records}
+        for rel_dir in records:
+            if rel_dir:
+                subdirs[os.path.dirname(rel_dir)].append(os.path.basename(rel_dir))
+        ordered, stack = {}, ['']
+        while stack:
+            rel_dir = stack.pop()
+            ordered[rel_dir] = records[rel_dir]
+            stack.extend(os.path.join(rel_dir, d) for d in reversed(subdirs[rel_dir]))
+        cache_file = self.tmp / 'list.sfc'
+        cache_file.write_bytes(encode_cache(ordered))
+
+        with mock.patch('os.fsdecode', side_effect=os.fsdecode) as fsdecode:
+            decoded = CachedDirRecords(cache_file)
+            try:
+                self.assertEqual(fsdecode.call_count, 0)
+                self.assertEqual(len(decoded), len(ordered))
+                deepest = max(ordered, key=lambda rel_dir: rel_dir.count(os.sep))
+                self.assertEqual(decoded[deepest]['files'], ordered[deepest]['files'])
+                # Only the names along the path are compared, never decoded
+                self.assertLessEqual(fsdecode.call_count, 1 + len(subdirs[deepest]))
+                for rel_dir, record in ordered.items():
+                    self.assertEqual(decoded[rel_dir]['mtime'], record['mtime'])
+                    self.assertEqual(decoded[rel_dir]['subdirs'], subdirs[rel_dir])
+                    self.assertNotIn(os.path.join(rel_dir, 'missing'), decoded)
+                    self.assertNotIn(rel_dir + 'x', decoded)
+                self.assertEqual(list(decoded), list(ordered))
+            finally:
+                decoded.close()
+
+    def test_rejects_other_formats(self):
+        cache_file = self.tmp / 'list.sfc'
+        data = bytearray(encode_cache(self.records()))
+        data[:4] = b'XXXX'
+        cache_file.write_bytes(bytes(data))
+        with self.assertRaises(ValueError):
+            CachedDirRecords(cache_file)
+
+    def test_store_and_lookup(self):
+        root = self.tmp / 'tree'
+        write_tree(root, {'a.py': '', 'pkg/b.py': ''})
+        cache = CacheManager(self.tmp / 'cache')
+        self.assertEqual(cache.lookup(root, ['.py']), (None, None))
+        self.assertTrue(cache.store(root, ['.py'], {
+            '': {'mtime': 1.0, 'files': ['a.py']},
+            'pkg': {'mtime': 2.0, 'files': ['b.py']},
+        }))
+
+        records, age = cache.lookup(root, ['.py'])
+        try:
+            self.assertLess(age, 1)
+            self.assertEqual(records['pkg']['files'], ['b.py'])
+            self.assertEqual(records['']['subdirs'], ['pkg'])
+        finally:
+            records.close()
+        # The entry is recorded in the manifest with the size of its file
+        key = cache.cache_key(root, ['.py'])
+        self.assertEqual(cache.entries()[key]['size'], cache.cache_file(key).stat().st_size)
+        self.assertGreater(cache.entries()[key]['size'], CACHE_HEADER.size)
+
+
+class CacheManagerTest(unittest.TestCase):
+
+    def setUp(self):
+        self._tmp = tempfile.TemporaryDirectory()
+        self.tmp = Path(self._tmp.name)
+        self.root = self.tmp / 'tree'
+        write_tree(self.root, {'a.py': '', 'README.md': '', 'pkg/b.py': '', 'pkg/c.md': ''})
+        self.records = {
+            '': {'mtime': 1.0, 'files': ['a.py', 'README.md']},
+            'pkg': {'mtime': 2.0, 'files': ['b.py', 'c.md']},
+        }
+
+    def tearDown(self):
+        self._tmp.cleanup()
+
+    def test_subdirectory_and_fewer_extensions(self):
+        cache = CacheManager(self.tmp / 'cache')
+        cache.store(self.root, ['.py', '.md'], self.records)
+        records, _ = cache.lookup(self.root / 'pkg', ['.py'])
+        try:
+            self.assertEqual(list(records), [''])
+            self.assertEqual(records['']['files'], ['b.py'])
+            self.assertIn(str(self.root.resolve()), records.source)
+        finally:
+            records.close()
+        # A cache of fewer extensions cannot answer a query for more
+        cache.clear()
+        cache.store(self.root, ['.py'], self.records)
+        self.assertEqual(cache.lookup(self.root, ['.py', '.md']), (None, None))
+
+    def test_evicts_least_recently_used(self):
+        cache = CacheManager(self.tmp / 'cache')
+        cache.store(self.root, ['.py'], self.records)
+        size = cache.total_size()
+        cache.size_limit = size * 2 - 1
+        cache.store(self.root, ['.md'], self.records)
+        self.assertEqual([entry['extensions'] for entry in cache.entries().values()], [['.md']])
+        self.assertEqual(len(list(cache.cache_dir.glob('*.sfc'))), 1)
+
+    def test_clear_removes_everything(self):
+        cache = CacheManager(self.tmp / 'cache')
+        cache.store(self.root, ['.py'], self.records)
+        cache.store(self.root, ['.md'], self.records)
+        stray = ['file_index.sqlite3', 'file_index.sqlite3-wal', 'file_index.sqlite3-shm',
+                 'trigram_index.sqlite3', 'trigram_index.sqlite3-journal', 'old_list.json']
+        for name in stray:
+            (cache.cache_dir / name).write_bytes(b'')
+        self.assertEqual(cache.clear(), 2 + len(stray))
+        self.assertEqual(list(cache.cache_dir.iterdir()), [])
+
+
+class RevalidationTest(unittest.TestCase):
+
+    def setUp(self):
+        self._tmp = tempfile.TemporaryDirectory()
+        self.tmp = Path(self._tmp.name)
+        self.root = self.tmp / 'tree'
+        write_tree(self.root, {'a.py': '', 'pkg/b.py': '', 'pkg/sub/c.py': '',
+                               'other/d.py': '', 'other/notes.md': ''})
+        for path in [*self.root.rglob('*'), self.root]:
+            backdate(path)
+
+    def tearDown(self):
+        self._tmp.cleanup()
+
+    def gather(self, **options):
+        finder = ScriptFinder(self.tmp / 'cache')
+        files = finder.gather_files(str(self.root), ['.py'], **options)
+        names = sorted(path.relative_to(self.root).as_posix() for path in files)
+        return names, finder.stats
+
+    def test_only_changed_directories_are_listed(self):
+        names, stats = self.gather()
+        self.assertEqual(names, ['a.py', 'other/d.py', 'pkg/b.py', 'pkg/sub/c.py'])
+        self.assertEqual((stats.cache['status'], stats.counters['dirs_listed']), ('miss', 4))
+        # A young cache is used without looking at the tree
+        names, stats = self.gather()
+        self.assertEqual(len(names), 4)
+        self.assertEqual(stats.cache['status'], 'hit')
+        self.assertEqual((stats.counters['dirs_stat'], stats.counters['dirs_listed']), (0, 0))
+
+        (self.root / 'pkg' / 'new.py').write_text('')
+        (self.root / 'other' / 'd.py').unlink()
+        expected = ['a.py', 'pkg/b.py', 'pkg/new.py', 'pkg/sub/c.py']
+        for options in ({'refresh': True}, {'max_age_hours': 0}):
+            with self.subTest(**options):
+                names, stats = self.gather(**options)
+                self.assertEqual(names, expected)
+                self.assertEqual(stats.cache['status'], 'revalidated')
+                # One stat per directory; only the two that changed are listed
+                self.assertEqual(stats.counters['dirs_visited'], 4)
+                self.assertEqual(stats.counters['dirs_listed'], 2)
+
+        # A removed directory drops out of the list with its files
+        shutil.rmtree(self.root / 'pkg' / 'sub')
+        backdate(self.root / 'pkg')
+        names, stats = self.gather(refresh=True)
+        self.assertEqual(names, ['a.py', 'pkg/b.py', 'pkg/new.py'])
+
+
+class FileIndexTest(unittest.TestCase):
+
+    def setUp(self):
+        self._tmp = tempfile.TemporaryDirectory()
+        self.tmp = Path(self._tmp.name)
+        self.root = self.tmp / 'tree'
+
+    def tearDown(self):
+        self._tmp.cleanup()
+
+    def test_update_and_load(self):
+        write_tree(self.root, {'pkg/a.py': 'one\ntwo\nthree\n'})
+        path = self.root / 'pkg' / 'a.py'
+        backdate(path)
+        stat_result = path.stat()
+        index = FileIndex(self.tmp / 'index.sqlite3')
+        entry = index.update(str(path), stat_result, 3, 'f' * 40)
+        index.close()
+
+        index = FileIndex(self.tmp / 'index.sqlite3')
+        try:
+            self.assertEqual(index.load(str(self.root)), {str(path): entry})
+            self.assertEqual(entry, (stat_result.st_size, stat_result.st_mtime_ns,
+                                     stat_result.st_ino, 3, 'f' * 40))
+            self.assertEqual(index.blob_line_count('f' * 40), 3)
+            # Siblings sharing a name prefix are outside the directory
+            self.assertEqual(index.load(str(self.root) + '2'), {})
+        finally:
+            index.close()
+
+    def test_recently_modified_files_are_left_out(self):
+        write_tree(self.root, {'a.py': 'x\n'})
+        path = self.root / 'a.py'
+        index = FileIndex(self.tmp / 'index.sqlite3')
+        try:
+            self.assertIsNone(index.update(str(path), path.stat(), 1, 'e' * 40))
+            index.flush()
+            self.assertEqual(index.load(str(self.root)), {})
+            # The line count of the content is kept all the same
+            self.assertEqual(index.blob_line_count('e' * 40), 1)
+        finally:
+            index.close()
+
+    def test_unchanged_files_are_not_reopened(self):
+        write_tree(self.root, {'a.py': 'x\n' * 5, 'b.py': 'x\n', 'pkg/c.py': 'x\n' * 9})
+        for path in self.root.rglob('*.py'):
+            backdate(path)
+        cache_dir = self.tmp / 'cache'
+
+        def search():
+            finder = ScriptFinder(cache_dir)
+            matches = finder.find_script(str(self.root), ['.py'], min_lines=3,
+                                         content_keywords=['x'])
+            return sorted(match['path'].name for match in matches), finder.stats.counters
+
+        names, counters = search()
+        self.assertEqual(names, ['a.py', 'c.py'])
+        # b.py is too small to hold three lines, so it is never opened
+        self.assertEqual(counters['files_opened'], 2)
+        names, counters = search()
+        self.assertEqual(names, ['a.py', 'c.py'])
+        self.assertEqual(counters['files_opened'], 0)
+
+        (self.root / 'b.py').write_text('x\n' * 4)
+        backdate(self.root / 'b.py', 60)
+        names, counters = search()
+        self.assertEqual(names, ['a.py', 'b.py', 'c.py'])
+        self.assertEqual(counters['files_opened'], 1)
+
+
+@unittest.skipUnless(shutil.which('git'), 'git is not installed')
+class GitBlobIndexTest(unittest.TestCase):
+
+    def setUp(self):
+        self._tmp = tempfile.TemporaryDirectory()
+        self.tmp = Path(self._tmp.name)
+        self.root = self.tmp / 'repo'
+        self.global_config = self.tmp / 'gitconfig'
+        self.global_config.write_text('')
+        # Keep the user's and the system's git configuration out of the test
+        self.env = dict(os.environ, HOME=str(self.tmp), XDG_CONFIG_HOME=str(self.tmp / 'config'),
+                        GIT_CONFIG_GLOBAL=str(self.global_config), GIT_CONFIG_NOSYSTEM='1')
+        self.git('init', '-q', str(self.root))
+        write_tree(self.root, {'a.py': 'x = 1\n', 'pkg/b.py': 'y = 2\n', 'pkg/c.txt': 'z\n'})
+
+    def tearDown(self):
+        self._tmp.cleanup()
+
+    def git(self, *args):
+        subprocess.run(['git', *args], cwd=self.root if self.root.exists() else None,
+                       env=self.env, check=True, capture_output=True)
+
+    def blob_ids(self):
+        """Stage every file and return the blob ids GitBlobIndex gives them."""
+        for path in self.root.rglob('*'):
+            if path.is_file() and '.git' not in path.parts:
+                backdate(path)
+        self.git('add', '-A')
+        with mock.patch.dict(os.environ, self.env):
+            index = GitBlobIndex()
+            entries = {name: index.entry(self.root / name) for name in ('a.py', 'pkg/b.py',
+                                                                         'pkg/c.txt')}
+        return {name: entry[4] for name, entry in entries.items() if entry is not None}
+
+    def test_blob_ids_are_the_content_fingerprints(self):
+        blob_ids = self.blob_ids()
+        self.assertEqual(sorted(blob_ids), ['a.py', 'pkg/b.py', 'pkg/c.txt'])
+        for name, blob_id in blob_ids.items():
+            data = (self.root / name).read_bytes()
+            self.assertEqual(blob_id, hashlib.sha1(b'blob %d\0' % len(data) + data).hexdigest())
+
+    def test_files_with_attributes_are_left_out(self):
+        write_tree(self.root, {'pkg/.gitattributes': '*.py text eol=crlf\n',
+                               '.git/info/attributes': '*.txt filter=lfs\n'})
+        self.assertEqual(sorted(self.blob_ids()), ['a.py'])
+
+    def test_line_ending_conversion_in_global_config(self):
+        for setting in ('autocrlf = true', 'eol = crlf'):
+            with self.subTest(setting=setting):
+                self.global_config.write_text(f'[core]\n\t{setting}\n')
+                self.assertEqual(self.blob_ids(), {})
+        self.global_config.write_text('[core]\n\tautocrlf = input\n')
+        self.assertEqual(len(self.blob_ids()), 3)
+
+
+class TrigramIndexTest(unittest.TestCase):
+
+    def setUp(self):
+        self._tmp = tempfile.TemporaryDirectory()
+        self.tmp = Path(self._tmp.name)
+        self.root = self.tmp / 'tree'
+        write_tree(self.root, {
+            'a.py': 'def find_needle(): pass\n',
+            'b.py': 'haystack only\n',
+            'docs/c.md': 'A NEEDLE in the docs\n',
+        })
+        for path in self.root.rglob('*.*'):
+            backdate(path)
+        self.index = TrigramIndex(self.tmp / 'trigrams.sqlite3')
+
+    def tearDown(self):
+        self.index.close()
+        self._tmp.cleanup()
+
+    def paths(self, *names):
+        return [str(self.root / name) for name in names]
+
+    def matching(self, keywords, live):
+        ids = self.index.candidates(keywords, live)
+        return None if ids is None else sorted(Path(live[i]).name for i in ids)
+
+    def test_candidates(self):
+        live = self.index.sync(str(self.root), self.paths('a.py', 'b.py', 'docs/c.md'))
+        self.assertEqual(self.matching(['needle'], live), ['a.py', 'c.md'])
+        self.assertEqual(self.matching(['Needle', 'haystack'], live), ['a.py', 'b.py', 'c.md'])
+        self.assertEqual(self.matching(['re:find_ne+dle'], live), ['a.py'])
+        self.assertEqual(self.matching(['absent'], live), [])
+        # Keywords shorter than a trigram cannot narrow anything down
+        self.assertIsNone(self.matching(['ne'], live))
+
+    def test_other_file_lists_keep_their_rows(self):
+        py_files = self.paths('a.py', 'b.py')
+        self.index.sync(str(self.root), py_files)
+        self.index.sync(str(self.root), self.paths('docs/c.md'))
+        next_id = self.index._get_meta('next_id')
+        # Alternating between queries of other extensions reads nothing again
+        live = self.index.sync(str(self.root), py_files)
+        self.index.sync(str(self.root), self.paths('docs/c.md'))
+        self.assertEqual(self.index._get_meta('next_id'), next_id)
+        self.assertEqual(self.index._get_meta('dead'), 0)
+        self.assertEqual(self.matching(['needle'], live), ['a.py'])
+
+    def test_changed_and_deleted_files(self):
+        self.index.sync(str(self.root), self.paths('a.py', 'b.py', 'docs/c.md'))
+        (self.root / 'a.py').unlink()
+        (self.root / 'b.py').write_text('now a needle too\n')
+        backdate(self.root / 'b.py', 60)
+        live = self.index.sync(str(self.root), self.paths('b.py'))
+        self.assertEqual(self.matching(['needle'], live), ['b.py'])
+        indexed = {row[0] for row in self.index._conn.execute('SELECT path FROM indexed_files')}
+        self.assertEqual(indexed, set(self.paths('b.py', 'docs/c.md')))
+
+    def test_search_results_match_a_plain_scan(self):
+        finder = ScriptFinder(self.tmp / 'cache')
+
+        def search(**options):
+            matches = finder.find_script(str(self.root), ['.py', '.md'], min_lines=1,
+                                         content_keywords=['needle', 'docs'], **options)
+            return sorted(match['path'].name for match in matches)
+
+        self.assertEqual(search(use_trigram_index=True), search())
+        self.assertEqual(search(use_trigram_index=True), ['a.py', 'c.md'])
+
+    def test_chunked_reads(self):
+        path = self.root / 'mixed.py'
+        data = 'Straße İstanbul ÉTÉ needle\n'.encode('utf-8') * 5 + b'\xff broken \xe2\x82'
+        path.write_bytes(data)
+        expected = trigrams(fold_case(data.decode('utf-8', errors='ignore')).encode('utf-8'))
+        for chunk_size in (1, 2, 3, 7, 1024):
+            with mock.patch.object(find_script_cache, 'SCAN_CHUNK_SIZE', chunk_size):
+                self.assertEqual(TrigramIndex.read_trigrams(path), expected, chunk_size)
+
+    def test_unread_files_are_always_candidates(self):
+        (self.root / 'binary.py').write_bytes(b'\0 needle\n')
+        (self.root / 'long.py').write_text('x = 1\n' * 100 + 'needle\n')
+        for path in self.root.rglob('*.py'):
+            backdate(path)
+        budget = ReadBudget(max_bytes=200)
+        self.assertEqual(TrigramIndex.read_trigrams(self.root / 'binary.py'), {UNREAD_GRAM})
+        self.assertIn(UNREAD_GRAM, TrigramIndex.read_trigrams(self.root / 'long.py', budget))
+        live = self.index.sync(str(self.root),
+                               self.paths('a.py', 'b.py', 'binary.py', 'long.py'), budget=budget)
+        self.assertEqual(self.matching(['absent'], live), ['binary.py', 'long.py'])
+
+        finder = ScriptFinder(self.tmp / 'cache')
+
+        def search(**options):
+            matches = finder.find_script(str(self.root), ['.py'], min_lines=1,
+                                         content_keywords=['needle'], **options)
+            return sorted(match['path'].name for match in matches)
+
+        # An index built under a tighter budget still finds what a wider one does
+        for budget in (budget, ReadBudget(skip_binary=False)):
+            with self.subTest(budget=budget):
+                self.assertEqual(search(use_trigram_index=True, budget=budget),
+                                 search(budget=budget))
+        self.assertEqual(search(use_trigram_index=True, budget=ReadBudget(skip_binary=False)),
+                         ['a.py', 'binary.py', 'long.py'])
+
+
+
+class NameIndexTest(unittest.TestCase):
+
+    def setUp(self):
+        self._tmp = tempfile.TemporaryDirectory()
+        self.tmp = Path(self._tmp.name)
+        self.root = self.tmp / 'tree'
+        rng = random.Random(25)
+        parts = ['train', 'lora', 'Model', 'util', 'x', 'eval', '_', '-', 'v2']
+        self.files = set()
+        for _ in range(300):
+            rel_dir = '/'.join(rng.choice(['a', 'b', 'ab']) for _ in range(rng.randint(0, 3)))
+            stem = ''.join(rng.choice(parts) for _ in range(rng.randint(1, 4)))
+            rel_path = os.path.join(rel_dir, stem + rng.choice(['.py', '.md']))
+            self.files.add(rel_path)
+        write_tree(self.root, dict.fromkeys(self.files, ''))
+
+    def tearDown(self):
+        self._tmp.cleanup()
+
+    def expected(self, pattern, subdir='', extension='.py'):
+        """Score every file's name directly."""
+        needle = pattern.lower().encode()
+        fuzzy = re.compile(b'.*?'.join(re.escape(needle[i:i + 1]) for i in range(len(needle))),
+                           re.DOTALL)
+        found = []
+        for rel_path in self.files:
+            name = os.path.basename(rel_path)
+            inside = os.path.relpath(rel_path, subdir or '.')
+            if not name.endswith(extension) or inside.startswith('..'):
+                continue
+            scored = name_score(needle, name.lower().encode(), fuzzy)
+            if scored is not None:
+                found.append((round(scored[0], 4), scored[1], inside))
+        return sorted(found)
+
+    def test_matches_scoring_every_name(self):
+        finder = ScriptFinder(self.tmp / 'cache')
+        # A list of more extensions covers the queries for fewer
+        finder.gather_files(str(self.root), ['.py', '.md'])
+        for pattern in ('lora', 'LoRA', 'trainx', 'tlv', 'Model_v2', 'x', 'eval.py', 'zzz'):
+            for subdir in ('', 'a', os.path.join('ab', 'b')):
+                with self.subTest(pattern=pattern, subdir=subdir):
+                    root = self.root / subdir
+                    matches = finder.find_names(str(root), pattern, ['.py'], limit=None)
+                    found = sorted((match['score'], match['kind'],
+                                    os.path.relpath(match['path'], root)) for match in matches)
+                    self.assertEqual(found, self.expected(pattern, subdir))
+                    self.assertEqual([match['score'] for match in matches],
+                                     sorted((match['score'] for match in matches), reverse=True))
+                    limited = finder.find_names(str(root), pattern, ['.py'], limit=5)
+                    self.assertEqual([match['score'] for match in limited],
+                                     [match['score'] for match in matches[:5]])
+
+
+if __name__ == '__main__':
+    unittest.main()
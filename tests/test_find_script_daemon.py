@@ -0,0 +1,146 @@
+"""
+Tests for the find_script index daemon (scripts/find_script_daemon.py).
+
+Each test starts a daemon on a temporary cache directory and socket, queries
+it through DaemonClient, changes the tree and checks that the next answers
+reflect the change, then shuts the daemon down. The command line is checked to
+search locally when asked for output the daemon cannot give. Run with:
+    python -m unittest discover -s tests -p 'test_find_script*.py'
+"""
+
+import contextlib
+import functools
+import io
+import json
+import os
+import socket
+import sys
+import tempfile
+import time
+import unittest
+from pathlib import Path
+from unittest import mock
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / 'scripts'))
+
+import find_script  # noqa: E402
+from find_script_daemon import DaemonClient, ScriptFinderDaemon  # noqa: E402
+from find_script_search import ScriptFinder  # noqa: E402
+
+
+def wait_for(predicate, timeout=10.0):
+    """Call predicate until it returns a true value or the timeout expires."""
+    deadline = time.monotonic() + timeout
+    while True:
+        value = predicate()
+        if value or time.monotonic() > deadline:
+            return value
+        time.sleep(0.05)
+
+
+@unittest.skipUnless(hasattr(socket, 'AF_UNIX'), 'Unix domain sockets are not available')
+class DaemonLifecycleTest(unittest.TestCase):
+    use_inotify = True
+    poll_interval = 30
+
+    def setUp(self):
+        self._tmp = tempfile.TemporaryDirectory()
+        base = Path(self._tmp.name)
+        self.root = base / 'tree'
+        self.cache_dir = base / 'cache'
+        self.socket_path = base / 'daemon.sock'
+        for rel_path, text in {
+            'a.py': 'import needle\n',
+            'pkg/b.py': 'x = 1\nneedle = 2\n',
+            'pkg/c.py': 'nothing here\n',
+            'pkg/notes.md': 'needle\n',
+        }.items():
+            self.write(rel_path, text)
+        self.daemon = ScriptFinderDaemon(cache_dir=self.cache_dir, socket_path=self.socket_path,
+                                         poll_interval=self.poll_interval,
+                                         use_inotify=self.use_inotify)
+        if self.use_inotify and self.daemon._inotify is None:
+            self.skipTest('inotify is not available')
+        self.daemon.start()
+        self.client = DaemonClient(self.socket_path)
+
+    def tearDown(self):
+        self.daemon.stop()
+        self._tmp.cleanup()
+
+    def write(self, rel_path, text):
+        path = self.root / rel_path
+        path.parent.mkdir(parents=True, exist_ok=True)
+        path.write_text(text)
+
+    def query(self):
+        return sorted(str(match['path'].relative_to(self.root))
+                      for match in self.client.iter_matches(self.root, ['.py'], min_lines=1,
+                                                            content_keywords=['needle']))
+
+    def test_query_change_and_stop(self):
+        self.assertTrue(self.client.ping())
+        self.assertEqual(self.query(), ['a.py', 'pkg/b.py'])
+        self.assertEqual(self.client.stats['cache']['status'], 'daemon')
+
+        # A new directory, a new file, an edited file and a deleted file
+        self.write('pkg/sub/d.py', 'needle\n')
+        self.write('pkg/c.py', 'now with a needle\n')
+        (self.root / 'a.py').unlink()
+        expected = ['pkg/b.py', 'pkg/c.py', 'pkg/sub/d.py']
+        wait_for(lambda: self.query() == expected)
+        self.assertEqual(self.query(), expected)
+
+        self.client.shutdown()
+        self.daemon.stop()
+        self.assertFalse(self.socket_path.exists())
+        self.assertFalse(self.client.ping())
+        # The hot file list is written back to the cache on shutdown
+        self.assertTrue(list(self.cache_dir.glob('*.sfc')))
+
+    def test_concurrent_clients(self):
+        # A client that connects and sends nothing must not hold up other queries
+        with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as idle:
+            idle.connect(str(self.socket_path))
+            self.assertEqual(self.query(), ['a.py', 'pkg/b.py'])
+
+    def run_main(self, *options):
+        """Run the command line search against the test daemon and return its stats."""
+        stats_path = Path(self._tmp.name) / 'stats.json'
+        argv = ['find_script.py', str(self.root), '--min-lines', '1', '--keywords', 'needle',
+                '--format', 'ndjson', '--stats-json', str(stats_path), *options]
+        output_path = Path(self._tmp.name) / 'matches.ndjson'
+        with open(output_path, 'w') as output, mock.patch.object(sys, 'argv', argv), \
+                mock.patch.object(find_script, 'DaemonClient',
+                                  functools.partial(DaemonClient, self.socket_path)), \
+                mock.patch.object(find_script, 'ScriptFinder',
+                                  functools.partial(ScriptFinder, self.cache_dir / 'local')), \
+                contextlib.redirect_stdout(output), contextlib.redirect_stderr(io.StringIO()):
+            find_script.main()
+        paths = sorted(Path(json.loads(line)['path']).relative_to(self.root).as_posix()
+                       for line in output_path.read_text().splitlines())
+        self.assertEqual(paths, ['a.py', 'pkg/b.py'])
+        return json.loads(stats_path.read_text())
+
+    def test_options_the_daemon_cannot_honour_run_locally(self):
+        self.assertEqual(self.run_main()['cache']['status'], 'daemon')
+        profile = str(Path(self._tmp.name) / 'scan.prof')
+        for options in (['--verbose'], ['--profile', profile], ['--jobs', '2', '--pool', 'process'],
+                        ['--gitignore'], ['--no-daemon']):
+            with self.subTest(options=options):
+                self.assertNotEqual(self.run_main(*options)['cache']['status'], 'daemon')
+        self.assertTrue(os.path.getsize(profile))
+
+    def test_unknown_command(self):
+        with self.assertRaises(RuntimeError):
+            list(self.client.request({'command': 'bogus'}))
+
+
+class PollingDaemonLifecycleTest(DaemonLifecycleTest):
+    """The same lifecycle with inotify off, relying on mtime polling."""
+    use_inotify = False
+    poll_interval = 0.1
+
+
+if __name__ == '__main__':
+    unittest.main()
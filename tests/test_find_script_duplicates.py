@@ -0,0 +1,288 @@
+"""
+Tests for duplicate and near-duplicate detection (scripts/find_script_duplicates.py).
+
+The groups found by --duplicates are compared with grouping every file by a
+hash of its whole content, MinHash estimates with the exact Jaccard similarity
+of the token shingles, and the pairs found through the LSH bands with
+comparing every pair of signatures. Run with:
+    python -m unittest discover -s tests -p 'test_find_script*.py'
+"""
+
+import hashlib
+import itertools
+import os
+import random
+import sys
+import tempfile
+import unittest
+from pathlib import Path
+from unittest import mock
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / 'scripts'))
+
+import find_script_duplicates  # noqa: E402
+from find_script_duplicates import (  # noqa: E402
+    DUPLICATE_BLOCK_SIZE, LSH_RECALL, MINHASH_SHINGLE_SIZE, MINHASH_SLOTS, TOKEN_PATTERN,
+    LSHIndex, content_fingerprint, lsh_bands, minhash_file, partial_digest,
+    signature_similarity)
+from find_script_search import ScriptFinder  # noqa: E402
+
+
+def blob_id(data):
+    return hashlib.sha1(b'blob %d\0' % len(data) + data).hexdigest()
+
+
+def shingles(data):
+    tokens = TOKEN_PATTERN.findall(data)
+    return set(zip(*(tokens[i:] for i in range(MINHASH_SHINGLE_SIZE))))
+
+
+def jaccard(data, other):
+    first, second = shingles(data), shingles(other)
+    return len(first & second) / len(first | second)
+
+
+def edited(rng, words, edits):
+    """Return a copy of a word list with some words replaced."""
+    words = list(words)
+    for _ in range(edits):
+        words[rng.randrange(len(words))] = f'edit{rng.randrange(10 ** 6)}'
+    return words
+
+
+def source(words):
+    return '\n'.join(' '.join(words[i:i + 8]) for i in range(0, len(words), 8)).encode()
+
+
+class DigestTest(unittest.TestCase):
+
+    def setUp(self):
+        self._tmp = tempfile.TemporaryDirectory()
+        self.tmp = Path(self._tmp.name)
+
+    def tearDown(self):
+        self._tmp.cleanup()
+
+    def test_small_files_get_their_fingerprint(self):
+        path = self.tmp / 'a.py'
+        data = b'x = 1\n' * 100
+        path.write_bytes(data)
+        self.assertEqual(partial_digest(path, len(data)), (True, blob_id(data), len(data)))
+        self.assertEqual(content_fingerprint(path, len(data)), blob_id(data))
+
+    def test_large_files_hash_both_ends(self):
+        head, tail = b'h' * DUPLICATE_BLOCK_SIZE, b't' * DUPLICATE_BLOCK_SIZE
+        first, second = self.tmp / 'first.py', self.tmp / 'second.py'
+        first.write_bytes(head + b'a' * 100 + tail)
+        second.write_bytes(head + b'b' * 100 + tail)
+        size = 2 * DUPLICATE_BLOCK_SIZE + 100
+        # The middle is not read, so both digests agree until hashed in full
+        is_full, digest, bytes_read = partial_digest(first, size)
+        self.assertEqual((is_full, bytes_read), (False, 2 * DUPLICATE_BLOCK_SIZE))
+        self.assertEqual(partial_digest(second, size)[1], digest)
+        self.assertNotEqual(content_fingerprint(first, size), content_fingerprint(second, size))
+
+    def test_changed_size(self):
+        path = self.tmp / 'a.py'
+        path.write_bytes(b'x' * 10)
+        self.assertIsNone(partial_digest(path, 11))
+        self.assertIsNone(content_fingerprint(path, 9))
+        self.assertIsNone(partial_digest(self.tmp / 'missing.py', 10))
+
+
+class DuplicateSearchTest(unittest.TestCase):
+
+    def setUp(self):
+        self._tmp = tempfile.TemporaryDirectory()
+        self.tmp = Path(self._tmp.name)
+        self.root = self.tmp / 'tree'
+        rng = random.Random(22)
+        block = DUPLICATE_BLOCK_SIZE
+        contents = [b'', b'x\n', b'y\n', b'print(1)\n' * 50,
+                    b'h' * block + b'a' * 50 + b't' * block,
+                    b'h' * block + b'b' * 50 + b't' * block]
+        for i in range(40):
+            path = self.root / f'd{i % 4}' / f'f{i}.py'
+            path.parent.mkdir(parents=True, exist_ok=True)
+            path.write_bytes(rng.choice(contents))
+        (self.root / 'unique.py').write_bytes(b'only one of these\n')
+        # A hard link is the same file, not a copy
+        os.link(self.root / 'd0' / 'f0.py', self.root / 'd0' / 'link.py')
+
+    def tearDown(self):
+        self._tmp.cleanup()
+
+    def expected_groups(self):
+        by_content = {}
+        for path in sorted(self.root.rglob('*.py')):
+            if path.name != 'link.py' and path.stat().st_size:
+                by_content.setdefault(path.read_bytes(), []).append(str(path))
+        return sorted(paths for paths in by_content.values() if len(paths) > 1)
+
+    def found_groups(self, **options):
+        finder = ScriptFinder(self.tmp / 'cache')
+        groups = list(finder.iter_duplicates(str(self.root), ['.py'], **options))
+        for group in groups:
+            with open(group['paths'][0], 'rb') as f:
+                self.assertEqual(group['fingerprint'], blob_id(f.read()))
+        # Either name of the hard-linked file may be the one kept
+        link, target = str(self.root / 'd0' / 'link.py'), str(self.root / 'd0' / 'f0.py')
+        return sorted(sorted(target if str(path) == link else str(path) for path in group['paths'])
+                      for group in groups)
+
+    def test_matches_full_hashes(self):
+        expected = self.expected_groups()
+        self.assertEqual(len(expected), 5)
+        for jobs in (1, 4):
+            with self.subTest(jobs=jobs):
+                self.assertEqual(self.found_groups(jobs=jobs), expected)
+
+    def test_limit(self):
+        self.assertEqual(len(self.found_groups(limit=2)), 2)
+
+
+
+class MinHashTest(unittest.TestCase):
+
+    def setUp(self):
+        self._tmp = tempfile.TemporaryDirectory()
+        self.tmp = Path(self._tmp.name)
+        self.rng = random.Random(23)
+        self.words = [f'w{self.rng.randrange(500)}' for _ in range(400)]
+
+    def tearDown(self):
+        self._tmp.cleanup()
+
+    def signature(self, data, name='a.py'):
+        path = self.tmp / name
+        path.write_bytes(data)
+        return minhash_file(path)['signature']
+
+    def test_chunk_size_does_not_change_the_result(self):
+        data = source(self.words) + b'\r\nx = (1, 2)\r\n'
+        path = self.tmp / 'a.py'
+        path.write_bytes(data)
+        expected = minhash_file(path)
+        self.assertEqual(expected['fingerprint'], blob_id(data))
+        self.assertEqual(expected['line_count'], data.count(b'\n'))
+        self.assertEqual(len(expected['signature']), 4 * MINHASH_SLOTS)
+        for chunk_size in (1, 3, 7, 64):
+            with mock.patch.object(find_script_duplicates, 'SCAN_CHUNK_SIZE', chunk_size):
+                result = minhash_file(path)
+            for key in ('fingerprint', 'line_count', 'signature'):
+                self.assertEqual(result[key], expected[key], (chunk_size, key))
+
+    def test_whitespace_is_not_an_edit(self):
+        data = source(self.words)
+        reflowed = b'    ' + b'\n\t'.join(data.split())
+        self.assertEqual(self.signature(data), self.signature(reflowed, 'b.py'))
+
+    def test_estimates_jaccard_similarity(self):
+        data = source(self.words)
+        for edits in (0, 5, 20, 60, 200):
+            other = source(edited(self.rng, self.words, edits))
+            estimate = signature_similarity(self.signature(data), self.signature(other, 'b.py'))
+            self.assertAlmostEqual(estimate, jaccard(data, other), delta=0.12, msg=edits)
+
+    def test_short_binary_and_empty_files(self):
+        self.assertEqual(len(self.signature(b'x = 1')), 4 * MINHASH_SLOTS)
+        self.assertEqual(self.signature(b'  \n'), b'')
+        path = self.tmp / 'binary.py'
+        path.write_bytes(b'x\0y' * 10)
+        result = minhash_file(path)
+        self.assertEqual(result['limited'], 'binary')
+        self.assertIsNone(result['signature'])
+
+    def test_cached_signature_is_used_for_unchanged_files(self):
+        path = self.tmp / 'a.py'
+        path.write_bytes(source(self.words))
+        stat_result = path.stat()
+        entry = (stat_result.st_size, stat_result.st_mtime_ns, stat_result.st_ino, 50, 'f' * 40)
+        result = minhash_file(path, entry, b'cached')
+        self.assertTrue(result['cached'])
+        self.assertEqual((result['signature'], result['bytes_read']), (b'cached', None))
+        stale = (stat_result.st_size + 1,) + entry[1:]
+        self.assertNotEqual(minhash_file(path, stale, b'cached')['signature'], b'cached')
+
+
+class LSHTest(unittest.TestCase):
+
+    def test_bands_reach_the_recall(self):
+        for threshold in (0.5, 0.8, 0.95):
+            bands, rows = lsh_bands(threshold)
+            self.assertLessEqual(bands * rows, MINHASH_SLOTS)
+            self.assertGreaterEqual(1 - (1 - threshold ** rows) ** bands, LSH_RECALL)
+            # One more row per band would fall short of it
+            more = MINHASH_SLOTS // (rows + 1)
+            self.assertLess(1 - (1 - threshold ** (rows + 1)) ** more, LSH_RECALL)
+
+    def test_candidates_share_a_band(self):
+        index = LSHIndex(0.8)
+        width = 4 * index.rows
+        base = bytes(range(256)) * 2
+        index.add(0, base)
+        index.add(1, bytes(width) + base[width:])
+        index.add(2, bytes(4 * MINHASH_SLOTS))
+        self.assertEqual(index.candidates(base), [0, 1])
+        self.assertEqual(index.candidates(bytes(4 * MINHASH_SLOTS)), [1, 2])
+
+
+class NearDuplicateSearchTest(unittest.TestCase):
+
+    def setUp(self):
+        self._tmp = tempfile.TemporaryDirectory()
+        self.tmp = Path(self._tmp.name)
+        self.root = self.tmp / 'tree'
+        self.root.mkdir()
+        rng = random.Random(123)
+        for family in range(4):
+            words = [f'f{family}w{rng.randrange(300)}' for _ in range(300)]
+            for copy in range(5):
+                data = source(edited(rng, words, rng.choice((1, 3, 10, 40))))
+                (self.root / f'f{family}_{copy}.py').write_bytes(data)
+        (self.root / 'empty.py').write_bytes(b'')
+        for path in self.root.iterdir():
+            mtime = path.stat().st_mtime - 3600
+            os.utime(path, (mtime, mtime))
+
+    def tearDown(self):
+        self._tmp.cleanup()
+
+    def all_pairs(self, threshold):
+        signatures = {path.name: minhash_file(path)['signature']
+                      for path in sorted(self.root.glob('*.py')) if path.stat().st_size}
+        return {frozenset(pair) for pair in itertools.combinations(signatures, 2)
+                if signature_similarity(signatures[pair[0]], signatures[pair[1]]) >= threshold}
+
+    def test_pairs_match_comparing_every_pair(self):
+        expected = self.all_pairs(0.8)
+        certain = self.all_pairs(0.9)
+        self.assertTrue(certain)
+        for use_cache in (True, True, False):
+            finder = ScriptFinder(self.tmp / 'cache')
+            pairs = list(finder.iter_near_duplicates(str(self.root), ['.py'],
+                                                     use_cache=use_cache))
+            found = {frozenset(Path(path).name for path in pair['paths']) for pair in pairs}
+            # The bands may miss pairs close to the threshold, but not far above it
+            self.assertLessEqual(found, expected)
+            self.assertLessEqual(certain, found)
+            self.assertTrue(all(pair['similarity'] >= 0.8 for pair in pairs))
+        self.assertEqual(finder.stats.counters['files_cached'], 0)
+
+    def test_similar_to(self):
+        query = self.root / 'f0_0.py'
+        expected = sorted(name for pair in self.all_pairs(0.8) if query.name in pair
+                          for name in pair - {query.name})
+        finder = ScriptFinder(self.tmp / 'cache')
+        found = sorted(Path(match['path']).name
+                       for match in finder.iter_similar(str(query), str(self.root), ['.py']))
+        self.assertTrue(expected)
+        self.assertEqual(found, expected)
+        # A second search reads signatures from the file index
+        list(finder.iter_similar(str(query), str(self.root), ['.py']))
+        self.assertEqual(finder.stats.counters['files_cached'], 21)
+        self.assertEqual(finder.stats.counters['files_opened'], 0)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,223 @@
+"""
+Tests for keyword matching and the streaming scanner (scripts/find_script_scan.py).
+
+scan_stream is checked against a plain reference implementation with tiny
+chunk sizes, so keywords, line breaks and regex matches that span chunks are
+exercised, along with regexes anchored at chunk edges that are not line edges.
+Run with:
+    python -m unittest discover -s tests -p 'test_find_script*.py'
+"""
+
+import hashlib
+import io
+import random
+import re
+import sys
+import unittest
+from pathlib import Path
+from unittest import mock
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / 'scripts'))
+
+import find_script_scan  # noqa: E402
+from find_script_scan import (  # noqa: E402
+    SCAN_QUEUE_DEPTH, KeywordMatcher, ReadBudget, fold_case, ordered_map, scan_stream)
+
+CHUNK_SIZES = (1, 2, 3, 7, 64)
+WORDS = ['alpha', 'lora', 'LoRA', 'model', 'x', 'café', 'loooora', '\n', '\r\n', '\r', ' ']
+
+
+def reference_lines(data):
+    """Line count as readlines() in text mode would give it."""
+    return len(io.TextIOWrapper(io.BytesIO(data), encoding='latin-1', newline=None).readlines())
+
+
+def reference_keywords(data, keywords):
+    text = data.decode('utf-8', 'ignore').lower()
+    matched = []
+    for keyword in keywords:
+        if keyword.startswith('re:'):
+            if re.search(keyword[3:], text, re.IGNORECASE | re.MULTILINE):
+                matched.append(keyword)
+        elif keyword.lower() in text:
+            matched.append(keyword)
+    return matched
+
+
+def scan(data, keywords, chunk_size, min_lines=10 ** 9, **options):
+    matcher = KeywordMatcher(keywords)
+    with mock.patch.object(find_script_scan, 'SCAN_CHUNK_SIZE', chunk_size):
+        return scan_stream(io.BytesIO(data), min_lines, matcher, size=len(data), **options)
+
+
+class ScanStreamTest(unittest.TestCase):
+
+    def random_data(self, rng):
+        return ''.join(rng.choice(WORDS) for _ in range(rng.randint(0, 40))).encode('utf-8')
+
+    def test_matches_reference(self):
+        rng = random.Random(5)
+        keyword_sets = [['lora', 'model'], ['LoRA'], ['re:lo+ra', 'alpha'], ['café', 'model'],
+                        ['absent'], ['lora', 'loooora', 're:mod.l']]
+        for trial in range(300):
+            data = self.random_data(rng)
+            keywords = keyword_sets[trial % len(keyword_sets)]
+            for chunk in CHUNK_SIZES:
+                with self.subTest(data=data, keywords=keywords, chunk_size=chunk):
+                    lines, exact, matched, fingerprint, _, limited = scan(data, keywords, chunk)
+                    self.assertEqual(lines, reference_lines(data))
+                    self.assertTrue(exact)
+                    self.assertIsNone(limited)
+                    self.assertEqual(matched, reference_keywords(data, keywords))
+                    blob = b'blob %d\0' % len(data) + data
+                    self.assertEqual(fingerprint, hashlib.sha1(blob).hexdigest())
+
+    def test_regex_anchors(self):
+        rng = random.Random(8)
+        words = [word for word in WORDS if word.isascii()]
+        keywords = ['re:^lo+ra', 're:model$', 're:^$', 're:\\balpha\\b', 're:x\\s+lora']
+        for trial in range(200):
+            data = ''.join(rng.choice(words) for _ in range(rng.randint(0, 40))).encode()
+            text = data.decode().lower()
+            expected = {keyword: len(re.findall(keyword[3:], text, re.MULTILINE))
+                        for keyword in keywords}
+            for chunk_size in CHUNK_SIZES:
+                with self.subTest(data=data, chunk_size=chunk_size):
+                    matcher = KeywordMatcher(keywords)
+                    counts = {}
+                    with mock.patch.object(find_script_scan, 'SCAN_CHUNK_SIZE', chunk_size):
+                        matched = scan_stream(io.BytesIO(data), 1, matcher, counts=counts,
+                                              size=len(data))[2]
+                    self.assertEqual(matched, reference_keywords(data, keywords))
+                    self.assertEqual(matcher.counts_for(counts),
+                                     {keyword: n for keyword, n in expected.items() if n})
+        # The line a chunk edge falls in is not taken to start or end there
+        for chunk_size in CHUNK_SIZES:
+            self.assertEqual(scan(b'a\nfoo\n', ['re:^foo'], chunk_size)[2], ['re:^foo'])
+            self.assertEqual(scan(b'afoo\nfoob\n', ['re:^foo$'], chunk_size)[2], [])
+
+    def test_stops_once_everything_is_found(self):
+        data = b'lora\nmodel\n' + b'filler\n' * 1000
+        lines, exact, matched, fingerprint, _, _ = scan(data, ['lora', 'model'], 16, min_lines=3)
+        self.assertEqual(matched, ['lora', 'model'])
+        self.assertFalse(exact)
+        self.assertGreaterEqual(lines, 3)
+        self.assertLess(lines, 1002)
+        self.assertIsNone(fingerprint)
+
+    def test_counts(self):
+        data = b'LoRA lora\nmodel lorax\r\nLORA'
+        for chunk_size in CHUNK_SIZES:
+            matcher = KeywordMatcher(['lora', 'model', 'absent'])
+            counts = {}
+            with mock.patch.object(find_script_scan, 'SCAN_CHUNK_SIZE', chunk_size):
+                scan_stream(io.BytesIO(data), 1, matcher, counts=counts, size=len(data))
+            self.assertEqual(matcher.counts_for(counts), {'lora': 4, 'model': 1})
+
+    def test_snippets(self):
+        data = b'one\ntwo\nthree LoRA here\nfour\nfive\n'
+        for chunk_size in CHUNK_SIZES:
+            matcher = KeywordMatcher(['lora'])
+            snippets = {}
+            with mock.patch.object(find_script_scan, 'SCAN_CHUNK_SIZE', chunk_size):
+                scan_stream(io.BytesIO(data), 1, matcher, snippets=snippets, context=1,
+                            size=len(data))
+            snippet, = matcher.snippets_for(snippets)
+            self.assertEqual((snippet['keyword'], snippet['line']), ('lora', 3))
+        # Context does not reach past the chunk holding the hit, so it is only
+        # complete when the chunk holds it
+        self.assertEqual(snippet['context'], [[2, 'two'], [3, 'three LoRA here'], [4, 'four']])
+
+    def test_changed_size_gives_no_fingerprint(self):
+        matcher = KeywordMatcher(['lora'])
+        result = scan_stream(io.BytesIO(b'lora\n'), 1, matcher, size=99)
+        self.assertTrue(result[1])
+        self.assertIsNone(result[3])
+
+
+class FoldCaseTest(unittest.TestCase):
+
+    def test_keeps_length(self):
+        self.assertEqual(fold_case('LoRA'), 'lora')
+        self.assertEqual(fold_case(b'LoRA'), b'lora')
+        # 'İ'.lower() is two characters long; folding keeps it to one
+        self.assertEqual(fold_case('İSTANBUL'), 'istanbul')
+        self.assertEqual(len(fold_case('xİ' * 50)), 100)
+
+    def test_snippet_lines_after_expanding_characters(self):
+        # A non-ASCII keyword puts the matcher in text mode
+        data = ('İ' * 40 + '\nsecond\nthird LoRA\ncafé\n').encode('utf-8')
+        for chunk_size in CHUNK_SIZES:
+            matcher = KeywordMatcher(['lora', 'café'])
+            snippets = {}
+            with mock.patch.object(find_script_scan, 'SCAN_CHUNK_SIZE', chunk_size):
+                scan_stream(io.BytesIO(data), 1, matcher, snippets=snippets, context=0,
+                            size=len(data))
+            lines = {snippet['keyword']: snippet['line']
+                     for snippet in matcher.snippets_for(snippets)}
+            self.assertEqual(lines, {'lora': 3, 'café': 4}, chunk_size)
+        self.assertEqual(matcher.snippets_for(snippets)[0]['context'], [[3, 'third LoRA']])
+
+
+class ReadBudgetTest(unittest.TestCase):
+
+    def test_binary_files_are_skipped(self):
+        data = b'lora\0\1\2\n' * 10
+        self.assertEqual(scan(data, ['lora'], 64)[5], 'binary')
+        lines, _, matched, _, _, limited = scan(data, ['lora'], 64,
+                                                budget=ReadBudget(skip_binary=False))
+        self.assertEqual((lines, matched, limited), (10, ['lora'], None))
+
+    def test_max_bytes(self):
+        data = b'0123456\n' * 10
+        for chunk_size in CHUNK_SIZES:
+            lines, exact, _, fingerprint, _, limited = scan(data, ['absent'], chunk_size,
+                                                            budget=ReadBudget(max_bytes=20))
+            self.assertEqual((lines, exact, fingerprint, limited), (3, False, None, 'max_bytes'))
+            # A file that fits the budget exactly is not truncated
+            self.assertIsNone(scan(data, ['absent'], chunk_size,
+                                   budget=ReadBudget(max_bytes=len(data)))[5])
+
+    def test_max_lines_matches_reference(self):
+        rng = random.Random(17)
+        for _ in range(300):
+            data = b''.join(rng.choice([b'ab', b'\r\n', b'\n', b'\r', b'\r\n\r\n'])
+                            for _ in range(rng.randint(1, 30)))
+            total = reference_lines(data)
+            max_lines = rng.randint(1, total + 1)
+            for chunk_size in CHUNK_SIZES:
+                with self.subTest(data=data, max_lines=max_lines, chunk_size=chunk_size):
+                    lines, _, _, _, _, limited = scan(data, ['absent'], chunk_size,
+                                                      budget=ReadBudget(max_lines=max_lines))
+                    self.assertEqual(lines, min(total, max_lines))
+                    if total > max_lines:
+                        self.assertEqual(limited, 'max_lines')
+
+
+class OrderedMapTest(unittest.TestCase):
+
+    def test_results_keep_their_order(self):
+        items = [(n, 3) for n in range(200)]
+        expected = [pow(*item) for item in items]
+        for jobs, pool in ((1, 'thread'), (4, 'thread'), (2, 'process')):
+            with self.subTest(jobs=jobs, pool=pool):
+                self.assertEqual(list(ordered_map(pow, items, jobs, pool)), expected)
+
+    def test_items_are_pulled_as_results_are_taken(self):
+        pulled = []
+
+        def items():
+            for n in range(1000):
+                pulled.append(n)
+                yield (n, 2)
+
+        results = ordered_map(pow, items(), 4)
+        self.assertEqual(next(results), 0)
+        # At most a few calls per worker are queued ahead of the consumer
+        self.assertLessEqual(len(pulled), 4 * SCAN_QUEUE_DEPTH)
+        results.close()
+        self.assertLess(len(pulled), 1000)
+
+
+if __name__ == '__main__':
+    unittest.main()
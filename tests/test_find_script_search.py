@@ -0,0 +1,601 @@
+"""
+Tests for the search itself (scripts/find_script_search.py).
+
+--top is compared with ranking every match, parallel scans in thread and
+process pools with a serial scan, regex keywords and path globs with a plain
+scan, and --limit with the start of a full search. The ndjson, tsv and null
+output of the command line is parsed back and compared with the tree, and
+size and mtime filters with checking every file.
+The --stats counters and eliminations are checked on a tree where each is known.
+The early exit of a scan and other read limits are checked not to leave
+results in the cache that a scan with other options would not give, and the
+benchmark's phases and JSON results are checked on a small tree. Run with:
+    python -m unittest discover -s tests -p 'test_find_script*.py'
+"""
+
+import argparse
+import collections
+import contextlib
+import cProfile
+import io
+import json
+import os
+import pstats
+import random
+import re
+import subprocess
+import sys
+import tempfile
+import time
+import unittest
+from pathlib import Path
+from unittest import mock
+
+SCRIPTS = Path(__file__).resolve().parent.parent / 'scripts'
+sys.path.insert(0, str(SCRIPTS))
+
+import find_script_benchmark  # noqa: E402
+import find_script_scan  # noqa: E402
+from find_script import parse_size, parse_time  # noqa: E402
+from find_script_scan import ReadBudget, StatFilter  # noqa: E402
+from find_script_search import ScriptFinder, SearchStats  # noqa: E402
+
+KEYWORDS = ['lora', 'model', 're:ran+k']
+
+
+def backdate(path, seconds=3600):
+    mtime = time.time() - seconds
+    os.utime(path, (mtime, mtime))
+
+
+class TopRankingTest(unittest.TestCase):
+
+    def setUp(self):
+        self._tmp = tempfile.TemporaryDirectory()
+        self.tmp = Path(self._tmp.name)
+
+    def tearDown(self):
+        self._tmp.cleanup()
+
+    def random_tree(self, root, rng):
+        """
+        Write a tree whose directories each favour other keywords, so that
+        how rare a keyword looks shifts as the scan moves between them.
+        """
+        words = ['lora', 'model', 'rank', 'rannk', 'filler', 'other', 'x = 1']
+        for d in range(6):
+            weights = [rng.choice((0, 1, 5)) for _ in range(4)] + [30, 30, 30]
+            for i in range(rng.randint(5, 40)):
+                path = root / f'd{d}' / f'f{i}.py'
+                path.parent.mkdir(parents=True, exist_ok=True)
+                count = int(rng.expovariate(1 / 100)) + 1
+                path.write_text('\n'.join(rng.choices(words, weights, k=count)) + '\n')
+                backdate(path)
+
+    def ranked(self, root, top, **options):
+        finder = ScriptFinder(self.tmp / 'cache')
+        matches = finder.find_script(str(root), ['.py'], min_lines=1,
+                                     content_keywords=KEYWORDS, top=top, **options)
+        return [(match['score'], str(match['path'])) for match in matches]
+
+    def test_matches_ranking_everything(self):
+        rng = random.Random(13)
+        for tree in range(8):
+            root = self.tmp / f'tree{tree}'
+            self.random_tree(root, rng)
+            everything = self.ranked(root, 10 ** 6, use_cache=False)
+            scores = {path: score for score, path in everything}
+            for top in (1, 3, 10):
+                for options in ({'use_cache': False}, {'jobs': 4}, {}):
+                    with self.subTest(tree=tree, top=top, **options):
+                        found = self.ranked(root, top, **options)
+                        self.assertEqual([score for score, _ in found],
+                                         [score for score, _ in everything[:top]])
+                        for score, path in found:
+                            self.assertEqual(scores[path], score)
+
+    def test_files_are_stat_once_when_indexed(self):
+        # Sizes for the collection statistics come from the file index
+        root = self.tmp / 'tree'
+        self.random_tree(root, random.Random(7))
+        expected = self.ranked(root, 3)
+        stat_calls = collections.Counter()
+        real_stat = os.stat
+
+        def counting_stat(path, *args, **kwargs):
+            stat_calls[str(path)] += 1
+            return real_stat(path, *args, **kwargs)
+
+        with mock.patch('os.stat', counting_stat):
+            self.assertEqual(self.ranked(root, 3), expected)
+        scanned = [path for path in stat_calls if path.endswith('.py')]
+        self.assertTrue(scanned)
+        self.assertEqual(max(stat_calls[path] for path in scanned), 1)
+
+
+class ParallelScanTest(unittest.TestCase):
+
+    def setUp(self):
+        self._tmp = tempfile.TemporaryDirectory()
+        self.tmp = Path(self._tmp.name)
+        self.root = self.tmp / 'tree'
+        rng = random.Random(4)
+        for i in range(80):
+            path = self.root / f'd{i % 5}' / f'f{i}.py'
+            path.parent.mkdir(parents=True, exist_ok=True)
+            words = rng.choices(['lora', 'model', 'filler', 'x = 1'], [1, 1, 20, 20],
+                                k=rng.randint(0, 60))
+            path.write_text('\n'.join(words) + '\n')
+            backdate(path)
+
+    def tearDown(self):
+        self._tmp.cleanup()
+
+    def search(self, **options):
+        finder = ScriptFinder(self.tmp / 'cache')
+        progress = io.StringIO()
+        with contextlib.redirect_stdout(progress):
+            matches = finder.find_script(str(self.root), ['.py'], min_lines=20,
+                                         content_keywords=['lora', 'model'], verbose=True,
+                                         **options)
+        # Per-file progress lines are printed from the calling thread, in order
+        verdicts = [line for line in progress.getvalue().splitlines()
+                    if line.startswith(('✅', '⏩'))]
+        return [(str(match['path']), match['line_count'], match['matched_keywords'])
+                for match in matches], verdicts
+
+    def test_pools_match_a_serial_scan(self):
+        expected, verdicts = self.search(use_cache=False)
+        self.assertTrue(expected)
+        self.assertEqual(len(verdicts), 80)
+        for options in ({'jobs': 4}, {'jobs': 4, 'pool': 'process'}, {'jobs': 3},
+                        {'jobs': 3, 'pool': 'process'}):
+            with self.subTest(**options):
+                self.assertEqual(self.search(use_cache=False, **options), (expected, verdicts))
+                # The second search reads line counts from the file index
+                self.assertEqual(self.search(**options)[0], expected)
+
+
+class PatternSearchTest(unittest.TestCase):
+
+    KEYWORDS = ['re:^def train_\\w+', 're:lo+ra$', 'model']
+
+    def setUp(self):
+        self._tmp = tempfile.TemporaryDirectory()
+        self.tmp = Path(self._tmp.name)
+        self.root = self.tmp / 'tree'
+        rng = random.Random(9)
+        lines = ['def train_model():', '    def train_step():', 'x = LOORA', 'lora = 1',
+                 'pass', 'import model']
+        for i in range(60):
+            name = f"{rng.choice(['train_', 'util_'])}{i}.py"
+            path = self.root / f'd{i % 3}' / f's{i % 2}' / name
+            path.parent.mkdir(parents=True, exist_ok=True)
+            path.write_text('\n'.join(rng.choices(lines, k=rng.randint(1, 8))) + '\n')
+            backdate(path)
+
+    def tearDown(self):
+        self._tmp.cleanup()
+
+    def expected(self, keep):
+        expected = []
+        for path in sorted(self.root.rglob('*.py')):
+            if not keep(path.relative_to(self.root)):
+                continue
+            text = path.read_text()
+            matched = [keyword for keyword in self.KEYWORDS
+                       if (re.search(keyword[3:], text, re.IGNORECASE | re.MULTILINE)
+                           if keyword.startswith('re:') else keyword in text.lower())]
+            if matched:
+                expected.append((str(path), matched))
+        return expected
+
+    def test_regex_keywords_and_path_globs(self):
+        cases = [
+            (None, lambda path: True),
+            (['**/train_*.py'], lambda path: path.name.startswith('train_')),
+            (['d1/**/*.py', 'd2/s0/util_*.py'],
+             lambda path: path.parts[0] == 'd1' or str(path.parent) == os.path.join('d2', 's0')
+             and path.name.startswith('util_')),
+        ]
+        for path_globs, keep in cases:
+            expected = self.expected(keep)
+            self.assertTrue(expected)
+            for options in ({'use_cache': False}, {}, {'use_trigram_index': True}, {'jobs': 3}):
+                with self.subTest(path_globs=path_globs, **options):
+                    finder = ScriptFinder(self.tmp / 'cache')
+                    matches = finder.find_script(str(self.root), ['.py'], min_lines=1,
+                                                 content_keywords=self.KEYWORDS,
+                                                 path_globs=path_globs, **options)
+                    self.assertEqual(sorted((str(match['path']), match['matched_keywords'])
+                                            for match in matches), expected)
+
+
+class LimitTest(unittest.TestCase):
+
+    def setUp(self):
+        self._tmp = tempfile.TemporaryDirectory()
+        self.tmp = Path(self._tmp.name)
+        self.root = self.tmp / 'tree'
+        for i in range(30):
+            path = self.root / f'd{i:02d}' / 'train.py'
+            path.parent.mkdir(parents=True)
+            path.write_text('import lora\n' * 3)
+            backdate(path)
+
+    def tearDown(self):
+        self._tmp.cleanup()
+
+    def search(self, **options):
+        finder = ScriptFinder(self.tmp / 'cache')
+        matches = finder.iter_matches(str(self.root), ['.py'], min_lines=1,
+                                      content_keywords=['lora'], **options)
+        return finder, matches
+
+    def test_first_match_arrives_before_the_walk_ends(self):
+        finder, matches = self.search()
+        first = next(matches)
+        self.assertEqual(first['matched_keywords'], ['lora'])
+        self.assertLess(finder.stats.counters['dirs_visited'], 31)
+        matches.close()
+        # A walk cut short does not replace the cache
+        self.assertEqual(list((self.tmp / 'cache').glob('*.sfc')), [])
+
+    def test_limit_stops_the_walk_and_the_scan(self):
+        finder, matches = self.search()
+        everything = [str(match['path']) for match in matches]
+        self.assertEqual(len(everything), 30)
+        for options in ({'use_cache': False}, {}, {'jobs': 4}):
+            with self.subTest(**options):
+                finder, matches = self.search(limit=3, **options)
+                self.assertEqual([str(match['path']) for match in matches], everything[:3])
+                self.assertEqual(finder.stats.counters['matches'], 3)
+                self.assertLess(finder.stats.counters['files_listed'], 30)
+
+
+class SearchStatsTest(unittest.TestCase):
+
+    def setUp(self):
+        self._tmp = tempfile.TemporaryDirectory()
+        self.tmp = Path(self._tmp.name)
+        self.root = self.tmp / 'tree'
+        files = {
+            'train.py': 'import lora\n' + 'x = 1\n' * 20,
+            'pkg/long.py': 'y = 2\n' * 30,
+            'pkg/short.py': 'z\n',
+            'pkg/notes.md': 'lora\n' * 30,
+            'node_modules/dep.py': 'lora\n' * 30,
+        }
+        for rel_path, text in files.items():
+            path = self.root / rel_path
+            path.parent.mkdir(parents=True, exist_ok=True)
+            path.write_text(text)
+            backdate(path)
+
+    def tearDown(self):
+        self._tmp.cleanup()
+
+    def search(self, stats):
+        finder = ScriptFinder(self.tmp / 'cache')
+        matches = finder.find_script(str(self.root), ['.py'], min_lines=10,
+                                     content_keywords=['lora'], stats=stats)
+        self.assertEqual([match['path'].name for match in matches], ['train.py'])
+        return json.loads(json.dumps(stats.as_dict()))
+
+    def test_counters_and_phases(self):
+        stats = self.search(SearchStats())
+        self.assertEqual(stats['cache']['status'], 'miss')
+        self.assertLessEqual({'walk', 'cache_write', 'scan'}, set(stats['phases']))
+        counters = stats['counters']
+        self.assertEqual((counters['dirs_visited'], counters['dirs_listed'],
+                          counters['dirs_pruned']), (2, 2, 1))
+        self.assertEqual((counters['files_listed'], counters['files_stat'],
+                          counters['files_opened'], counters['matches']), (3, 3, 2, 1))
+        sizes = [(self.root / name).stat().st_size for name in ('train.py', 'pkg/long.py')]
+        self.assertEqual(counters['bytes_read'], sum(sizes))
+        # short.py is ruled out by its size, long.py by its content
+        self.assertEqual(stats['eliminated'], {'extension': 1, 'path': 0, 'stat': 1,
+                                               'lines': 0, 'keywords': 1})
+
+        # A warm search answers from the cached list and the file index
+        stats = self.search(SearchStats())
+        self.assertEqual(stats['cache']['status'], 'hit')
+        self.assertGreaterEqual(stats['cache']['age_hours'], 0)
+        counters = stats['counters']
+        self.assertEqual((counters['dirs_listed'], counters['files_opened'],
+                          counters['bytes_read'], counters['files_cached']), (0, 0, 0, 2))
+
+    def test_profile_of_the_scan_loop(self):
+        stats = SearchStats(profiler=cProfile.Profile())
+        self.search(stats)
+        profile_path = self.tmp / 'scan.prof'
+        stats.dump_profile(profile_path)
+        functions = {(Path(filename).name, name)
+                     for filename, _, name in pstats.Stats(str(profile_path)).stats}
+        self.assertIn(('find_script_scan.py', 'scan_file'), functions)
+        # The file index is loaded before the scan loop starts, unprofiled
+        self.assertNotIn(('find_script_cache.py', 'load'), functions)
+
+
+class OutputFormatTest(unittest.TestCase):
+
+    def setUp(self):
+        self._tmp = tempfile.TemporaryDirectory()
+        self.tmp = Path(self._tmp.name)
+        self.root = self.tmp / 'tree'
+        self.texts = {
+            'a.py': 'import lora\n' * 3,
+            'pkg/b.py': 'model = lora\n',
+            'pkg/odd\tname\n.py': 'lora\n',
+            'pkg/none.py': 'nothing\n',
+        }
+        for rel_path, text in self.texts.items():
+            path = self.root / rel_path
+            path.parent.mkdir(parents=True, exist_ok=True)
+            path.write_text(text)
+            backdate(path)
+
+    def tearDown(self):
+        self._tmp.cleanup()
+
+    def run_cli(self, output_format, *options):
+        # HOME keeps the cache (and any running daemon) of the user out of the test
+        env = dict(os.environ, HOME=str(self.tmp))
+        result = subprocess.run(
+            [sys.executable, str(SCRIPTS / 'find_script.py'), str(self.root), '--min-lines', '1',
+             '--keywords', 'lora', 'model', '--format', output_format, '--no-daemon', *options],
+            env=env, capture_output=True, check=True)
+        # Banner and progress go to stderr
+        self.assertIn('lora', result.stderr.decode())
+        return result.stdout
+
+    def expected(self):
+        return {str(self.root / rel_path): text for rel_path, text in self.texts.items()
+                if 'lora' in text}
+
+    def test_ndjson(self):
+        records = [json.loads(line) for line in self.run_cli('ndjson').decode().splitlines()]
+        expected = self.expected()
+        self.assertEqual(sorted(record['path'] for record in records), sorted(expected))
+        for record in records:
+            text = expected[record['path']]
+            self.assertEqual((record['lines'], record['lines_exact'], record['size']),
+                             (text.count('\n'), True, len(text)))
+            self.assertEqual(record['keywords'],
+                             [keyword for keyword in ('lora', 'model') if keyword in text])
+            self.assertIsNone(record['score'])
+        ranked = [json.loads(line) for line in self.run_cli('ndjson', '--top', '2').splitlines()]
+        self.assertEqual(len(ranked), 2)
+        self.assertTrue(all(record['score'] > 0 for record in ranked))
+
+    def test_tsv(self):
+        rows = [line.split('\t') for line in self.run_cli('tsv').decode().splitlines()]
+        expected = self.expected()
+        self.assertEqual(len(rows), len(expected))
+        for path, lines, size, keywords, score in rows:
+            # Tabs, newlines and backslashes in paths are escaped
+            path = path.replace('\\t', '\t').replace('\\n', '\n')
+            text = expected[path]
+            self.assertEqual((int(lines), int(size), score), (text.count('\n'), len(text), ''))
+            self.assertEqual(keywords.split(','),
+                             [keyword for keyword in ('lora', 'model') if keyword in text])
+
+    def test_null(self):
+        output = self.run_cli('null')
+        self.assertTrue(output.endswith(b'\0'))
+        self.assertEqual(sorted(os.fsdecode(path) for path in output[:-1].split(b'\0')),
+                         sorted(self.expected()))
+
+    def test_reader_going_away_stops_quietly(self):
+        for i in range(2000):
+            (self.root / f'many{i}.py').write_text('lora\n')
+        process = subprocess.Popen(
+            [sys.executable, str(SCRIPTS / 'find_script.py'), str(self.root), '--min-lines', '1',
+             '--keywords', 'lora', '--format', 'ndjson', '--no-daemon', '--no-cache'],
+            env=dict(os.environ, HOME=str(self.tmp)), stdout=subprocess.PIPE,
+            stderr=subprocess.PIPE)
+        self.assertTrue(process.stdout.readline())
+        process.stdout.close()
+        stderr = process.stderr.read()
+        process.stderr.close()
+        self.assertEqual(process.wait(), 0)
+        self.assertNotIn(b'Traceback', stderr)
+
+
+class StatFilterTest(unittest.TestCase):
+
+    def setUp(self):
+        self._tmp = tempfile.TemporaryDirectory()
+        self.tmp = Path(self._tmp.name)
+        self.root = self.tmp / 'tree'
+        self.root.mkdir()
+        self.now = time.time()
+        rng = random.Random(21)
+        for i in range(40):
+            path = self.root / f'f{i}.py'
+            path.write_text('lora\n' * rng.randint(0, 50))
+            backdate(path, rng.choice((60, 3600, 86400, 30 * 86400)))
+
+    def tearDown(self):
+        self._tmp.cleanup()
+
+    def test_bounds(self):
+        stat_result = os.stat_result((0,) * 6 + (100, 0, 500.0, 0))
+        self.assertFalse(StatFilter().rejects(stat_result))
+        self.assertFalse(StatFilter(min_size=100, max_size=100).rejects(stat_result))
+        self.assertTrue(StatFilter(min_size=101).rejects(stat_result))
+        self.assertTrue(StatFilter(max_size=99).rejects(stat_result))
+        # newer_than keeps files modified at that moment, older_than does not
+        self.assertFalse(StatFilter(newer_than=500).rejects(stat_result))
+        self.assertTrue(StatFilter(newer_than=501).rejects(stat_result))
+        self.assertTrue(StatFilter(older_than=500).rejects(stat_result))
+        self.assertFalse(StatFilter(older_than=501).rejects(stat_result))
+        self.assertEqual(StatFilter(min_size=10, max_size=20).describe(), 'size >= 10, size <= 20')
+
+    def test_matches_checking_every_file(self):
+        rng = random.Random(22)
+        for _ in range(30):
+            stat_filter = StatFilter(
+                min_size=rng.choice((0, 50, 100)),
+                max_size=rng.choice((None, 100, 200)),
+                newer_than=rng.choice((None, self.now - 7200, self.now - 7 * 86400)),
+                older_than=rng.choice((None, self.now - 600, self.now - 2 * 86400)))
+            min_lines = rng.choice((1, 10, 30))
+            # A file of n lines has at least n bytes, so min_lines is a size bound too
+            opened = [path for path in self.root.iterdir()
+                      if not stat_filter.rejects(path.stat()) and path.stat().st_size >= min_lines]
+            expected = sorted(str(path) for path in opened
+                              if path.read_text().count('\n') >= min_lines)
+            for use_cache in (False, True):
+                with self.subTest(stat_filter=stat_filter, min_lines=min_lines,
+                                  use_cache=use_cache):
+                    finder = ScriptFinder(self.tmp / 'cache')
+                    matches = finder.find_script(str(self.root), ['.py'], min_lines=min_lines,
+                                                 content_keywords=['lora'], use_cache=use_cache,
+                                                 stat_filter=stat_filter)
+                    self.assertEqual(sorted(str(match['path']) for match in matches), expected)
+                    stats = finder.stats
+                    self.assertEqual(stats.eliminated['stat'], 40 - len(opened))
+                    if not use_cache:
+                        self.assertEqual(stats.counters['files_opened'], len(opened))
+
+    def test_command_line_values(self):
+        self.assertEqual(parse_size('100'), 100)
+        self.assertEqual(parse_size('10k'), 10 * 1024)
+        self.assertEqual(parse_size('1.5MB'), 3 * 512 * 1024)
+        self.assertEqual(parse_size('2G'), 2 * 1024 ** 3)
+        for text in ('ten', '0', '-5K'):
+            with self.assertRaises(argparse.ArgumentTypeError):
+                parse_size(text)
+        self.assertAlmostEqual(parse_time('2d'), time.time() - 2 * 86400, delta=5)
+        self.assertAlmostEqual(parse_time('90m'), time.time() - 90 * 60, delta=5)
+        self.assertEqual(parse_time('2024-01-31'), time.mktime((2024, 1, 31, 0, 0, 0, 0, 0, -1)))
+        with self.assertRaises(argparse.ArgumentTypeError):
+            parse_time('soon')
+
+
+class EarlyExitTest(unittest.TestCase):
+
+    def setUp(self):
+        self._tmp = tempfile.TemporaryDirectory()
+        self.tmp = Path(self._tmp.name)
+        self.root = self.tmp / 'tree'
+        self.root.mkdir()
+        self.path = self.root / 'train.py'
+        self.path.write_text('import lora\nmodel = 1\n' + 'filler\n' * 1000)
+        backdate(self.path)
+        # Read in small chunks so that the scan can stop well before the end
+        patcher = mock.patch.object(find_script_scan, 'SCAN_CHUNK_SIZE', 256)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def tearDown(self):
+        self._tmp.cleanup()
+
+    def search(self, min_lines, **options):
+        finder = ScriptFinder(self.tmp / 'cache')
+        matches = finder.find_script(str(self.root), ['.py'], min_lines=min_lines,
+                                     content_keywords=['lora', 'model'], **options)
+        return matches, finder.stats.counters
+
+    def test_partial_reads_are_not_cached(self):
+        matches, counters = self.search(5)
+        match, = matches
+        self.assertFalse(match['lines_exact'])
+        self.assertLess(match['line_count'], 1002)
+        self.assertLess(counters['bytes_read'], self.path.stat().st_size)
+
+        # The count from a read that stopped early does not rule the file out
+        # at a higher threshold
+        match, = self.search(500)[0]
+        self.assertGreaterEqual(match['line_count'], 500)
+        self.assertEqual(self.search(2000)[0], [])
+
+        # Once read to the end, the result is cached and holds for any threshold
+        match, = self.search(1000)[0]
+        self.assertEqual((match['line_count'], match['lines_exact']), (1002, True))
+        for min_lines in (1000, 5):
+            matches, counters = self.search(min_lines)
+            self.assertEqual([match['line_count'] for match in matches], [1002])
+            self.assertEqual(counters['files_opened'], 0)
+
+    def test_read_budget_is_part_of_the_key(self):
+        self.path.write_bytes(b'lora\0model\n' * 100)
+        backdate(self.path)
+        matches, _ = self.search(5, budget=ReadBudget(skip_binary=False))
+        self.assertEqual(len(matches), 1)
+        # A default search skips the binary file rather than reusing that result
+        self.assertEqual(self.search(5, use_cache=False)[0], [])
+        self.assertEqual(self.search(5)[0], [])
+        self.assertEqual(self.search(5, budget=ReadBudget())[0], [])
+
+        # Results read within a byte limit are not those of a whole read
+        self.path.write_text('filler\n' * 100 + 'lora model\n')
+        backdate(self.path, 60)
+        self.assertEqual(len(self.search(5)[0]), 1)
+        self.assertEqual(self.search(5, budget=ReadBudget(max_bytes=100))[0], [])
+
+
+class BenchmarkTest(unittest.TestCase):
+
+    def setUp(self):
+        self._tmp = tempfile.TemporaryDirectory()
+        self.tmp = Path(self._tmp.name)
+
+    def tearDown(self):
+        self._tmp.cleanup()
+
+    def contents(self, root):
+        return {path.relative_to(root).as_posix(): path.read_bytes()
+                for path in root.rglob('*') if path.is_file()}
+
+    def test_generated_trees_are_reproducible(self):
+        options = dict(files=300, fanout=2, depth=2, seed=3, size_dist='fixed', mean_lines=5,
+                       keyword_density=0.5)
+        counts = find_script_benchmark.generate_tree(self.tmp / 'one', **options)
+        find_script_benchmark.generate_tree(self.tmp / 'two', **options)
+        self.assertEqual(self.contents(self.tmp / 'one'), self.contents(self.tmp / 'two'))
+        skip_dirs = len(find_script_benchmark.SKIP_DIR_NAMES)
+        self.assertEqual((counts['directories'], counts['skipped_directories']),
+                         (7, 7 * skip_dirs))
+        planted = [text for text in self.contents(self.tmp / 'one').values() if b'lora' in text]
+        self.assertEqual(len(planted), counts['keyword_files'])
+
+    def test_phases_and_json_results(self):
+        tree = self.tmp / 'tree'
+        results_path = self.tmp / 'results.json'
+        argv = ['find_script_benchmark.py', '--files', '200', '--fanout', '3', '--depth', '2',
+                '--size-dist', 'fixed', '--mean-lines', '20', '--keyword-density', '0.3',
+                '--min-lines', '10', '--repeat', '1', '--jobs', '1', '2',
+                '--compare-walkers', '--tree-dir', str(tree), '--json', str(results_path)]
+        with mock.patch.object(sys, 'argv', argv), contextlib.redirect_stdout(io.StringIO()):
+            find_script_benchmark.main()
+        results = json.loads(results_path.read_text())
+
+        skip = set(find_script_benchmark.SKIP_DIR_NAMES)
+        searched = [path for path in tree.rglob('*.py') if not skip & set(path.parts)]
+        matches = [path for path in searched if b'lora' in path.read_bytes()]
+        self.assertTrue(matches)
+        self.assertEqual([run['jobs'] for run in results['runs']], [1, 2])
+        for run in results['runs']:
+            self.assertEqual(list(run['phases']),
+                             ['cold_walk', 'cache_write', 'cache_load', 'scan_cold', 'scan_warm'])
+            self.assertTrue(all(seconds >= 0 for seconds in run['phases'].values()))
+            counts = run['counts']
+            self.assertEqual((counts['files_gathered'], counts['files_loaded'],
+                              counts['directories_walked'], counts['matches']),
+                             (len(searched), len(searched), 13, len(matches)))
+            self.assertGreater(counts['cache_bytes'], 0)
+        self.assertEqual(list(results['walkers']),
+                         ['os.walk (original)', 'scandir (jobs=1)', 'scandir (jobs=2)'])
+
+        # The tree is kept and reused with the same parameters, and refused with others
+        self.assertTrue((tree / find_script_benchmark.TREE_MARKER).exists())
+        argv[argv.index('--files') + 1] = '201'
+        with mock.patch.object(sys, 'argv', argv), contextlib.redirect_stderr(io.StringIO()), \
+                self.assertRaises(SystemExit):
+            find_script_benchmark.main()
+
+
+if __name__ == '__main__':
+    unittest.main()
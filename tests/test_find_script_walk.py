@@ -0,0 +1,283 @@
+"""
+Tests for the tree walk and .gitignore matching (scripts/find_script_walk.py).
+
+The files left by --gitignore are compared with what git itself reports as not
+ignored (git ls-files --others --exclude-standard) on a repository with nested
+ignore files, negations, anchored and '**' patterns, .git/info/exclude and a
+global ignore file. Path globs are compared with a plain recursive matcher, and
+checked to prune the subtrees they cannot match. Run with:
+    python -m unittest discover -s tests -p 'test_find_script*.py'
+"""
+
+import fnmatch
+import os
+import random
+import shutil
+import subprocess
+import sys
+import tempfile
+import threading
+import unittest
+from pathlib import Path
+from unittest import mock
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / 'scripts'))
+
+from find_script_search import ScriptFinder  # noqa: E402
+from find_script_walk import SKIP_DIRS, PathGlob, TreeWalker  # noqa: E402
+
+EXTENSIONS = ['.py', '.log']
+
+IGNORE_FILES = {
+    '.gitignore': '\n'.join([
+        '# build output',
+        '*.log',
+        '!keep.log',
+        '/top_only.py',
+        'docs/**/gen_*.py',
+        'tmp_[0-9].py',
+        '\\#hash.py',
+        'cache_dir/',
+        'data/*',
+        '!data/keep.py',
+        'out/',
+        '',
+    ]),
+    'pkg/.gitignore': '*.py\n!important.py\n',
+    'pkg/sub/.gitignore': '!*.py\n',
+    'docs/.gitignore': 'x/y/\n',
+    '.git/info/exclude': 'secret_*.py\n',
+}
+
+FILES = [
+    'a.py', 'err.log', 'keep.log', 'Upper.LOG', 'top_only.py', 'pkg/top_only.py',
+    'docs/gen_x.py', 'docs/x/gen_y.py', 'docs/x/other.py', 'docs/x/y/z.py', 'docs/y/a.py',
+    'tmp_1.py', 'tmp_a.py', '#hash.py', 'cache_dir/c.py', 'deep/cache_dir/c.py',
+    'deep/cache_dir.py', 'data/skip.py', 'data/keep.py', 'data/sub/x.py',
+    'pkg/p.py', 'pkg/important.py', 'pkg/sub/s.py', 'pkg/sub/t.log', 'pkg/sub/deeper/d.py',
+    'secret_1.py', 'pkg/secret_2.py', 'x.bak.py', 'out/o.py', 'deep/out/o.py', 'outer/o.py',
+    'node_modules/m.py',
+]
+
+
+@unittest.skipUnless(shutil.which('git'), 'git is not installed')
+class GitignoreTest(unittest.TestCase):
+
+    def setUp(self):
+        self._tmp = tempfile.TemporaryDirectory()
+        self.tmp = Path(self._tmp.name)
+        self.root = self.tmp / 'repo'
+        self.root.mkdir()
+        # Keep the user's and the system's git configuration out of the comparison
+        config_home = self.tmp / 'config'
+        (config_home / 'git').mkdir(parents=True)
+        (config_home / 'git' / 'ignore').write_text('*.bak.py\n')
+        self.env = dict(os.environ, HOME=str(self.tmp), XDG_CONFIG_HOME=str(config_home),
+                        GIT_CONFIG_GLOBAL=os.devnull, GIT_CONFIG_NOSYSTEM='1')
+        subprocess.run(['git', 'init', '-q', str(self.root)], check=True, env=self.env)
+        for rel_path, text in IGNORE_FILES.items():
+            (self.root / rel_path).parent.mkdir(parents=True, exist_ok=True)
+            (self.root / rel_path).write_text(text)
+        for rel_path in FILES:
+            (self.root / rel_path).parent.mkdir(parents=True, exist_ok=True)
+            (self.root / rel_path).write_text('x\n')
+
+    def tearDown(self):
+        self._tmp.cleanup()
+
+    def git_files(self, directory):
+        output = subprocess.run(
+            ['git', 'ls-files', '--others', '--exclude-standard', '-z'],
+            cwd=directory, env=self.env, check=True, capture_output=True).stdout
+        return sorted(
+            path for path in os.fsdecode(output).split('\0')
+            if os.path.splitext(path)[1].lower() in EXTENSIONS
+            and not SKIP_DIRS.intersection(path.split('/')[:-1]))
+
+    def finder_files(self, directory):
+        finder = ScriptFinder(self.tmp / 'cache')
+        with mock.patch.dict(os.environ, self.env):
+            files = finder.gather_files(str(directory), EXTENSIONS, use_cache=False,
+                                        gitignore=True)
+        return sorted(Path(path).relative_to(directory).as_posix() for path in files)
+
+    def test_matches_git(self):
+        expected = self.git_files(self.root)
+        # Make sure the tree exercises ignoring and re-including
+        self.assertIn('keep.log', expected)
+        self.assertIn('pkg/sub/s.py', expected)
+        self.assertNotIn('x.bak.py', expected)
+        self.assertNotIn('secret_1.py', expected)
+        self.assertEqual(self.finder_files(self.root), expected)
+
+    def test_core_excludes_file(self):
+        (self.tmp / 'user_ignore').write_text('tmp_a.py\ndeeper/\n')
+        config = self.tmp / 'gitconfig'
+        for value, ignored, kept in (('~/user_ignore', ['tmp_a.py', 'pkg/sub/deeper/d.py'],
+                                      ['x.bak.py']),
+                                     ('', [], ['tmp_a.py', 'x.bak.py'])):
+            with self.subTest(value=value):
+                # The configured file replaces the one under $XDG_CONFIG_HOME
+                config.write_text(f'[core]\n\texcludesFile = {value}\n')
+                self.env['GIT_CONFIG_GLOBAL'] = str(config)
+                expected = self.git_files(self.root)
+                for rel_path in ignored:
+                    self.assertNotIn(rel_path, expected)
+                for rel_path in kept:
+                    self.assertIn(rel_path, expected)
+                self.assertEqual(self.finder_files(self.root), expected)
+
+    def test_root_inside_repository(self):
+        # Ignore files above the root apply as well
+        for subdir in ('pkg', 'docs', 'deep'):
+            with self.subTest(subdir=subdir):
+                directory = self.root / subdir
+                self.assertEqual(self.finder_files(directory), self.git_files(directory))
+
+
+def glob_matches(parts, components):
+    """Whether path components match glob parts, '**' standing for any number of them."""
+    if not parts:
+        return not components
+    if parts[0] == '**':
+        return any(glob_matches(parts[1:], components[i:]) for i in range(len(components) + 1))
+    return bool(components) and fnmatch.fnmatchcase(components[0], parts[0]) \
+        and glob_matches(parts[1:], components[1:])
+
+
+class PathGlobTest(unittest.TestCase):
+
+    def test_matches_reference(self):
+        rng = random.Random(15)
+        names = ['a', 'src', 'train_x.py', 'test_y.py', 'b.py']
+        parts = ['**', '*', 'a', 'src', 'train_*.py', '*.py', 't?st_y.py', '[ab]*']
+        paths = sorted({'/'.join(rng.choices(names, k=rng.randint(1, 5))) for _ in range(300)})
+        for _ in range(200):
+            pattern = '/'.join(rng.choices(parts, k=rng.randint(1, 4)))
+            # A pattern without a '/' matches the file name at any depth
+            reference = pattern.split('/') if '/' in pattern else ['**', pattern]
+            glob = PathGlob([pattern])
+            with self.subTest(pattern=pattern):
+                found = [path for path in paths if glob.match_path(path.replace('/', os.sep))]
+                self.assertEqual(
+                    found, [path for path in paths if glob_matches(reference, path.split('/'))])
+
+    def test_walk_prunes_subtrees(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            root = Path(tmp, 'tree')
+            for rel_path in ('train_a.py', 'src/train_b.py', 'src/x/y/train_c.py', 'src/x/util.py',
+                             'docs/train_d.py', 'docs/deep/train_e.py', 'tests/test_f.py'):
+                path = root / rel_path
+                path.parent.mkdir(parents=True, exist_ok=True)
+                path.write_text('')
+            for patterns, expected, listed in (
+                    (['src/**/train_*.py'], ['src/train_b.py', 'src/x/y/train_c.py'], 4),
+                    (['*/test_*.py', 'train_*.py'],
+                     ['docs/deep/train_e.py', 'docs/train_d.py', 'src/train_b.py',
+                      'src/x/y/train_c.py', 'tests/test_f.py', 'train_a.py'], 7),
+                    (['docs/*.py'], ['docs/train_d.py'], 2)):
+                for use_cache in (False, True):
+                    with self.subTest(patterns=patterns, use_cache=use_cache):
+                        finder = ScriptFinder(Path(tmp, 'cache'))
+                        if use_cache:
+                            finder.gather_files(str(root), ['.py'])
+                        files = finder.gather_files(str(root), ['.py'], use_cache=use_cache,
+                                                    path_globs=patterns)
+                        self.assertEqual(
+                            sorted(path.relative_to(root).as_posix() for path in files), expected)
+                        # Directories no pattern can reach are neither listed nor decoded
+                        counter = 'dirs_visited' if use_cache else 'dirs_listed'
+                        self.assertEqual(finder.stats.counters[counter], listed)
+
+
+class TreeWalkerTest(unittest.TestCase):
+
+    def random_tree(self, rng, depth=0, prefix=''):
+        children = {}
+        if depth < 5:
+            for i in range(rng.randint(0, 4)):
+                children.update(self.random_tree(rng, depth + 1, f'{prefix}{i}/'))
+        return {prefix: sorted(children)} | children
+
+    def test_visits_everything_once(self):
+        rng = random.Random(16)
+        for workers in (1, 2, 8):
+            for _ in range(20):
+                tree = self.random_tree(rng)
+                visited = []
+                lock = threading.Lock()
+
+                def visit(item):
+                    with lock:
+                        visited.append(item)
+                    return [child for child in tree if child != item
+                            and child.startswith(item) and child.count('/') == item.count('/') + 1]
+
+                TreeWalker(visit, workers).run('')
+                self.assertEqual(sorted(visited), sorted(tree))
+
+    def test_errors_are_raised(self):
+        def visit(item):
+            if item == 'bad':
+                raise OSError('unreadable')
+            return ['bad', 'good'] if item == '' else []
+
+        with self.assertRaises(OSError):
+            TreeWalker(visit, 4).run('')
+
+    def test_parallel_walk_matches_os_walk(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            rng = random.Random(6)
+            for d in range(60):
+                directory = Path(tmp, *(f'd{rng.randint(0, 3)}' for _ in range(rng.randint(0, 4))))
+                directory.mkdir(parents=True, exist_ok=True)
+                (directory / f'f{d}.py').write_text('')
+                (directory / f'f{d}.txt').write_text('')
+            Path(tmp, 'd1', 'node_modules').mkdir(parents=True, exist_ok=True)
+            Path(tmp, 'd1', 'node_modules', 'skipped.py').write_text('')
+
+            expected = sorted(
+                os.path.join(dirpath, name)
+                for dirpath, dirnames, filenames in os.walk(tmp)
+                if not SKIP_DIRS.intersection(Path(dirpath).relative_to(tmp).parts)
+                for name in filenames if name.endswith('.py'))
+            for jobs in (1, 4):
+                finder = ScriptFinder(Path(tmp, 'cache'))
+                files = finder.gather_files(tmp, ['.py'], use_cache=False, jobs=jobs)
+                self.assertEqual(sorted(map(str, files)), expected)
+
+    def test_skipped_directories_are_not_listed(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            for rel_path in ('top.py', 'a/b/c.py', 'a/node_modules/x.py', '.hidden/y.py',
+                             'build/z.py', 'a/notes.txt'):
+                path = Path(tmp, 'tree', rel_path)
+                path.parent.mkdir(parents=True, exist_ok=True)
+                path.write_text('')
+            root = Path(tmp, 'tree')
+            # Symlinked directories are not followed
+            os.symlink(root / 'a', root / 'link')
+            real_scandir, real_stat = os.scandir, os.stat
+            for jobs in (1, 4):
+                scanned, stat_paths = [], []
+
+                def scandir(path):
+                    scanned.append(os.path.relpath(path, root))
+                    return real_scandir(path)
+
+                def stat(path, *args, **kwargs):
+                    stat_paths.append(os.path.relpath(path, root))
+                    return real_stat(path, *args, **kwargs)
+
+                finder = ScriptFinder(Path(tmp, 'cache'))
+                with mock.patch('os.scandir', scandir), mock.patch('os.stat', stat):
+                    files = finder.gather_files(str(root), ['.py'], use_cache=False, jobs=jobs)
+                self.assertEqual(sorted(path.relative_to(root).as_posix() for path in files),
+                                 ['a/b/c.py', 'top.py'])
+                self.assertEqual(sorted(scanned), ['.', 'a', os.path.join('a', 'b')])
+                # File types come from the directory entries, not a stat per file
+                self.assertEqual(sorted(stat_paths), sorted(scanned))
+                self.assertEqual(finder.stats.counters['dirs_pruned'], 3)
+
+
+if __name__ == '__main__':
+    unittest.main()